@@ -0,0 +1,100 @@
+"""
+Compare spawning ffmpeg per request with the pooled and in-process audio decoders
+
+Each clip is decoded repeatedly, the way wake word chunks arrive, and the
+per-decode latency of every strategy is reported. Short clips show how much
+of the old cost was process creation and ffmpeg startup.
+
+Usage:
+    python benchmark_audio_decoder.py chunk.webm [more.webm ...]
+        [--strategies spawn,ffmpeg,pyav] [--repeat 50] [--pool-size 2]
+"""
+import argparse
+import statistics
+import subprocess
+import time
+import numpy as np
+from src.audio_decoder import AudioDecoder, av
+
+FFMPEG_PATH = "ffmpeg"
+
+def decode_spawn(data, sample_rate=16000):
+    """Decode the way the server used to: start a new ffmpeg process for every clip"""
+    result = subprocess.run([
+        FFMPEG_PATH,
+        '-v', 'error',
+        '-i', 'pipe:0',
+        '-vn',
+        '-f', 's16le',
+        '-ac', '1',
+        '-ar', str(sample_rate),
+        'pipe:1'
+    ], input=data, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors='replace'))
+    return np.frombuffer(result.stdout, dtype='<i2'), sample_rate
+
+def time_strategy(decode, clips, repeat):
+    """Decode every clip repeat times and collect per-decode latencies in milliseconds"""
+    latencies = []
+    samples = 0
+    for _ in range(repeat):
+        for data in clips:
+            start = time.perf_counter()
+            decoded, _ = decode(data)
+            latencies.append((time.perf_counter() - start) * 1000)
+            samples += len(decoded)
+    return latencies, samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark audio decoding strategies")
+    parser.add_argument('clips', nargs='+', help="Encoded audio or video clips")
+    parser.add_argument('--strategies', default='spawn,ffmpeg,pyav',
+                        help="Comma separated strategies to compare")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--pool-size', type=int, default=2)
+    args = parser.parse_args()
+
+    clips = []
+    for path in args.clips:
+        with open(path, 'rb') as f:
+            clips.append(f.read())
+    print(f"\nDecoding {len(clips)} clip(s) x {args.repeat}")
+
+    decoders = []
+    results = {}
+    for strategy in args.strategies.split(','):
+        strategy = strategy.strip()
+        if strategy == 'spawn':
+            decode = decode_spawn
+        elif strategy == 'pyav' and av is None:
+            print("Skipping pyav: the 'av' package is not installed")
+            continue
+        else:
+            try:
+                decoder = AudioDecoder(backend=strategy, pool_size=args.pool_size)
+            except Exception as e:
+                print(f"Skipping {strategy}: {e}")
+                continue
+            decoders.append(decoder)
+            decode = decoder.decode
+        # Warm up once so the pool is filled and codecs are loaded before timing
+        decode(clips[0])
+        time.sleep(0.5)
+        results[strategy] = time_strategy(decode, clips, args.repeat)
+
+    print(f"\n{'strategy':<9} {'decodes':>8} {'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'audio x':>8}")
+    for strategy, (latencies, samples) in results.items():
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        realtime = (samples / 16000) / (sum(latencies) / 1000)
+        print(f"{strategy:<9} {len(latencies):>8} {statistics.mean(latencies):>8.2f} "
+              f"{statistics.median(latencies):>7.2f} {p95:>7.2f} {realtime:>8.0f}")
+
+    for decoder in decoders:
+        if decoder.stats().get('pool'):
+            print(f"\nffmpeg pool: {decoder.stats()['pool']}")
+        decoder.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Compare face detector backends on the same sampled video frames
+
+Reports throughput and agreement with a reference backend so each deployment
+can pick the fastest detector that is still accurate enough for its lighting.
+
+Usage:
+    python benchmark_face_detectors.py recording.webm [more.webm ...]
+        [--backends haar,lbp,dnn] [--reference haar] [--frame-skip 5] [--max-frames 300]
+"""
+import argparse
+import logging
+import time
+import cv2
+from src.config import Config
+from src.face_detectors import FACE_DETECTOR_BACKENDS, create_face_detector, match_detections
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def sample_frames(video_paths, frame_skip, max_frames):
+    """Decode every Nth frame of the given videos, up to max_frames in total"""
+    frames = []
+    for video_path in video_paths:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            logging.error(f"Failed to open video file: {video_path}")
+            continue
+        frame_count = 0
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame_count % frame_skip == 0:
+                frames.append(frame)
+            frame_count += 1
+        cap.release()
+    return frames
+
+def run_backend(detector, frames, gray_frames):
+    """Run one detector over all frames and time it"""
+    inputs = frames if detector.requires_color else gray_frames
+    start = time.perf_counter()
+    detections = [detector.detect(image) for image in inputs]
+    elapsed = time.perf_counter() - start
+    return detections, elapsed
+
+def compare(reference, candidate):
+    """Agreement of candidate detections with the reference detections"""
+    matched = sum(match_detections(r, c) for r, c in zip(reference, candidate))
+    ref_faces = sum(len(r) for r in reference)
+    cand_faces = sum(len(c) for c in candidate)
+    same_count = sum(1 for r, c in zip(reference, candidate) if len(r) == len(c))
+    return {
+        'recall': matched / ref_faces if ref_faces else 1.0,
+        'precision': matched / cand_faces if cand_faces else 1.0,
+        'frame_agreement': same_count / len(reference) if reference else 1.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detector backends")
+    parser.add_argument('videos', nargs='+', help="Video files to sample frames from")
+    parser.add_argument('--backends', default=','.join(FACE_DETECTOR_BACKENDS),
+                        help="Comma separated backends to compare")
+    parser.add_argument('--reference', default='haar', help="Backend treated as ground truth")
+    parser.add_argument('--frame-skip', type=int, default=Config.FRAME_SKIP)
+    parser.add_argument('--max-frames', type=int, default=300)
+    args = parser.parse_args()
+
+    frames = sample_frames(args.videos, args.frame_skip, args.max_frames)
+    if not frames:
+        print("No frames could be decoded")
+        return
+    gray_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames]
+    print(f"\nSampled {len(frames)} frames from {len(args.videos)} video(s)")
+
+    results = {}
+    for backend in args.backends.split(','):
+        backend = backend.strip()
+        try:
+            detector = create_face_detector(backend, **Config.face_detector_options())
+        except Exception as e:
+            print(f"Skipping {backend}: {e}")
+            continue
+        # Warm up once so model loading and allocation are not timed
+        detector.detect(frames[0] if detector.requires_color else gray_frames[0])
+        results[backend] = run_backend(detector, frames, gray_frames)
+
+    reference = results.get(args.reference)
+    if reference is None:
+        print(f"Reference backend '{args.reference}' did not run, agreement not reported")
+
+    print(f"\n{'backend':<8} {'frames/s':>9} {'ms/frame':>9} {'faces':>6} {'faces/s':>8} "
+          f"{'recall':>7} {'precision':>9} {'frame agr':>9}")
+    for backend, (detections, elapsed) in results.items():
+        faces = sum(len(d) for d in detections)
+        line = (f"{backend:<8} {len(frames) / elapsed:>9.1f} {1000 * elapsed / len(frames):>9.2f} "
+                f"{faces:>6} {faces / elapsed:>8.1f}")
+        if reference is not None:
+            agreement = compare(reference[0], detections)
+            line += (f" {agreement['recall']:>7.2f} {agreement['precision']:>9.2f} "
+                     f"{agreement['frame_agreement']:>9.2f}")
+        print(line)
+
+if __name__ == "__main__":
+    main()
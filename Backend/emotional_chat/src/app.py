@@ -8,18 +8,22 @@ import json
 import tempfile
 import traceback
 import logging
+import threading
 import re
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote
 
 # Third-party imports
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from openai import OpenAI
 import requests
 from dotenv import load_dotenv
 import base64
 import shutil
 from flask_cors import CORS
+from flask_sock import Sock
 
 # Configure logging first
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -31,21 +35,88 @@ load_dotenv()
 from src.emotional_speech_agent import EmotionalSpeechAgent
 from src.command_recognizer import CommandRecognizer
 from src.audio_processor import AudioProcessor
-from src.video_processor import split_video, cleanup_temp_files
+from src.asr import create_asr_service
+from src.wake_word_spotter import WakeWordSpotter
+from src.voice_activity import VoiceActivityDetector
+from src.wake_word_stream import WakeWordStream, WakeWordWorker, validate_sample_rate
+from src.chunk_deduplicator import ChunkDeduplicator
+from src.segmented_transcriber import SegmentedTranscriber
+from src.audio_decoder import AudioDecoder, AudioDecodeError
+from src.video_processor import extract_audio, cleanup_temp_files
 from src.config import Config
 from src.command_scraper import commandScraper
+from src.emotion_session import EmotionSessionManager
+from src.idempotency import IdempotencyCache, InFlightTimeout, request_key
 
 # Initialize components
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*", "allow_headers": "*", "expose_headers": "*"}})
+sock = Sock(app)
 command_scraper = commandScraper()  # Create instance at module level
 
 # Initialize Flask to handle trailing slashes
 app.url_map.strict_slashes = False
 
 # Initialize processors
-speech_agent = EmotionalSpeechAgent()
-audio_processor = AudioProcessor()
+asr_service = create_asr_service(
+    Config.ASR_BACKENDS,
+    recognizer_pool_size=Config.RECOGNIZER_POOL_SIZE,
+    whisper_model=Config.WHISPER_MODEL,
+    stub_text=Config.ASR_STUB_TEXT,
+    deadline=Config.ASR_DEADLINE,
+    hedge_after=Config.ASR_HEDGE_AFTER or None
+)
+speech_agent = EmotionalSpeechAgent(asr_service=asr_service)
+audio_processor = AudioProcessor(
+    wake_word_spotter=WakeWordSpotter.from_directory(
+        Config.WAKE_WORD_TEMPLATES_FOLDER,
+        accept_score=Config.WAKE_WORD_ACCEPT_SCORE,
+        reject_score=Config.WAKE_WORD_REJECT_SCORE
+    ),
+    voice_activity_detector=VoiceActivityDetector(
+        energy_ratio=Config.VAD_ENERGY_RATIO,
+        min_rms=Config.VAD_MIN_RMS,
+        min_speech_ms=Config.VAD_MIN_SPEECH_MS
+    ),
+    audio_decoder=AudioDecoder(
+        backend=Config.AUDIO_DECODER,
+        sample_rate=asr_service.sample_rate,
+        pool_size=Config.AUDIO_DECODER_POOL_SIZE
+    ),
+    asr_service=asr_service,
+    chunk_deduplicator=ChunkDeduplicator(
+        history_seconds=Config.WAKE_DEDUP_HISTORY_SECONDS,
+        min_correlation=Config.WAKE_DEDUP_MIN_CORRELATION
+    ) if Config.WAKE_DEDUP_ENABLED else None,
+    debug_capture_dir=Config.DEBUG_AUDIO_FOLDER if Config.DEBUG_AUDIO_CAPTURE else None
+)
+segmented_transcriber = SegmentedTranscriber(
+    asr_service,
+    voice_activity_detector=audio_processor.voice_activity_detector,
+    min_segment_seconds=Config.TRANSCRIBE_SEGMENT_MIN_SECONDS,
+    max_segment_seconds=Config.TRANSCRIBE_SEGMENT_MAX_SECONDS,
+    max_workers=Config.TRANSCRIBE_WORKERS
+)
+emotion_sessions = EmotionSessionManager(
+    speech_agent.emotion_monitor,
+    window_size=Config.EMOTION_WINDOW_SIZE,
+    idle_timeout=Config.EMOTION_SESSION_IDLE_TIMEOUT,
+    max_sessions=Config.EMOTION_SESSION_MAX
+)
+
+# Completed media results replayed to client retries, keyed by caller, Idempotency-Key and payload hash
+media_results = IdempotencyCache(
+    max_entries=Config.IDEMPOTENCY_CACHE_SIZE,
+    ttl=Config.IDEMPOTENCY_TTL,
+    should_cache=lambda result: result[1] == 200,
+    wait_timeout=Config.IDEMPOTENCY_WAIT_SECONDS
+)
+wake_word_results = IdempotencyCache(
+    max_entries=Config.IDEMPOTENCY_CACHE_SIZE,
+    ttl=Config.IDEMPOTENCY_TTL,
+    should_cache=lambda result: result.get('success'),
+    wait_timeout=Config.IDEMPOTENCY_WAIT_SECONDS
+)
 
 # Create temp directory for processing
 TEMP_DIR = Path(tempfile.gettempdir()) / "emotional_chat_temp"
@@ -58,6 +129,35 @@ for path in [Config.UPLOAD_FOLDER, Config.TEMP_FOLDER, Config.RECORDINGS_FOLDER]
 # Initialize OpenAI client
 client = OpenAI()
 
+# Speech for streamed sentences is synthesised here while the response is still being generated
+tts_executor = ThreadPoolExecutor(max_workers=Config.TTS_WORKERS, thread_name_prefix='tts')
+
+def conversation_session_id(data):
+    """
+    Conversation session of a request: the patient if given, otherwise the device
+
+    Returns None for requests that identify neither. Tablets behind one address (NAT, a proxy)
+    would otherwise share a history, so such requests are answered without one.
+    """
+    data = data or {}
+    return data.get('patient_id') or data.get('client_id') or request.headers.get('X-Client-Id') or None
+
+def idempotent_response(payload, status, replayed):
+    """Build a JSON response, flagging results served from the idempotency cache"""
+    response = jsonify(payload)
+    response.status_code = status
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def in_flight_response(error):
+    """409 for a duplicate that gave up waiting on the original request, which the client may retry"""
+    logging.warning(str(error))
+    return jsonify({
+        'error': 'Request already in progress',
+        'details': 'The same request is still being processed, retry later'
+    }), 409, {'Retry-After': '5'}
+
 @app.route('/')
 def index(): #basic get check for the server status, if can connect
     """Root endpoint"""
@@ -100,10 +200,28 @@ def detect_wake_word():
                 'details': 'Request must include "audio" key with base64 encoded audio data'
             }), 400
 
-        # Process the WebM audio data
-        result = audio_processor.process_audio_data_base64(data['audio'])
-        return jsonify(result)
+        try:
+            audio_bytes = base64.b64decode(data['audio'])
+        except Exception as e:
+            return jsonify({
+                'error': 'Invalid audio data',
+                'details': str(e)
+            }), 400
 
+        # Overlapping chunks are deduplicated per device. Devices behind one address (NAT, a proxy) would
+        # share a history, so chunks from clients that do not identify themselves are not deduplicated
+        client_id = data.get('client_id') or request.headers.get('X-Client-Id')
+
+        # Process the audio data, answering retries of the same chunk from the idempotency cache
+        key = request_key('detect-wake-word', request.headers.get('Idempotency-Key'), audio_bytes,
+                          scope=(client_id,))
+        result, replayed = wake_word_results.get_or_compute(
+            key, lambda: audio_processor.process_audio_bytes(audio_bytes, client_id)
+        )
+        return idempotent_response(result, 200, replayed)
+
+    except InFlightTimeout as e:
+        return in_flight_response(e)
     except Exception as e:
         logging.exception("Error in detect_wake_word:")
         return jsonify({
@@ -138,6 +256,144 @@ def process_get_command(command_recognizer, transcription): #Process to the func
         logging.exception("Error in process_get_command:") #Except to process audio
     return None
 
+def process_video_bytes(video_bytes, emotion_session_id=None, conversation_id=None):
+    """
+    Run the full video pipeline: emotions, transcription, AI response and speech
+
+    Args:
+        video_bytes (bytes): Decoded video data
+        emotion_session_id (str): Streaming emotion session whose result can be reused
+        conversation_id (str): Patient or device whose conversation session records the turn, None for no history
+
+    Returns:
+        tuple: (result dict, HTTP status code)
+    """
+    # Create temp directory if it doesn't exist
+    temp_dir = Path(tempfile.mkdtemp())
+    logging.info(f"Created temporary directory: {temp_dir}")
+    video_path = temp_dir / f"{uuid.uuid4()}.webm"
+    logging.info(f"Video path: {video_path}")
+
+    try:
+        # Save video data
+        with open(video_path, 'wb') as f: #Create the file.
+            f.write(video_bytes) #Set information from video data
+        logging.info(f"Video data saved to {video_path}") #Notify
+
+        # Use the emotion state streamed while the patient was talking, if there is one
+        emotion_summary = emotion_sessions.consume(emotion_session_id)
+        if emotion_summary:
+            logging.info("Using emotion result from streaming session")
+            emotion_result = {'success': True, 'emotions': emotion_summary}
+        else:
+            # Process video for audio and emotion
+            logging.info(f"Processing video for audio and emotion: {video_path}") #Process video information, from a request
+            emotion_result = speech_agent.process_video(str(video_path))  #To a proper string
+        if not emotion_result or not emotion_result.get('success'): #From result make sure it is proper, from result make sure it has all the variables, that its accurate
+            error_msg = emotion_result.get('error', 'Failed to process video for emotions') if emotion_result else 'Failed to process video for emotions'
+            logging.error(error_msg) #Notify the user
+            return {
+                'success': False,
+                'error': error_msg
+            }, 500 #From result return status and value
+
+        extracted = extract_audio(str(video_path), audio_processor.audio_decoder)
+        if extracted is None: #Checks for decoded audio to process
+            logging.error("Failed to extract audio from video") #Notify all information is processed in code
+            return {
+                'success': False,
+                'error': 'Failed to extract audio from video'
+            }, 500
+
+        # The decoded samples go to speech recognition in memory, without a WAV round-trip
+        asr_response = audio_processor.process_audio_samples(*extracted)
+        if asr_response and asr_response.get('speech_detected') is False:
+            logging.info("No speech in video audio, skipping AI response")
+            return {
+                'success': False,
+                'emotions': emotion_result['emotions'],
+                'error': asr_response['error']
+            }, 422
+
+        if not asr_response or not asr_response.get('success'):
+            error_msg = asr_response.get('error', 'Failed to transcribe audio') if asr_response else 'Failed to transcribe audio'
+            logging.error(error_msg) #Logging process
+
+            return { #Return results
+                'success': False,
+                'error': error_msg
+            }, 500
+
+        # Get AI response
+        ai_response = speech_agent.get_response(
+            asr_response['transcription'],
+            {'dominant_emotion': emotion_result['emotions']['dominant']},
+            session_id=conversation_id
+        )
+        if not ai_response:
+            logging.error("Failed to get AI response")
+            return {
+                'success': False,
+                'error': 'Failed to generate AI response'
+            }, 500
+
+        # Create command recognizer instance and get command
+        command_recognizer = CommandRecognizer(Config.OPENAI_API_KEY)
+        command = command_recognizer.recognize_command(asr_response['transcription'])
+        command_response = None
+        if command != 'none':
+            command_response = command_scraper.get_response(command, asr_response['transcription'])
+            if command_response:
+                ai_response = "Yes, no problem!"
+
+        # Generate text-to-speech audio for the AI response
+        temp_audio_path = temp_dir / f"{uuid.uuid4()}.mp3"
+        response = client.audio.speech.create(
+            model="tts-1",
+            voice="alloy",
+            input=ai_response
+        )
+        response.stream_to_file(temp_audio_path)
+
+        # Convert audio file to base64  
+        with open(temp_audio_path, 'rb') as audio_file:
+            audio_base64 = base64.b64encode(audio_file.read()).decode('utf-8')
+
+        # Return the complete result
+        result = {
+            'success': True,
+            'emotions': emotion_result['emotions'],
+            'transcription': asr_response['transcription'],
+            'response': ai_response,
+            'audio': audio_base64
+        }
+
+        # Add command response if present
+        if command_response:
+            result['command_response'] = command_response
+
+        logging.info(f"Final result: {result}") #Logging and the proper return
+        return result, 200
+
+    except Exception as e:
+        logging.exception("Error processing video/audio:") #Exception
+        return {
+            'success': False,
+            'error': str(e)
+        }, 500 #All the exception and then print.
+
+    finally:
+        # Cleanup temp files, this is what was missed.
+        try: #Start.
+            logging.info("Cleaning up temporary files...") #Print state.
+            if video_path.exists(): #There is a video
+                # video_path.unlink() #Unlink and delete #You may have issues because there may be a different user profile deleting this
+                logging.info(f"Deleted {video_path}") #Print state for data
+            temp_dir.rmdir() #Remove the folder
+            logging.info(f"Removed directory {temp_dir}") #Print state to let know user.
+        except Exception as e: #If some file was lost in this try statement, it doesn't matter, the code still runs.
+            logging.warning(f"Error during temporary file cleanup: {e}") #Print state
+
 @app.route('/api/process-video', methods=['POST'])
 def process_video():
     """Process video for emotion detection and speech recognition"""
@@ -160,140 +416,21 @@ def process_video():
         video_data = request.json['video']
         logging.info(f"Video data received (length: {len(video_data)} characters)")
 
-        # Create temp directory if it doesn't exist
-        temp_dir = Path(tempfile.mkdtemp())
-        logging.info(f"Created temporary directory: {temp_dir}")
-        video_path = temp_dir / f"{uuid.uuid4()}.webm"
-        logging.info(f"Video path: {video_path}")
-
-        try:
-            # Decode and save video data
-            video_bytes = base64.b64decode(video_data.split(',')[1] if ',' in video_data else video_data)
-            with open(video_path, 'wb') as f: #Create the file.
-                f.write(video_bytes) #Set information from video data
-            logging.info(f"Video data saved to {video_path}") #Notify
-
-            # Process video for audio and emotion
-            logging.info(f"Processing video for audio and emotion: {video_path}") #Process video information, from a request
-            emotion_result = speech_agent.process_video(str(video_path))  #To a proper string
-            if not emotion_result or not emotion_result.get('success'): #From result make sure it is proper, from result make sure it has all the variables, that its accurate
-                error_msg = emotion_result.get('error', 'Failed to process video for emotions') if emotion_result else 'Failed to process video for emotions'
-                logging.error(error_msg) #Notify the user
-                return jsonify({
-                    'success': False,
-                    'error': error_msg
-                }), 500 #From result return status and value
-
-            video_stream, audio_stream = split_video(str(video_path)) #Video is spilt and all data stored again.
-            if not audio_stream: #Checks for audio file and valid link to process audio data
-                logging.error("Failed to extract audio from video") #Notify all information is processed in code
-                return jsonify({
-                    'success': False,
-                    'error': 'Failed to extract audio from video'
-                }), 500
-
-            # Process the audio file if it was successfully created, after validation, begin new proccess
-            if audio_stream and os.path.exists(audio_stream): #If there audio set and has to do with the file location, and the path exists
-                temp_processing = Path(__file__).parent.parent.absolute() / 'src/temp_processing'  #Generate path
-                temp_processing.mkdir(exist_ok=True) #If there is a path create file
-
-                try:
-                    # Create temp name using UUID
-                    debug_wav = temp_processing / f"{uuid.uuid4()}.wav"
-                    shutil.copy2(audio_stream, debug_wav) #Copy new file to the debug
-                    logging.info(f"Saved debug WAV file to: {debug_wav}") #Logging process
-
-                    asr_response = audio_processor.process_audio_file(str(debug_wav))
-                    if not asr_response or not asr_response.get('success'):
-                        error_msg = asr_response.get('error', 'Failed to transcribe audio') if asr_response else 'Failed to transcribe audio'
-                        logging.error(error_msg) #Logging process
-
-                        return jsonify({ #Return results
-                            'success': False,
-                            'error': error_msg
-                        }), 500
-
-                    # Get AI response
-                    ai_response = speech_agent.get_response(
-                        asr_response['transcription'],
-                        {'dominant_emotion': emotion_result['emotions']['dominant']}
-                    )
-                    if not ai_response:
-                        logging.error("Failed to get AI response")
-                        return jsonify({
-                            'success': False,
-                            'error': 'Failed to generate AI response'
-                        }), 500
-
-                    # Create command recognizer instance and get command
-                    command_recognizer = CommandRecognizer(Config.OPENAI_API_KEY)
-                    command = command_recognizer.recognize_command(asr_response['transcription'])
-                    command_response = None
-                    if command != 'none':
-                        command_response = command_scraper.get_response(command, asr_response['transcription'])
-                        if command_response:
-                            ai_response = "Yes, no problem!"
-
-                    # Generate text-to-speech audio for the AI response
-                    temp_audio_path = temp_dir / f"{uuid.uuid4()}.mp3"
-                    response = client.audio.speech.create(
-                        model="tts-1",
-                        voice="alloy",
-                        input=ai_response
-                    )
-                    response.stream_to_file(temp_audio_path)
-
-                    # Convert audio file to base64  
-                    with open(temp_audio_path, 'rb') as audio_file:
-                        audio_base64 = base64.b64encode(audio_file.read()).decode('utf-8')
-
-                    # Return the complete result
-                    result = {
-                        'success': True,
-                        'emotions': emotion_result['emotions'],
-                        'transcription': asr_response['transcription'],
-                        'response': ai_response,
-                        'audio': audio_base64
-                    }
-                    
-                    # Add command response if present
-                    if command_response:
-                        result['command_response'] = command_response
-
-                    logging.info(f"Final result: {result}") #Logging and the proper return
-                    return jsonify(result)
-
-                finally: #Run try and always do process finally.
-                    # Clean up the temporary WAV file
-                    try:
-                        if debug_wav.exists(): #Ensure exists
-                            debug_wav.unlink() #Delink.
-                            logging.info(f"Removed temporary WAV file: {debug_wav}") #Print state.
-                    except Exception as e: #Check state or print process
-                        logging.warning(f"Error removing temporary WAV file: {e}")
-
-            logging.info(f"Result from speech_agent.process_video: {emotion_result}") #Log the start, if there and can access and run.
-            return jsonify(emotion_result)
-
-        except Exception as e:
-            logging.exception("Error processing video/audio:") #Exception
-            return jsonify({
-                'success': False,
-                'error': str(e)
-            }), 500 #All the exception and then print.
-
-        finally:
-            # Cleanup temp files, this is what was missed.
-            try: #Start.
-                logging.info("Cleaning up temporary files...") #Print state.
-                if video_path.exists(): #There is a video
-                    # video_path.unlink() #Unlink and delete #You may have issues because there may be a different user profile deleting this
-                    logging.info(f"Deleted {video_path}") #Print state for data
-                temp_dir.rmdir() #Remove the folder
-                logging.info(f"Removed directory {temp_dir}") #Print state to let know user.
-            except Exception as e: #If some file was lost in this try statement, it doesn't matter, the code still runs.
-                logging.warning(f"Error during temporary file cleanup: {e}") #Print state
-
+        # Decode video data
+        video_bytes = base64.b64decode(video_data.split(',')[1] if ',' in video_data else video_data)
+
+        # Retries of the same clip for the same conversation are answered from the idempotency cache
+        emotion_session_id = request.json.get('emotion_session_id')
+        conversation_id = conversation_session_id(request.json)
+        key = request_key('process-video', request.headers.get('Idempotency-Key'), video_bytes,
+                          scope=(conversation_id, emotion_session_id))
+        (payload, status), replayed = media_results.get_or_compute(
+            key, lambda: process_video_bytes(video_bytes, emotion_session_id, conversation_id)
+        )
+        return idempotent_response(payload, status, replayed)
+
+    except InFlightTimeout as e:
+        return in_flight_response(e)
     except Exception as e: #If major issues occur notify user.
         logging.exception("Error in process_video endpoint:") #Print.
         return jsonify({ #Return information and set variable all with json variable and with key value sets.
@@ -331,6 +468,66 @@ def chat():
             'details': str(e)
         }), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Stream an emotion-aware chat response sentence by sentence
+
+    Expects JSON with 'message', optional 'emotion' (default 'neutral') and
+    optional 'speak' to include base64 MP3 speech for every sentence.
+    Answers with newline-delimited JSON: one {"type": "sentence"} object per
+    sentence as soon as it is generated, then {"type": "done"} with the full
+    response, so the client can start playback on the first sentence.
+    """
+    data = request.get_json(silent=True)
+    if not data or 'message' not in data:
+        logging.warning("No message provided")
+        return jsonify({'error': 'No message provided'}), 400
+
+    message = data['message']
+    emotion_data = {'dominant_emotion': data.get('emotion', 'neutral')}
+    speak = bool(data.get('speak'))
+    conversation_id = conversation_session_id(data)
+
+    def synthesise(index, sentence):
+        event = {'type': 'sentence', 'index': index, 'text': sentence}
+        try:
+            speech = client.audio.speech.create(model="tts-1", voice="alloy", input=sentence)
+            event['audio'] = base64.b64encode(speech.content).decode('utf-8')
+        except Exception as e:
+            logging.error(f"Text-to-speech failed for sentence {index}: {e}")
+        return event
+
+    def generate():
+        sentences = []
+        # Sentences being synthesised, sent in order as soon as their speech is ready
+        pending = deque()
+        try:
+            for index, sentence in enumerate(speech_agent.stream_response(message, emotion_data, conversation_id)):
+                sentences.append(sentence)
+                if not speak:
+                    yield json.dumps({'type': 'sentence', 'index': index, 'text': sentence}) + '\n'
+                    continue
+                pending.append(tts_executor.submit(synthesise, index, sentence))
+                while pending and pending[0].done():
+                    yield json.dumps(pending.popleft().result()) + '\n'
+            while pending:
+                yield json.dumps(pending.popleft().result()) + '\n'
+        finally:
+            # The client went away: do not synthesise sentences nobody will hear
+            for future in pending:
+                future.cancel()
+        yield json.dumps({'type': 'done', 'response': ' '.join(sentences)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/conversations', methods=['GET'])
+def conversation_stats():
+    """Conversation session count, memory use and eviction counters, plus context, memory index and response cache counters"""
+    return jsonify(dict(speech_agent.conversations.stats(), context=speech_agent.context_builder.stats(),
+                        memory=speech_agent.memory.stats(),
+                        response_cache=speech_agent.response_cache.stats() if speech_agent.response_cache else None))
+
 @app.route('/api/search-youtube', methods=['POST'])
 def search_youtube():
     """
@@ -385,7 +582,8 @@ def search_youtube():
 def process_emotion():
     """ #DocStrings
     Process video frame for emotion detection
-    Expects base64 encoded image data
+    Expects base64 encoded image data, optionally with a 'session_id' to update a streaming session.
+    An unknown session_id starts a new session; the response carries the id to use from then on.
     """
     logging.info("process_emotion endpoint called") #Log
 
@@ -398,8 +596,20 @@ def process_emotion():
                 'error': 'No frame data provided' #Error that there is no data.
             }), 400
 
+        frame = data['frame']
+        frame_bytes = base64.b64decode(frame.split(',')[1] if ',' in frame else frame)
+
+        # Update the streaming session if the client has one
+        if data.get('session_id'):
+            try:
+                session = emotion_sessions.get_or_create(data['session_id'])
+            except PermissionError as e:
+                logging.warning(str(e))
+                return jsonify({'error': 'Emotion session is in use by another connection'}), 403
+            return jsonify(session.process_frame(frame_bytes, data.get('timestamp')))
+
         # Process the frame
-        result = speech_agent.process_emotion(data['frame']) #set result.
+        result = speech_agent.process_frame(frame_bytes) #set result.
         return jsonify(result) #return that value
 
     except Exception as e: #There is data
@@ -409,6 +619,158 @@ def process_emotion():
             'details': str(e) #Extra steps.
         }), 500
 
+@sock.route('/api/emotion-stream')
+def emotion_stream(ws):
+    """
+    Stream video frames for real-time emotion tracking over a WebSocket
+
+    Messages from the client are either binary JPEG frames or JSON text
+    {"frame": <base64 image>, "timestamp": <seconds>}. Every frame is answered
+    with the session's smoothed emotion state. Every connection starts a new
+    session with a server-issued id, held by the connection until it closes.
+    Pass the announced session_id as 'emotion_session_id' to /api/process-video
+    to reuse the result.
+    """
+    session = emotion_sessions.get_or_create(owner=ws)
+    try:
+        ws.send(json.dumps({'type': 'session', 'session_id': session.session_id}))
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
+
+            try:
+                timestamp = None
+                if isinstance(message, str):
+                    data = json.loads(message)
+                    frame = data['frame']
+                    frame_bytes = base64.b64decode(frame.split(',')[1] if ',' in frame else frame)
+                    timestamp = data.get('timestamp')
+                else:
+                    frame_bytes = message
+
+                update = session.process_frame(frame_bytes, timestamp)
+                update['type'] = 'emotion'
+                ws.send(json.dumps(update))
+
+            except Exception as e:
+                logging.exception("Error in emotion_stream:")
+                ws.send(json.dumps({
+                    'type': 'error',
+                    'error': 'Failed to process frame',
+                    'details': str(e)
+                }))
+    finally:
+        emotion_sessions.release(session.session_id, ws)
+
+@sock.route('/api/wake-word-stream')
+def wake_word_stream(ws):
+    """
+    Detect the wake word in a continuous audio stream over a WebSocket
+
+    The client sends raw little-endian 16-bit mono PCM as binary messages, at
+    the sample_rate given in the query string (8000 to 48000, default 16000).
+    The server scores overlapping windows of the latest audio on a worker
+    thread and sends a 'wake' event for every detection.
+    """
+    try:
+        sample_rate = int(request.args.get('sample_rate', Config.WAKE_STREAM_SAMPLE_RATE))
+        validate_sample_rate(sample_rate)
+        stream = WakeWordStream(
+            audio_processor,
+            sample_rate=sample_rate,
+            window_seconds=Config.WAKE_STREAM_WINDOW_SECONDS,
+            hop_seconds=Config.WAKE_STREAM_HOP_SECONDS
+        )
+    except ValueError as e:
+        ws.send(json.dumps({'type': 'error', 'error': 'Invalid stream parameters', 'details': str(e)}))
+        return
+
+    ws.send(json.dumps({
+        'type': 'ready',
+        'sample_rate': sample_rate,
+        'window_seconds': Config.WAKE_STREAM_WINDOW_SECONDS,
+        'hop_seconds': Config.WAKE_STREAM_HOP_SECONDS
+    }))
+
+    # Events are sent from the worker thread, errors from this one
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            ws.send(json.dumps(message))
+
+    def on_event(event):
+        event['type'] = 'wake'
+        try:
+            send(event)
+        except Exception as e:
+            logging.warning(f"Could not send wake event: {e}")
+
+    worker = WakeWordWorker(stream, on_event)
+    try:
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
+            if isinstance(message, str):
+                send({'type': 'error', 'error': 'Expected binary PCM audio'})
+                continue
+
+            try:
+                worker.feed(message)
+
+            except Exception as e:
+                logging.exception("Error in wake_word_stream:")
+                send({
+                    'type': 'error',
+                    'error': 'Failed to process audio',
+                    'details': str(e)
+                })
+    finally:
+        worker.close()
+
+@app.route('/api/transcribe', methods=['POST'])
+def transcribe():
+    """
+    Transcribe a long recording, such as a reminiscence session
+
+    Expects a multipart upload in the 'audio' field (wav, mp3, m4a or webm).
+    The upload is spooled to disk and streamed from there, so its length is
+    not limited by memory or by the recognizer's single-request limit.
+    """
+    upload = request.files.get('audio')
+    if upload is None or not upload.filename:
+        return jsonify({'success': False, 'error': 'No audio file provided'}), 400
+    if not Config.allowed_file(upload.filename):
+        return jsonify({'success': False, 'error': 'Unsupported audio file type'}), 400
+
+    temp_dir = Path(tempfile.mkdtemp())
+    audio_path = temp_dir / f"{uuid.uuid4()}.{upload.filename.rsplit('.', 1)[1].lower()}"
+    try:
+        upload.save(str(audio_path))
+        result = segmented_transcriber.transcribe_file(str(audio_path), audio_processor.audio_decoder)
+        result['success'] = True
+        return jsonify(result)
+    except AudioDecodeError as e:
+        logging.error(f"Failed to decode recording: {e}")
+        return jsonify({'success': False, 'error': 'Failed to decode audio'}), 400
+    except Exception as e:
+        logging.exception("Error in transcribe endpoint:")
+        return jsonify({'success': False, 'error': 'Failed to transcribe audio', 'details': str(e)}), 500
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+@app.route('/api/asr/stats', methods=['GET'])
+def asr_stats():
+    """Per-backend speech recognition latency percentiles and hedging counters"""
+    return jsonify(asr_service.stats())
+
+@app.route('/api/commands/stats', methods=['GET'])
+def command_stats():
+    """Hit and miss counters of the search query and media URL caches"""
+    return jsonify(command_scraper.cache_stats())
+
 @app.route('/api/test', methods=['GET', 'POST'])
 def test_endpoint():
     """Test endpoint to verify API is working"""
@@ -499,4 +861,4 @@ def not_found_error(error):
     }), 404
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
@@ -0,0 +1,488 @@
+"""
+Speech recognition backends with deadlines, hedging and latency statistics
+
+Every transcription goes through an ASRService, which calls interchangeable
+backends (Google via speech_recognition, OpenAI Whisper, or a local stub).
+Each call has a deadline, and when the primary backend has not answered
+within its tail latency a second backend is asked as well; whichever answers
+first wins. Latency percentiles are kept per backend for monitoring and for
+choosing the hedge delay.
+
+Backends declare the audio format they want. Extraction paths decode to the
+service's sample_rate, and anything that still arrives in another format is
+converted once, here, before it is uploaded.
+"""
+import io
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import speech_recognition as sr
+
+ASR_BACKENDS = ('google', 'whisper', 'stub')
+
+
+class ASRError(Exception):
+    """Raised when a speech recognition service fails"""
+
+
+class ASRTimeout(ASRError):
+    """Raised when no backend answered before the deadline"""
+
+
+class SpeechNotUnderstood(Exception):
+    """Raised when a backend answered but could not make out any speech"""
+
+
+def audio_data_from_samples(samples, sample_rate):
+    """
+    Wrap decoded samples as recognizer audio without copying them
+
+    Args:
+        samples (numpy.ndarray): Mono int16 samples
+        sample_rate (int): Sample rate in Hz
+
+    Returns:
+        sr.AudioData: Audio whose frame data is a byte view of the samples
+    """
+    samples = np.ascontiguousarray(samples, dtype='<i2')
+    return sr.AudioData(memoryview(samples).cast('B'), sample_rate, 2)
+
+
+def create_recognizer():
+    """Create a speech recognizer with the wake word settings"""
+    recognizer = sr.Recognizer()
+    recognizer.energy_threshold = 300
+    recognizer.dynamic_energy_threshold = True
+    recognizer.pause_threshold = 0.5
+    recognizer.phrase_threshold = 0.3
+    return recognizer
+
+
+class RecognizerPool:
+    """Lends each request its own recognizer, so per-call recognizer state is never shared"""
+
+    def __init__(self, size=4, factory=create_recognizer):
+        """
+        Initialize the pool
+
+        Args:
+            size (int): Number of idle recognizers kept for reuse
+            factory (callable): Creates a new recognizer
+        """
+        self.size = size
+        self._factory = factory
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.created = 0
+        for _ in range(size):
+            self._idle.put(self._create())
+
+    def _create(self):
+        with self._lock:
+            self.created += 1
+        return self._factory()
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a recognizer for the duration of a with block, creating one if all are busy"""
+        try:
+            recognizer = self._idle.get_nowait()
+        except queue.Empty:
+            recognizer = self._create()
+        try:
+            yield recognizer
+        finally:
+            if self._idle.qsize() < self.size:
+                self._idle.put(recognizer)
+
+
+class ASRBackend:
+    """Base class for speech recognition backends"""
+
+    name = 'base'
+    # Audio format the service expects; uploading more than this only costs bandwidth
+    sample_rate = 16000
+    channels = 1
+
+    def transcribe(self, audio, language='en-US', timeout=None):
+        """
+        Transcribe audio
+
+        Args:
+            audio (sr.AudioData): Audio to transcribe
+            language (str): BCP-47 language tag
+            timeout (float): Seconds the service call may take
+
+        Returns:
+            str: Transcribed text
+
+        Raises:
+            SpeechNotUnderstood: The audio contained no recognisable speech
+            ASRError: The service failed
+        """
+        raise NotImplementedError
+
+
+class GoogleASRBackend(ASRBackend):
+    """Google Web Speech API through speech_recognition"""
+
+    name = 'google'
+
+    def __init__(self, recognizer_pool=None):
+        self.recognizer_pool = recognizer_pool or RecognizerPool()
+
+    def transcribe(self, audio, language='en-US', timeout=None):
+        with self.recognizer_pool.acquire() as recognizer:
+            recognizer.operation_timeout = timeout
+            try:
+                return recognizer.recognize_google(audio, language=language)
+            except sr.UnknownValueError:
+                raise SpeechNotUnderstood()
+            except sr.RequestError as e:
+                raise ASRError(str(e)) from e
+
+
+class WhisperASRBackend(ASRBackend):
+    """OpenAI Whisper transcription API"""
+
+    name = 'whisper'
+
+    def __init__(self, client=None, model='whisper-1'):
+        """
+        Initialize the backend
+
+        Args:
+            client (openai.OpenAI): OpenAI client, created from the environment if None
+            model (str): Transcription model
+        """
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI()
+        self.client = client
+        self.model = model
+
+    def transcribe(self, audio, language='en-US', timeout=None):
+        wav_file = io.BytesIO(audio.get_wav_data())
+        wav_file.name = 'audio.wav'
+        try:
+            transcript = self.client.audio.transcriptions.create(
+                model=self.model,
+                file=wav_file,
+                language=language.split('-')[0],
+                timeout=timeout
+            )
+        except Exception as e:
+            raise ASRError(f"Whisper transcription failed: {e}") from e
+        text = transcript.text.strip()
+        if not text:
+            raise SpeechNotUnderstood()
+        return text
+
+
+class StubASRBackend(ASRBackend):
+    """Local backend answering with a fixed transcription, for offline development and tests"""
+
+    name = 'stub'
+
+    def __init__(self, text='', latency=0.0):
+        """
+        Initialize the backend
+
+        Args:
+            text (str): Transcription returned for every call, empty means not understood
+            latency (float): Seconds each call takes
+        """
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.text = text
+        self.latency = latency
+
+    def transcribe(self, audio, language='en-US', timeout=None):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.text:
+            raise SpeechNotUnderstood()
+        return self.text
+
+
+def create_asr_backend(name, recognizer_pool=None, openai_client=None, whisper_model='whisper-1', stub_text=''):
+    """
+    Create a speech recognition backend by name
+
+    Args:
+        name (str): One of ASR_BACKENDS
+        recognizer_pool (RecognizerPool): Recognizers for the google backend
+        openai_client (openai.OpenAI): Client for the whisper backend
+        whisper_model (str): Model for the whisper backend
+        stub_text (str): Transcription returned by the stub backend
+
+    Returns:
+        ASRBackend: The backend
+    """
+    if name == 'google':
+        return GoogleASRBackend(recognizer_pool)
+    if name == 'whisper':
+        return WhisperASRBackend(openai_client, whisper_model)
+    if name == 'stub':
+        return StubASRBackend(stub_text)
+    raise ValueError(f"Unknown ASR backend '{name}', expected one of: {', '.join(ASR_BACKENDS)}")
+
+
+class LatencyStats:
+    """Rolling latency window and outcome counters for one backend"""
+
+    def __init__(self, window=500):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+
+    def record(self, latency, error=False):
+        with self._lock:
+            self.calls += 1
+            if error:
+                self.errors += 1
+            else:
+                self._latencies.append(latency)
+
+    def record_win(self):
+        with self._lock:
+            self.wins += 1
+
+    def percentile(self, p):
+        """Latency percentile in seconds over the window, None without samples"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._latencies)
+
+    def summary(self):
+        with self._lock:
+            counts = {'calls': self.calls, 'errors': self.errors, 'wins': self.wins}
+        for p in (50, 95, 99):
+            latency = self.percentile(p)
+            counts[f'p{p}_ms'] = round(latency * 1000, 1) if latency is not None else None
+        return counts
+
+
+class ASRService:
+    """Runs transcriptions against one or two backends under a deadline"""
+
+    def __init__(self, backends, deadline=10.0, hedge_after=2.0, hedge_percentile=95,
+                 min_samples=20, max_workers=8):
+        """
+        Initialize the service
+
+        Args:
+            backends (list): ASRBackend instances, the first is the primary and the second,
+                             if given, is used for hedging
+            deadline (float): Seconds a transcription may take in total
+            hedge_after (float): Seconds to wait for the primary before also asking the second
+                                 backend, used until enough latencies are recorded. None disables hedging.
+            hedge_percentile (int): Once min_samples primary latencies are known, hedge when
+                                    the primary is slower than this percentile
+            min_samples (int): Latencies needed before the percentile replaces hedge_after
+            max_workers (int): Threads running backend calls
+        """
+        if not backends:
+            raise ValueError("At least one ASR backend is required")
+        self.backends = list(backends)
+        if any(backend.channels != 1 for backend in self.backends):
+            raise ValueError("ASR backends must take mono audio")
+        # A hedged request sends the same audio to both backends, so use the richer format
+        self.sample_rate = max(backend.sample_rate for backend in self.backends)
+        self.channels = 1
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.latency = {backend.name: LatencyStats() for backend in self.backends}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asr')
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.timeouts = 0
+        self.resampled = 0
+        self.bytes_sent = 0
+
+    def _call(self, backend, audio, language, timeout):
+        """Run one backend call and record its latency"""
+        start = time.perf_counter()
+        try:
+            text = backend.transcribe(audio, language=language, timeout=timeout)
+        except SpeechNotUnderstood:
+            # A definite answer, so it counts towards latency rather than errors
+            self.latency[backend.name].record(time.perf_counter() - start)
+            raise
+        except Exception:
+            self.latency[backend.name].record(time.perf_counter() - start, error=True)
+            raise
+        self.latency[backend.name].record(time.perf_counter() - start)
+        return text
+
+    @staticmethod
+    def _answered(future):
+        """Whether a finished call produced an answer, including 'no speech', rather than failing"""
+        error = future.exception()
+        return error is None or isinstance(error, SpeechNotUnderstood)
+
+    def prepare(self, audio):
+        """
+        Convert audio to the backends' format if it is not in it already
+
+        Args:
+            audio (sr.AudioData): Audio from any extraction path
+
+        Returns:
+            sr.AudioData: 16-bit audio at the service's sample rate
+        """
+        if audio.sample_rate == self.sample_rate and audio.sample_width == 2:
+            return audio
+        raw = audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2)
+        logging.info(f"Resampled ASR audio from {audio.sample_rate} Hz/{audio.sample_width * 8}-bit to "
+                     f"{self.sample_rate} Hz/16-bit ({len(audio.frame_data)} -> {len(raw)} bytes)")
+        with self._lock:
+            self.resampled += 1
+        return sr.AudioData(raw, self.sample_rate, 2)
+
+    def hedge_delay(self):
+        """Seconds to wait for the primary before hedging, None if hedging is off"""
+        if self.hedge_after is None or len(self.backends) < 2:
+            return None
+        stats = self.latency[self.backends[0].name]
+        if len(stats) >= self.min_samples:
+            return stats.percentile(self.hedge_percentile)
+        return self.hedge_after
+
+    def transcribe(self, audio, language='en-US'):
+        """
+        Transcribe audio with the fastest answering backend
+
+        Args:
+            audio (sr.AudioData): Audio to transcribe
+            language (str): BCP-47 language tag
+
+        Returns:
+            dict: text, backend that answered, latency_ms and whether the call was hedged
+
+        Raises:
+            SpeechNotUnderstood: The winning backend could not make out any speech
+            ASRTimeout: No backend answered before the deadline
+            ASRError: Every backend that was asked failed
+        """
+        start = time.perf_counter()
+        deadline_at = start + self.deadline
+        audio = self.prepare(audio)
+        payload = len(audio.frame_data)
+        logging.info(f"ASR payload {payload} bytes, {payload / (2 * self.sample_rate):.2f}s at {self.sample_rate} Hz")
+        with self._lock:
+            self.bytes_sent += payload
+        primary = self.backends[0]
+        futures = {self._executor.submit(self._call, primary, audio, language, self.deadline): primary}
+
+        delay = self.hedge_delay()
+        hedged = False
+        if delay is not None:
+            done, _ = wait(futures, timeout=min(delay, self.deadline))
+            answered = any(self._answered(future) for future in done)
+            if not answered:
+                # Primary is slow or failed: ask the second backend with the time that is left
+                hedged = True
+                secondary = self.backends[1]
+                remaining = max(0.0, deadline_at - time.perf_counter())
+                futures[self._executor.submit(self._call, secondary, audio, language, remaining)] = secondary
+                with self._lock:
+                    self.hedged += 1
+                    self.bytes_sent += payload
+
+        pending = set(futures)
+        last_error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline_at - time.perf_counter()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                error = future.exception()
+                if self._answered(future):
+                    backend = futures[future]
+                    self.latency[backend.name].record_win()
+                    if error is not None:
+                        raise error
+                    return {
+                        'text': future.result(),
+                        'backend': backend.name,
+                        'latency_ms': (time.perf_counter() - start) * 1000,
+                        'hedged': hedged
+                    }
+                logging.warning(f"ASR backend {futures[future].name} failed: {error}")
+                last_error = error
+
+        if pending:
+            with self._lock:
+                self.timeouts += 1
+            raise ASRTimeout(f"No ASR backend answered within {self.deadline}s")
+        raise ASRError(str(last_error)) from last_error
+
+    def stats(self):
+        """Get per-backend latency percentiles, hedging counters and upload volume"""
+        with self._lock:
+            stats = {
+                'hedged': self.hedged,
+                'timeouts': self.timeouts,
+                'sample_rate': self.sample_rate,
+                'resampled': self.resampled,
+                'bytes_sent': self.bytes_sent
+            }
+        delay = self.hedge_delay()
+        stats['hedge_delay_ms'] = round(delay * 1000, 1) if delay is not None else None
+        stats['backends'] = {name: latency.summary() for name, latency in self.latency.items()}
+        return stats
+
+
+def create_asr_service(names, recognizer_pool_size=4, openai_client=None, whisper_model='whisper-1', stub_text='',
+                       deadline=10.0, hedge_after=2.0):
+    """
+    Create an ASRService over backends given by name
+
+    The recognizer pool is only built when a google backend is configured.
+
+    Args:
+        names (list): Backend names from ASR_BACKENDS, primary first
+        recognizer_pool_size (int): Idle recognizers kept for the google backend
+        openai_client (openai.OpenAI): Client for the whisper backend
+        whisper_model (str): Model for the whisper backend
+        stub_text (str): Transcription returned by the stub backend
+        deadline (float): Seconds a transcription may take in total
+        hedge_after (float): Seconds before hedging to the second backend, None disables hedging
+
+    Returns:
+        ASRService: The service
+    """
+    recognizer_pool = RecognizerPool(size=recognizer_pool_size) if 'google' in names else None
+    return ASRService(
+        [
+            create_asr_backend(
+                name,
+                recognizer_pool=recognizer_pool,
+                openai_client=openai_client,
+                whisper_model=whisper_model,
+                stub_text=stub_text
+            )
+            for name in names
+        ],
+        deadline=deadline,
+        hedge_after=hedge_after
+    )
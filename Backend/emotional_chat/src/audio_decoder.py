@@ -0,0 +1,326 @@
+"""
+Audio decoding without a process spawn per request
+
+Compressed uploads (WebM/Opus from the tablets, video containers) are decoded
+to mono 16-bit PCM by one of two backends:
+
+- ``pyav``: decodes in-process through the FFmpeg libraries (``av`` package),
+  the default
+- ``ffmpeg``: a fallback for hosts without PyAV. ffmpeg decodes one container
+  per process, so every upload still needs its own process; they are started
+  ahead of time so the spawn overlaps the previous request instead of
+  delaying this one, which hides spawn latency but is not faster than PyAV
+
+16-bit PCM WAV input skips both and is read directly. Long recordings can be
+streamed from disk in blocks with stream_file(), so they are never held in
+memory whole.
+"""
+import io
+import queue
+import itertools
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .wake_word_spotter import read_wav
+
+try:
+    import av
+except ImportError:
+    av = None
+
+AUDIO_DECODER_BACKENDS = ('auto', 'pyav', 'ffmpeg')
+
+
+class AudioDecodeError(Exception):
+    """Raised when audio data cannot be decoded"""
+
+
+class FFmpegWorkerPool:
+    """Keeps single-use ffmpeg processes started ahead of time, replacing each one after its decode"""
+
+    def __init__(self, command, size=2):
+        """
+        Initialize the pool
+
+        Args:
+            command (list): ffmpeg command line reading from stdin and writing to stdout
+            size (int): Number of idle processes kept ready
+        """
+        self.command = command
+        self.size = size
+        self._idle = queue.Queue()
+        self._spawner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ffmpeg-pool')
+        self._lock = threading.Lock()
+        self._closed = False
+        self.warm = 0
+        self.cold = 0
+        for _ in range(size):
+            self._spawner.submit(self._spawn_idle)
+
+    def _spawn(self):
+        return subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+
+    def _spawn_idle(self):
+        # Replacements queued during a burst must not grow the pool past its size
+        if self._idle.qsize() >= self.size:
+            return
+        try:
+            process = self._spawn()
+        except Exception as e:
+            logging.error(f"Failed to start ffmpeg worker: {e}")
+            return
+        with self._lock:
+            closed = self._closed
+        if closed:
+            process.kill()
+            process.wait()
+        else:
+            self._idle.put(process)
+
+    def _acquire(self):
+        """Take an idle process, or start one if none is ready"""
+        while True:
+            try:
+                process = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    self.cold += 1
+                return self._spawn()
+            if process.poll() is None:
+                with self._lock:
+                    self.warm += 1
+                return process
+            # Exited while idle, drop it and try the next one
+            process.wait()
+
+    def run(self, data, timeout=30):
+        """
+        Feed data to a worker and collect its output
+
+        Args:
+            data (bytes): Input written to the worker's stdin
+            timeout (float): Seconds to wait for the worker to finish
+
+        Returns:
+            bytes: Everything the worker wrote to stdout
+        """
+        process = self._acquire()
+        try:
+            stdout, stderr = process.communicate(input=data, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise AudioDecodeError(f"ffmpeg did not finish within {timeout}s")
+        except BrokenPipeError:
+            stdout, stderr = process.communicate()
+        finally:
+            # Replace the worker once this decode is done, so the spawn does not compete with it
+            with self._lock:
+                if not self._closed:
+                    self._spawner.submit(self._spawn_idle)
+        if process.returncode != 0:
+            raise AudioDecodeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+        return stdout
+
+    def stats(self):
+        """Get how many requests found a warm worker"""
+        with self._lock:
+            return {'size': self.size, 'idle': self._idle.qsize(), 'warm': self.warm, 'cold': self.cold}
+
+    def close(self):
+        """Stop all idle workers"""
+        with self._lock:
+            self._closed = True
+        self._spawner.shutdown(wait=True)
+        while True:
+            try:
+                process = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            process.kill()
+            process.wait()
+
+
+class AudioDecoder:
+    """Decodes audio uploads to mono 16-bit PCM"""
+
+    def __init__(self, backend='auto', sample_rate=16000, pool_size=2, ffmpeg_path='ffmpeg', timeout=30):
+        """
+        Initialize the decoder
+
+        Args:
+            backend (str): 'pyav', 'ffmpeg', or 'auto' to use pyav when it is installed
+            sample_rate (int): Sample rate compressed audio is decoded to
+            pool_size (int): Idle processes kept by the ffmpeg backend
+            ffmpeg_path (str): ffmpeg executable for the ffmpeg backend
+            timeout (float): Seconds one ffmpeg decode may take
+        """
+        if backend not in AUDIO_DECODER_BACKENDS:
+            raise ValueError(f"Unknown audio decoder backend '{backend}', "
+                             f"expected one of: {', '.join(AUDIO_DECODER_BACKENDS)}")
+        if backend == 'pyav' and av is None:
+            raise ValueError("The pyav audio decoder needs the 'av' package")
+        if backend == 'auto':
+            backend = 'pyav' if av is not None else 'ffmpeg'
+
+        self.backend = backend
+        self.sample_rate = sample_rate
+        self.ffmpeg_path = ffmpeg_path
+        self.timeout = timeout
+        self._pool = None
+        if backend == 'ffmpeg':
+            self._pool = FFmpegWorkerPool([
+                ffmpeg_path,
+                '-v', 'error',
+                '-i', 'pipe:0',
+                '-vn',  # No video
+                '-f', 's16le',  # Raw little-endian 16-bit PCM
+                '-ac', '1',  # Mono
+                '-ar', str(sample_rate),
+                'pipe:1'
+            ], size=pool_size)
+        logging.info(f"Audio decoder using {backend} backend")
+
+    def decode(self, data):
+        """
+        Decode audio data
+
+        WAV input keeps its own sample rate; everything else is resampled to
+        the decoder's sample rate.
+
+        Args:
+            data (bytes): Encoded audio, or a video container with an audio stream
+
+        Returns:
+            tuple: (numpy.ndarray of mono int16 samples, sample rate)
+        """
+        if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+            try:
+                return read_wav(io.BytesIO(data))
+            except Exception:
+                # Not 16-bit PCM, let the backend convert it
+                pass
+
+        try:
+            if self.backend == 'pyav':
+                samples = self._decode_pyav(data)
+            else:
+                samples = np.frombuffer(self._pool.run(data, self.timeout), dtype='<i2')
+        except AudioDecodeError:
+            raise
+        except Exception as e:
+            raise AudioDecodeError(f"Failed to decode audio: {e}") from e
+        return samples, self.sample_rate
+
+    def decode_file(self, path):
+        """Decode an audio or video file, see decode()"""
+        with open(path, 'rb') as f:
+            return self.decode(f.read())
+
+    def stream_file(self, path, block_seconds=1.0):
+        """
+        Decode an audio or video file incrementally
+
+        The ffmpeg backend starts a dedicated process reading the file itself,
+        since a pooled worker would need the whole file on stdin.
+
+        Args:
+            path (str): Path to the file
+            block_seconds (float): Approximate length of each yielded block
+
+        Yields:
+            numpy.ndarray: Consecutive blocks of mono int16 samples at the decoder's sample rate
+        """
+        block = max(1, int(block_seconds * self.sample_rate))
+        if self.backend == 'pyav':
+            yield from self._stream_pyav(str(path), block)
+        else:
+            yield from self._stream_ffmpeg(str(path), block)
+
+    def _stream_pyav(self, path, block):
+        pending = []
+        pending_len = 0
+        try:
+            with av.open(path) as container:
+                if not container.streams.audio:
+                    raise AudioDecodeError("No audio stream found")
+                resampler = av.AudioResampler(format='s16', layout='mono', rate=self.sample_rate)
+                frames = container.decode(container.streams.audio[0])
+                for frame in itertools.chain(frames, [None]):
+                    # The trailing None flushes samples still buffered in the resampler
+                    for resampled in resampler.resample(frame):
+                        samples = resampled.to_ndarray().reshape(-1).astype(np.int16, copy=False)
+                        pending.append(samples)
+                        pending_len += len(samples)
+                    if pending_len >= block:
+                        yield np.concatenate(pending)
+                        pending, pending_len = [], 0
+        except AudioDecodeError:
+            raise
+        except Exception as e:
+            raise AudioDecodeError(f"Failed to decode audio: {e}") from e
+        if pending_len:
+            yield np.concatenate(pending)
+
+    def _stream_ffmpeg(self, path, block):
+        process = subprocess.Popen([
+            self.ffmpeg_path,
+            '-v', 'error',
+            '-i', path,
+            '-vn',  # No video
+            '-f', 's16le',  # Raw little-endian 16-bit PCM
+            '-ac', '1',  # Mono
+            '-ar', str(self.sample_rate),
+            'pipe:1'
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            while True:
+                data = process.stdout.read(2 * block)
+                if not data:
+                    break
+                yield np.frombuffer(data[:len(data) - len(data) % 2], dtype='<i2')
+            process.wait(timeout=self.timeout)
+            if process.returncode != 0:
+                raise AudioDecodeError(f"ffmpeg failed: {process.stderr.read().decode(errors='replace').strip()}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+    def _decode_pyav(self, data):
+        """Decode and resample in-process with PyAV"""
+        chunks = []
+        with av.open(io.BytesIO(data)) as container:
+            if not container.streams.audio:
+                raise AudioDecodeError("No audio stream found")
+            resampler = av.AudioResampler(format='s16', layout='mono', rate=self.sample_rate)
+            for frame in container.decode(container.streams.audio[0]):
+                for resampled in resampler.resample(frame):
+                    chunks.append(resampled.to_ndarray().reshape(-1))
+            # Flush samples still buffered in the resampler
+            for resampled in resampler.resample(None):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+        if not chunks:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(chunks).astype(np.int16, copy=False)
+
+    def stats(self):
+        """Get backend name and, for the ffmpeg backend, pool statistics"""
+        stats = {'backend': self.backend}
+        if self._pool is not None:
+            stats['pool'] = self._pool.stats()
+        return stats
+
+    def close(self):
+        """Release pooled processes"""
+        if self._pool is not None:
+            self._pool.close()
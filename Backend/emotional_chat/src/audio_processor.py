@@ -1,212 +1,138 @@
 """
 Audio processing module for handling different audio formats and wake word detection
 """
-import os
-import io
+import uuid
+import wave
 import base64
-import tempfile
 import logging
 from pathlib import Path
-import speech_recognition as sr
-import subprocess
-import numpy as np
-import soundfile as sf
+from .wake_word_spotter import WakeWordSpotter, ACCEPT, ESCALATE
+from .audio_decoder import AudioDecoder, AudioDecodeError
+from .voice_activity import VoiceActivityDetector
+from .asr import (ASRService, GoogleASRBackend, ASRError, ASRTimeout, SpeechNotUnderstood,
+                  audio_data_from_samples)
 
 class AudioProcessor:
-    """Audio processing class for handling different audio formats and wake word detection"""
+    """
+    Audio processing class for handling different audio formats and wake word detection
 
-    def __init__(self):
-        """Initialize the audio processor"""
-        self.recognizer = sr.Recognizer()
-        self.temp_dir = Path(tempfile.mkdtemp())
-        self.ffmpeg_path = "ffmpeg"  # Rely on the system PATH, was C:\ffmpeg\bin\ffmpeg.exe
-        self.wake_words = ['eva', 'ava']
+    Safe to share between request threads: every request works on its own
+    in-memory buffers, and the ASR service lends each call its own recognizer.
+    """
 
-        # Configure speech recognition settings
-        self.recognizer.energy_threshold = 300
-        self.recognizer.dynamic_energy_threshold = True
-        self.recognizer.pause_threshold = 0.5
-        self.recognizer.phrase_threshold = 0.3
+    def __init__(self, wake_word_spotter=None, voice_activity_detector=None, audio_decoder=None,
+                 asr_service=None, chunk_deduplicator=None, debug_capture_dir=None):
+        """
+        Initialize the audio processor
 
-        # Create temp directory if it doesn't exist
-        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        Args:
+            wake_word_spotter (WakeWordSpotter): Local keyword spotter, without templates every
+                                                 wake word chunk goes to cloud speech recognition
+            voice_activity_detector (VoiceActivityDetector): Filters out clips without speech
+                                                             before any recognition runs
+            audio_decoder (AudioDecoder): Decodes compressed uploads without spawning ffmpeg per request,
+                                          should decode to asr_service.sample_rate
+            asr_service (ASRService): Cloud speech recognition, Google only by default
+            chunk_deduplicator (ChunkDeduplicator): Skips audio a client already sent in its
+                                                    previous overlapping chunk, disabled if None
+            debug_capture_dir (str or Path): Folder every analysed clip is saved to as WAV for
+                                             debugging. Audio otherwise never touches the disk.
+        """
+        self.wake_word_spotter = wake_word_spotter or WakeWordSpotter()
+        self.voice_activity_detector = voice_activity_detector or VoiceActivityDetector()
+        self.asr_service = asr_service or ASRService([GoogleASRBackend()])
+        # Decode straight to the rate speech recognition wants, so audio is resampled only once
+        self.audio_decoder = audio_decoder or AudioDecoder(sample_rate=self.asr_service.sample_rate)
+        self.chunk_deduplicator = chunk_deduplicator
+        self.debug_capture_dir = Path(debug_capture_dir) if debug_capture_dir else None
+        if self.debug_capture_dir:
+            self.debug_capture_dir.mkdir(parents=True, exist_ok=True)
+        self.wake_words = ('eva', 'ava')
 
-    def process_audio_data_base64(self, base64_audio):
+    def process_audio_data_base64(self, audio_base64):
         """
-        Process base64 encoded audio data for wake word detection
+        Process audio data for wake word detection from base64 encoded WAV.
 
         Args:
-            base64_audio (str): Base64 encoded audio data
+            audio_base64 (str): Base64 encoded WAV audio data.
 
         Returns:
-            dict: Result containing wake word detection status and transcription
+            dict: Result containing wake word detection status and transcription.
         """
         try:
-            # Decode base64 data
-            audio_bytes = base64.b64decode(base64_audio)
-            
-            # Create a BytesIO object
-            audio_stream = io.BytesIO(audio_bytes)
-            
-            # Create temporary WAV file
-            temp_wav = self.temp_dir / "temp_audio.wav"
-            
-            # Convert WebM to WAV using ffmpeg
-            cmd = [
-                self.ffmpeg_path,
-                '-i', 'pipe:0',  # Read from stdin
-                '-f', 'wav',     # Output format
-                '-ar', '16000',  # Sample rate
-                '-ac', '1',      # Mono audio
-                str(temp_wav)    # Output file
-            ]
-            
-            try:
-                # Run ffmpeg
-                process = subprocess.Popen(
-                    cmd,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
-                
-                # Write audio data to ffmpeg's stdin
-                stdout, stderr = process.communicate(input=audio_bytes)
-                
-                if process.returncode != 0:
-                    logging.error(f"FFmpeg error: {stderr.decode()}")
-                    return {
-                        'success': False,
-                        'error': 'Failed to convert audio format'
-                    }
-                
-                # Process the WAV file
-                return self.process_audio_file(str(temp_wav))
-                
-            except Exception as e:
-                logging.error(f"Error converting audio: {str(e)}")
-                return {
-                    'success': False,
-                    'error': f'Error converting audio: {str(e)}'
-                }
-            
+            logging.info("process_audio_data_base64 called")
+
+            # Decode base64 to bytes
+            audio_bytes = base64.b64decode(audio_base64)
+
         except Exception as e:
-            logging.error(f"Error processing base64 audio: {str(e)}")
+            logging.exception("Error decoding audio:")
             return {
                 'success': False,
-                'error': f'Error processing base64 audio: {str(e)}'
+                'error': f'Error processing audio: {str(e)}'
             }
-            
-        finally:
-            # Cleanup temporary files
-            try:
-                if temp_wav.exists():
-                    temp_wav.unlink()
-            except Exception as e:
-                logging.warning(f"Error cleaning up temporary file: {str(e)}")
-
-    def _convert_webm_to_wav(self, webm_data):
+
+        return self.process_audio_bytes(audio_bytes)
+
+    def process_audio_bytes(self, audio_bytes, client_id=None):
         """
-        Convert WebM audio data to WAV format
+        Process audio bytes for wake word detection.
 
         Args:
-            webm_data (bytes): Raw WebM audio data
+            audio_bytes (bytes): WAV or compressed (e.g. WebM) audio data.
+            client_id (str): Recording device, lets overlapping chunks from it be deduplicated.
+                             None skips deduplication.
 
         Returns:
-            str: Path to the converted WAV file
+            dict: Result containing wake word detection status and transcription.
         """
         try:
-            # Create temporary files
-            webm_path = self.temp_dir / f"{uuid.uuid4()}.webm"
-            wav_path = self.temp_dir / f"{uuid.uuid4()}.wav"
-
-            # Write WebM data to temporary file
-            with open(webm_path, 'wb') as f:
-                f.write(webm_data)
-
-            # Convert to WAV using ffmpeg
-            command = [
-                self.ffmpeg_path,
-                '-i', str(webm_path),
-                '-acodec', 'pcm_s16le',
-                '-ar', '16000',
-                '-ac', '1',
-                '-y',  # Overwrite output file if it exists
-                str(wav_path)
-            ]
-
-            logging.info(f"Running conversion command: {' '.join(command)}") #log the command
-
-            process = subprocess.run(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-
-            if process.returncode != 0:
-                logging.error(f"FFmpeg conversion failed: {process.stderr}") #Log the error
-                raise Exception(f"FFmpeg conversion failed: {process.stderr}") #Properly raise the error
-
-            logging.info(f"Conversion successful, returning wav_path: {wav_path}")#Log the path
-            return str(wav_path)
+            # Decode into mono PCM samples
+            samples, sample_rate = self.audio_decoder.decode(audio_bytes)
 
-        except Exception as e:
-            logging.exception("Error converting WebM to WAV:")
-            raise Exception(f"Error converting WebM to WAV: {str(e)}")
+        except AudioDecodeError as e:
+            logging.error(f"Error decoding audio: {str(e)}")
+            return {
+                'success': False,
+                'error': 'Failed to convert audio format'
+            }
 
-    def process_audio_data_base64(self, audio_base64):
+        if client_id and self.chunk_deduplicator is not None:
+            return self.chunk_deduplicator.process(client_id, samples, sample_rate, self.detect_wake_word)
+        return self.detect_wake_word(samples, sample_rate)
+
+    def detect_wake_word(self, samples, sample_rate):
         """
-        Process audio data for wake word detection from base64 encoded WAV.
+        Detect the wake word in decoded audio.
 
         Args:
-            audio_base64 (str): Base64 encoded WAV audio data.
+            samples (numpy.ndarray): Mono int16 samples.
+            sample_rate (int): Sample rate in Hz.
 
         Returns:
             dict: Result containing wake word detection status and transcription.
         """
         try:
-            logging.info("process_audio_data_base64 called")
-
-            # Decode base64 to bytes
-            audio_bytes = base64.b64decode(audio_base64)
+            self._capture(samples, sample_rate)
+            samples = self._trim_to_speech(samples, sample_rate)
+            if samples is None:
+                return self._no_speech_result()
+
+            # Score the chunk locally and only ask the cloud when the result is close to the threshold
+            spot = self.wake_word_spotter.spot(samples, sample_rate)
+            if spot['decision'] != ESCALATE:
+                logging.info(f"Local wake word spotter: {spot['decision']} "
+                             f"(score {spot['score']:.2f}, {spot['elapsed_ms']:.1f} ms)")
+                wake_word_detected = spot['decision'] == ACCEPT
+                return {
+                    'success': True,
+                    'wake_word_detected': wake_word_detected,
+                    'detected_words': [spot['keyword']] if wake_word_detected else [],
+                    'detection': 'local',
+                    'score': spot['score']
+                }
 
-            # Create an in-memory file-like object
-            audio_stream = io.BytesIO(audio_bytes)
-
-            # Process the audio stream
-            with sr.AudioFile(audio_stream) as source:
-                logging.info("Recording audio from stream...")
-                audio = self.recognizer.record(source)
-
-                try:
-                    logging.info("Converting speech to text...")
-                    text = self.recognizer.recognize_google(audio, language='en-US').lower()
-                    logging.info(f"Transcribed text: {text}")
-
-                    wake_word_detected = any(word in text for word in self.wake_words)
-                    detected_words = [word for word in self.wake_words if word in text]
-
-                    return {
-                        'success': True,
-                        'wake_word_detected': wake_word_detected,
-                        'detected_words': detected_words,
-                        'transcription': text
-                    }
-
-                except sr.UnknownValueError:
-                    logging.warning("Speech recognition could not understand audio")
-                    return {
-                        'success': True,
-                        'wake_word_detected': False,
-                        'error': 'Could not understand audio'
-                    }
-                except sr.RequestError as e:
-                    logging.error(f"Error with speech recognition service: {str(e)}")
-                    return {
-                        'success': False,
-                        'error': f'Error with speech recognition service: {str(e)}'
-                    }
+            return self._recognize_wake_word(audio_data_from_samples(samples, sample_rate))
 
         except Exception as e:
             logging.exception("Error processing audio:")
@@ -215,13 +141,102 @@ class AudioProcessor:
                 'error': f'Error processing audio: {str(e)}'
             }
 
-        finally:
-            try:
-                logging.info("Cleaning up temporary files...")
-                for temp_file in self.temp_dir.glob('*'):
-                    temp_file.unlink()
-            except Exception as e:
-                logging.warning(f"Error during temporary file cleanup: {e}")
+    def _capture(self, samples, sample_rate):
+        """Save a clip as WAV when debug capture is on"""
+        if self.debug_capture_dir is None:
+            return
+        path = self.debug_capture_dir / f"{uuid.uuid4()}.wav"
+        try:
+            with wave.open(str(path), 'wb') as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(sample_rate)
+                wav_file.writeframes(samples.astype('<i2', copy=False).tobytes())
+            logging.info(f"Saved debug WAV file to: {path}")
+        except OSError as e:
+            logging.warning(f"Could not save debug WAV file: {e}")
+
+    def _trim_to_speech(self, samples, sample_rate):
+        """
+        Trim decoded audio to its speech span
+
+        Args:
+            samples (numpy.ndarray): Mono int16 samples
+            sample_rate (int): Sample rate in Hz
+
+        Returns:
+            numpy.ndarray: Samples covering the speech, or None if the clip has no speech
+        """
+        span = self.voice_activity_detector.speech_span(samples, sample_rate)
+        if span is None:
+            logging.info(f"No speech in {len(samples) / sample_rate:.2f}s of audio, skipping recognition")
+            return None
+        start, end = span
+        if end - start < len(samples):
+            logging.info(f"Trimmed audio to speech span {start / sample_rate:.2f}s-{end / sample_rate:.2f}s")
+        return samples[start:end]
+
+    @staticmethod
+    def _no_speech_result():
+        """Result for a clip that voice activity detection found no speech in"""
+        return {
+            'success': True,
+            'wake_word_detected': False,
+            'detected_words': [],
+            'speech_detected': False,
+            'detection': 'vad',
+            'error': 'No speech detected'
+        }
+
+    def _recognize_wake_word(self, audio):
+        """
+        Transcribe audio with cloud speech recognition and look for wake words
+
+        Args:
+            audio (sr.AudioData): Audio to transcribe
+
+        Returns:
+            dict: Result containing wake word detection status and transcription
+        """
+        try:
+            # Convert speech to text
+            logging.info("Converting speech to text...")
+            asr = self.asr_service.transcribe(audio, language='en-US')
+            text = asr['text'].lower()
+            logging.info(f"Transcribed text via {asr['backend']} in {asr['latency_ms']:.0f} ms: {text}")
+
+            # Check for wake words
+            wake_word_detected = any(word in text for word in self.wake_words)
+            detected_words = [word for word in self.wake_words if word in text]
+
+            return {
+                'success': True,
+                'wake_word_detected': wake_word_detected,
+                'detected_words': detected_words,
+                'transcription': text,
+                'detection': 'cloud',
+                'asr_backend': asr['backend']
+            }
+
+        except SpeechNotUnderstood:
+            logging.warning("Speech recognition could not understand audio")
+            return {
+                'success': True,
+                'wake_word_detected': False,
+                'error': 'Could not understand audio'
+            }
+        except ASRTimeout as e:
+            logging.error(f"Speech recognition timed out: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Speech recognition timed out: {str(e)}'
+            }
+        except ASRError as e:
+            logging.error(f"Error with speech recognition service: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Error with speech recognition service: {str(e)}'
+            }
 
     def process_audio_file(self, audio_wav_file_path):
         """
@@ -235,43 +250,36 @@ class AudioProcessor:
         """
         try:
             logging.info("process_audio_file called")
+            samples, sample_rate = self.audio_decoder.decode_file(audio_wav_file_path)
+        except Exception as e:
+            logging.exception("Error processing audio:")
+            return {
+                'success': False,
+                'error': f'Error processing audio: {str(e)}'
+            }
+        return self.process_audio_samples(samples, sample_rate)
+
+    def process_audio_samples(self, samples, sample_rate):
+        """
+        Transcribe decoded audio and look for wake words
 
-            # Process the WAV file
-            with sr.AudioFile(audio_wav_file_path) as source:
-                # Record audio from file
-                logging.info("Recording audio from file...")
-                audio = self.recognizer.record(source)
-
-                try:
-                    # Convert speech to text
-                    logging.info("Converting speech to text...")
-                    text = self.recognizer.recognize_google(audio, language='en-US').lower()
-                    logging.info(f"Transcribed text: {text}")
-
-                    # Check for wake words
-                    wake_word_detected = any(word in text for word in self.wake_words)
-                    detected_words = [word for word in self.wake_words if word in text]
-
-                    return {
-                        'success': True,
-                        'wake_word_detected': wake_word_detected,
-                        'detected_words': detected_words,
-                        'transcription': text
-                    }
-
-                except sr.UnknownValueError:
-                    logging.warning("Speech recognition could not understand audio")
-                    return {
-                        'success': True,
-                        'wake_word_detected': False,
-                        'error': 'Could not understand audio'
-                    }
-                except sr.RequestError as e:
-                    logging.error(f"Error with speech recognition service: {str(e)}")
-                    return {
-                        'success': False,
-                        'error': f'Error with speech recognition service: {str(e)}'
-                    }
+        The recognizer reads the samples in place, no WAV file is written
+        unless debug capture is on.
+
+        Args:
+            samples (numpy.ndarray): Mono int16 samples
+            sample_rate (int): Sample rate in Hz
+
+        Returns:
+            dict: Result containing wake word detection status and transcription
+        """
+        try:
+            self._capture(samples, sample_rate)
+            samples = self._trim_to_speech(samples, sample_rate)
+            if samples is None:
+                return self._no_speech_result()
+
+            return self._recognize_wake_word(audio_data_from_samples(samples, sample_rate))
 
         except Exception as e:
             logging.exception("Error processing audio:")
@@ -280,21 +288,9 @@ class AudioProcessor:
                 'error': f'Error processing audio: {str(e)}'
             }
 
-        finally:
-            # Cleanup temporary files
-            try:
-                logging.info("Cleaning up temporary files...")
-                for temp_file in self.temp_dir.glob('*'):
-                    temp_file.unlink()
-            except Exception as e:
-                logging.warning(f"Error during temporary file cleanup: {e}")
-
     def cleanup(self):
-        """Clean up temporary files"""
+        """Release decoder resources"""
         try:
-            logging.info("Cleaning up temporary files...")
-            for temp_file in self.temp_dir.glob('*'):
-                temp_file.unlink()
-            self.temp_dir.rmdir()
+            self.audio_decoder.close()
         except Exception as e:
-            logging.warning(f"Error during cleanup: {e}")
\ No newline at end of file
+            logging.warning(f"Error during cleanup: {e}")
@@ -0,0 +1,158 @@
+"""
+Overlap-aware deduplication of staggered wake word chunks
+
+The tablets record with several staggered recorders, so consecutive chunks
+from one client largely contain the same audio. The start of each new chunk
+is located inside the client's previous chunk by normalised cross-correlation;
+only the part that was not heard before (plus enough context for a wake word
+straddling the boundary) is analysed, and a chunk that is almost entirely old
+audio reuses the previous result. A reused result never reports the
+previous chunk's wake word again, so one "Eva" triggers one detection.
+"""
+import logging
+import threading
+import numpy as np
+from .ttl_cache import TTLCache
+from .session_backends import SessionLocks
+
+
+def find_offset(reference, probe):
+    """
+    Locate a probe inside a longer reference signal
+
+    Args:
+        reference (numpy.ndarray): Signal to search in
+        probe (numpy.ndarray): Signal to search for, not longer than the reference
+
+    Returns:
+        tuple: (offset into reference, normalised correlation in [-1, 1]) of the best match
+    """
+    reference = reference.astype(np.float64)
+    probe = probe.astype(np.float64)
+    m = len(probe)
+    n_fft = 1 << (len(reference) + m - 1).bit_length()
+    corr = np.fft.irfft(np.fft.rfft(reference, n_fft) * np.conj(np.fft.rfft(probe, n_fft)), n_fft)
+    corr = corr[:len(reference) - m + 1]
+
+    # Energy of every reference window of the probe's length, via a running sum
+    energy = np.concatenate(([0.0], np.cumsum(reference ** 2)))
+    window_energy = energy[m:] - energy[:-m]
+    denominator = np.sqrt(np.maximum(window_energy, 1e-9)) * np.linalg.norm(probe)
+    scores = corr / np.maximum(denominator, 1e-9)
+
+    offset = int(np.argmax(scores))
+    return offset, float(scores[offset])
+
+
+class _ClientChunk:
+    """Last chunk seen from a client and the result it produced"""
+
+    def __init__(self, samples, sample_rate, result):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.result = result
+
+
+class ChunkDeduplicator:
+    """Tracks each client's last chunk and analyses only audio that was not heard before"""
+
+    def __init__(self, max_clients=256, history_seconds=5, probe_seconds=0.5, min_correlation=0.8,
+                 context_seconds=0.5, reuse_ratio=0.9, min_rms=100.0):
+        """
+        Initialize the deduplicator
+
+        Args:
+            max_clients (int): Number of clients whose last chunk is remembered
+            history_seconds (float): How long a client's last chunk stays comparable
+            probe_seconds (float): Length of the new chunk's start that is searched for
+            min_correlation (float): Normalised correlation needed to treat the audio as the same
+            context_seconds (float): Old audio analysed together with the new part, at least
+                                     as long as the wake word so one on the boundary is not missed
+            reuse_ratio (float): Overlap fraction above which the previous result is reused
+            min_rms (float): Probes quieter than this are not matched, since silence correlates with anything
+        """
+        self.probe_seconds = probe_seconds
+        self.min_correlation = min_correlation
+        self.context_seconds = context_seconds
+        self.reuse_ratio = reuse_ratio
+        self.min_rms = min_rms
+        self._chunks = TTLCache(max_entries=max_clients, ttl=history_seconds)
+        self._lock = threading.Lock()
+        # Chunks from one client are compared with each other, so they are processed one at a time
+        self._client_locks = SessionLocks()
+        self.stats_counts = {'full': 0, 'partial': 0, 'reused': 0}
+
+    def overlap(self, previous, samples, sample_rate):
+        """
+        Number of leading samples of a chunk that repeat the end of the previous chunk
+
+        Args:
+            previous (numpy.ndarray): Previous chunk from the same client
+            samples (numpy.ndarray): New chunk at the same sample rate
+            sample_rate (int): Sample rate in Hz
+
+        Returns:
+            int: Overlapping sample count, 0 if the chunks do not overlap
+        """
+        probe = samples[:int(self.probe_seconds * sample_rate)]
+        if len(probe) == 0 or len(probe) > len(previous):
+            return 0
+        if np.sqrt(np.mean(probe.astype(np.float64) ** 2)) < self.min_rms:
+            return 0
+        offset, score = find_offset(previous, probe)
+        if score < self.min_correlation:
+            return 0
+        return min(len(previous) - offset, len(samples))
+
+    def process(self, client_id, samples, sample_rate, analyse):
+        """
+        Analyse a client's chunk, skipping audio already analysed in its previous chunk
+
+        Args:
+            client_id (str): Identifies the recording device
+            samples (numpy.ndarray): Decoded mono int16 chunk
+            sample_rate (int): Sample rate in Hz
+            analyse (callable): analyse(samples, sample_rate) returning a result dict
+
+        Returns:
+            dict: Result for the chunk, with 'deduplicated' set to 'partial' or 'reused'
+                  when part of it was skipped; a reused result has wake_word_detected False
+        """
+        with self._client_locks(client_id):
+            previous = self._chunks.get(client_id)
+            overlap = 0
+            if previous is not None and previous.sample_rate == sample_rate:
+                overlap = self.overlap(previous.samples, samples, sample_rate)
+
+            if overlap and overlap >= self.reuse_ratio * len(samples) and previous.result.get('success'):
+                mode = 'reused'
+                result = dict(previous.result)
+                # The previous chunk already reported this wake word
+                if result.get('wake_word_detected'):
+                    result['wake_word_detected'] = False
+                    result['detected_words'] = []
+            elif overlap:
+                mode = 'partial'
+                start = max(0, overlap - int(self.context_seconds * sample_rate))
+                result = analyse(samples[start:], sample_rate)
+            else:
+                mode = 'full'
+                result = analyse(samples, sample_rate)
+
+            self._chunks.set(client_id, _ClientChunk(samples, sample_rate, result))
+        with self._lock:
+            self.stats_counts[mode] += 1
+        if mode != 'full':
+            overlap_seconds = overlap / sample_rate
+            logging.info(f"Chunk from {client_id} overlaps previous by {overlap_seconds:.2f}s, {mode}")
+            result = dict(result)
+            result['deduplicated'] = mode
+            result['overlap_seconds'] = overlap_seconds
+        return result
+
+    def stats(self):
+        """Get how many chunks were analysed fully, partially or reused"""
+        with self._lock:
+            stats = dict(self.stats_counts)
+        stats['clients'] = len(self._chunks)
+        return stats
@@ -10,21 +10,70 @@ from dataclasses import dataclass
 from typing import Dict, Any, List, Tuple, Optional
 from src.scraper import Scraper, search_youtube, search_image, Command
 from src.config import Config
+from src.response_cache import normalize
+from src.ttl_cache import TTLCache
+
+CONVERSATION_PROMPT = """You are a helpful and knowledgeable voice assistant that can answer questions, play YouTube videos, show images, and read news headlines. You're role is in a nursing home and you have been deployed to keep a particular patient engaged who may suffer from loneliness. Notes on the patient are attached below. It is **ESSENTIAL** that you use and refer to context in the notes to keep the patient grounded.
+
+## Commands to Use for Different Features
+
+You are able to invoke particular tools on request of the patient. Feel free to suggest some of these behaviours.
+
+- For videos: [COMMAND:type=play_youtube,query=SEARCH_QUERY]
+- For images: [COMMAND:type=show_image,query=SEARCH_QUERY]
+- For news: [COMMAND:type=get_news] 
+
+### Examples of Tool Use
+
+- "Play Frank Sinatra" → [COMMAND:type=play_youtube,query=Frank Sinatra My Way]
+- "Show me cats" → [COMMAND:type=show_image,query=cute cats]
+- "What's in the news?" → [COMMAND:type=get_news]
+
+## Guidelines for General Questions
+
+- Be conversational and friendly
+- Keep responses natural and conversational
+- Give clear, concise, and accurate answers
+- Keep responses under 3-4 sentences unless more detail is specifically requested
+- You **NEVER** attempt produce news items without using the get_news function. Doing so leads to the risk of feeding false information to the patient.
+
+## Remember
+
+- For questions, give a brief answer first, then optionally suggest relevant media
+- Use the conversation history to provide more contextual and relevant responses
+- For media requests (play, watch, show, see, get news), **ALWAYS** include the appropriate command
+- If there is something in the patient notes that might be useful, you use them
+"""
 
 class commandScraper:
-    def __init__(self):
-        """Initialize the command scraper with OpenAI client"""
+    def __init__(self, query_cache_ttl: float = Config.COMMAND_QUERY_CACHE_TTL,
+                 media_cache_ttl: float = Config.COMMAND_MEDIA_CACHE_TTL,
+                 max_cache_entries: int = Config.COMMAND_CACHE_MAX_ENTRIES):
+        """
+        Initialize the command scraper with OpenAI client
+        Args:
+            query_cache_ttl: Seconds a generated search query is reused for the same request
+            media_cache_ttl: Seconds a found video or image URL is reused for the same query
+            max_cache_entries: Entries kept in each cache
+        """
         self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        # (command type, normalised utterance) -> search query, then (command, query) -> media URL,
+        # so a repeated "play Frank Sinatra" needs neither the model nor a search
+        self.query_cache = TTLCache(max_entries=max_cache_entries, ttl=query_cache_ttl)
+        self.media_cache = TTLCache(max_entries=max_cache_entries, ttl=media_cache_ttl)
         self.mapping = {
             "news": "get_news",
             "play_music": "play_youtube",
             "show_image": "show_image",
             "play_youtube": "play_youtube"
         }
-        self.messages = []
 
     def _generate_query(self, command_type: str, user_speech: str) -> str:
-        """Generate an optimal search query using GPT"""
+        """Generate an optimal search query using GPT, reusing the query for a repeated request"""
+        key = (command_type, normalize(user_speech))
+        query = self.query_cache.get(key)
+        if query is not None:
+            return query
         messages = [
             {"role": "system", "content": "You are a helpful assistant that generates optimal search queries. Return ONLY the search query, nothing else."},
             {"role": "user", "content": f"Generate a search query for {command_type} based on: {user_speech}"}
@@ -37,7 +86,9 @@ class commandScraper:
                 max_tokens=50,
                 temperature=0.7
             )
-            return response.choices[0].message.content.strip()
+            query = response.choices[0].message.content.strip()
+            self.query_cache.set(key, query)
+            return query
         except Exception as e:
             print(f"Error generating query: {e}")
             return user_speech  # Fallback to using the original speech as query
@@ -61,11 +112,8 @@ class commandScraper:
             query = self._generate_query(command_type, user_speech)
 
             # Execute command based on type
-            if command == "play_youtube":
-                url = search_youtube(query)
-                return {"type": command, "url": url, "query": query} if url else None
-            elif command == "show_image":
-                url = search_image(query)
+            if command in ("play_youtube", "show_image"):
+                url = self._find_media(command, query)
                 return {"type": command, "url": url, "query": query} if url else None
             elif command == "get_news":
                 # Execute the news command directly
@@ -77,6 +125,22 @@ class commandScraper:
             print(f"Error in get_response: {e}")
             return None
 
+    def _find_media(self, command: str, query: str) -> Optional[str]:
+        """Search for a video or image URL, reusing the URL found for the same query"""
+        key = (command, query.strip().lower())
+        url = self.media_cache.get(key)
+        if url is not None:
+            return url
+        url = search_youtube(query) if command == "play_youtube" else search_image(query)
+        # Failed searches are not cached, the next request tries again
+        if url:
+            self.media_cache.set(key, url)
+        return url
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit and miss counters of the query and media caches"""
+        return {"queries": self.query_cache.stats(), "media": self.media_cache.stats()}
+
     def get_conversation_response(self, user_speech: str) -> str:
         """
         Get a conversational response using the system prompt
@@ -85,41 +149,10 @@ class commandScraper:
         Returns:
             str: AI's response
         """
-        system_prompt = """You are a helpful and knowledgeable voice assistant that can answer questions, play YouTube videos, show images, and read news headlines. You're role is in a nursing home and you have been deployed to keep a particular patient engaged who may suffer from loneliness. Notes on the patient are attached below. It is **ESSENTIAL** that you use and refer to context in the notes to keep the patient grounded.
-
-## Commands to Use for Different Features
-
-You are able to invoke particular tools on request of the patient. Feel free to suggest some of these behaviours.
-
-- For videos: [COMMAND:type=play_youtube,query=SEARCH_QUERY]
-- For images: [COMMAND:type=show_image,query=SEARCH_QUERY]
-- For news: [COMMAND:type=get_news] 
-
-### Examples of Tool Use
-
-- "Play Frank Sinatra" → [COMMAND:type=play_youtube,query=Frank Sinatra My Way]
-- "Show me cats" → [COMMAND:type=show_image,query=cute cats]
-- "What's in the news?" → [COMMAND:type=get_news]
-
-## Guidelines for General Questions
-
-- Be conversational and friendly
-- Keep responses natural and conversational
-- Give clear, concise, and accurate answers
-- Keep responses under 3-4 sentences unless more detail is specifically requested
-- You **NEVER** attempt produce news items without using the get_news function. Doing so leads to the risk of feeding false information to the patient.
-
-## Remember
-
-- For questions, give a brief answer first, then optionally suggest relevant media
-- Use the conversation history to provide more contextual and relevant responses
-- For media requests (play, watch, show, see, get news), **ALWAYS** include the appropriate command
-- If there is something in the patient notes that might be useful, you use them
-"""
         try:
             # Set up conversation messages
             messages = [
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": CONVERSATION_PROMPT},
                 {"role": "user", "content": user_speech}
             ]
             
@@ -134,4 +167,4 @@ You are able to invoke particular tools on request of the patient. Feel free to
             return response.choices[0].message.content.strip()
         except Exception as e:
             print(f"Error in get_conversation_response: {e}")
-            return "I apologize, but I'm having trouble understanding. Could you please try again?"
\ No newline at end of file
+            return "I apologize, but I'm having trouble understanding. Could you please try again?"
@@ -23,35 +23,104 @@ class Config:
     # Chat Configuration
     MAX_HISTORY = int(os.getenv('MAX_HISTORY', '5'))
     CONFIDENCE_THRESHOLD = float(os.getenv('CONFIDENCE_THRESHOLD', '30.0'))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1000'))  # History and summary sent per request
+    CONTEXT_SUMMARY_TOKENS = int(os.getenv('CONTEXT_SUMMARY_TOKENS', '150'))  # Part of the budget for the summary
+    CONTEXT_SUMMARY = os.getenv('CONTEXT_SUMMARY', 'true').lower() == 'true'  # Summarise turns that do not fit
+    MEMORY_RECALL_TURNS = int(os.getenv('MEMORY_RECALL_TURNS', '3'))  # Relevant older turns recalled, 0 disables
+    MEMORY_RECALL_TOKENS = int(os.getenv('MEMORY_RECALL_TOKENS', '200'))  # Part of the budget for recalled turns
+    MEMORY_MAX_SESSIONS = int(os.getenv('MEMORY_MAX_SESSIONS', '256'))  # Patients whose memory index is kept
+    RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '600'))  # Seconds a reply is reused, 0 disables
+    RESPONSE_CACHE_THRESHOLD = float(os.getenv('RESPONSE_CACHE_THRESHOLD', '0.8'))  # Trigram similarity to match
+    COMMAND_QUERY_CACHE_TTL = float(os.getenv('COMMAND_QUERY_CACHE_TTL', str(7 * 24 * 3600)))  # Search queries
+    COMMAND_MEDIA_CACHE_TTL = float(os.getenv('COMMAND_MEDIA_CACHE_TTL', str(2 * 24 * 3600)))  # Video/image URLs
+    COMMAND_CACHE_MAX_ENTRIES = int(os.getenv('COMMAND_CACHE_MAX_ENTRIES', '512'))  # Per cache
     
     # Audio settings
-    AUDIO_SAMPLE_RATE = 44100
-    AUDIO_CHANNELS = 1
+    # Audio is decoded to the format the ASR backends declare (16 kHz mono), see src/asr.py
+    AUDIO_DECODER = os.getenv('AUDIO_DECODER', 'pyav')  # pyav, ffmpeg, or auto to fall back to ffmpeg
+    AUDIO_DECODER_POOL_SIZE = int(os.getenv('AUDIO_DECODER_POOL_SIZE', '2'))  # Idle ffmpeg workers
+    RECOGNIZER_POOL_SIZE = int(os.getenv('RECOGNIZER_POOL_SIZE', '4'))  # Idle speech recognizers kept
+    DEBUG_AUDIO_CAPTURE = os.getenv('DEBUG_AUDIO_CAPTURE', 'false').lower() == 'true'  # Save clips as WAV
+    DEBUG_AUDIO_FOLDER = Path(os.getenv('DEBUG_AUDIO_FOLDER', BASE_DIR / 'src' / 'temp_processing'))
+
+    # Speech recognition backends: the first is primary, a second one is used for hedging
+    ASR_BACKENDS = [name.strip() for name in os.getenv('ASR_BACKENDS', 'google').split(',') if name.strip()]
+    ASR_DEADLINE = float(os.getenv('ASR_DEADLINE', '10'))  # Seconds a transcription may take
+    ASR_HEDGE_AFTER = float(os.getenv('ASR_HEDGE_AFTER', '2'))  # Seconds before hedging, 0 disables
+    WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'whisper-1')
+    ASR_STUB_TEXT = os.getenv('ASR_STUB_TEXT', '')  # Transcription returned by the stub backend
+    TRANSCRIBE_SEGMENT_MIN_SECONDS = float(os.getenv('TRANSCRIBE_SEGMENT_MIN_SECONDS', '5'))  # Long audio
+    TRANSCRIBE_SEGMENT_MAX_SECONDS = float(os.getenv('TRANSCRIBE_SEGMENT_MAX_SECONDS', '25'))  # Per request
+    TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', '4'))  # Segments recognised concurrently
+    TTS_WORKERS = int(os.getenv('TTS_WORKERS', '4'))  # Streamed sentences synthesised concurrently
     
+    # Conversation sessions, one per patient or device
+    CONVERSATION_MAX_TURNS = int(os.getenv('CONVERSATION_MAX_TURNS', '50'))  # Turns kept per session
+    CONVERSATION_MEMORY_MB = float(os.getenv('CONVERSATION_MEMORY_MB', '16'))  # Budget for all sessions
+    CONVERSATION_SPILL = os.getenv('CONVERSATION_SPILL', 'true').lower() == 'true'  # Evicted sessions to disk
+    CONVERSATION_SPILL_FOLDER = Path(os.getenv('CONVERSATION_SPILL_FOLDER', BASE_DIR / 'temp' / 'sessions'))
+    # memory keeps sessions in this process; sqlite or file share them between worker processes
+    CONVERSATION_BACKEND = os.getenv('CONVERSATION_BACKEND', 'memory').lower()
+    CONVERSATION_DB_PATH = Path(os.getenv('CONVERSATION_DB_PATH', BASE_DIR / 'temp' / 'conversations.db'))
+    CONVERSATION_FILE_FOLDER = Path(os.getenv('CONVERSATION_FILE_FOLDER', BASE_DIR / 'temp' / 'conversations'))
+
     # Wake word settings
     WAKE_WORDS = ['eva', 'ava']
+    WAKE_WORD_TEMPLATES_FOLDER = Path(os.getenv('WAKE_WORD_TEMPLATES_FOLDER', BASE_DIR / 'wake_words'))
+    WAKE_WORD_ACCEPT_SCORE = float(os.getenv('WAKE_WORD_ACCEPT_SCORE', '0.85'))  # Accept locally at/above
+    WAKE_WORD_REJECT_SCORE = float(os.getenv('WAKE_WORD_REJECT_SCORE', '0.7'))  # Reject locally below
+    WAKE_STREAM_SAMPLE_RATE = int(os.getenv('WAKE_STREAM_SAMPLE_RATE', '16000'))  # Default PCM stream rate
+    WAKE_STREAM_WINDOW_SECONDS = float(os.getenv('WAKE_STREAM_WINDOW_SECONDS', '1.5'))  # Analysis window
+    WAKE_STREAM_HOP_SECONDS = float(os.getenv('WAKE_STREAM_HOP_SECONDS', '0.5'))  # New audio between windows
+    WAKE_DEDUP_ENABLED = os.getenv('WAKE_DEDUP_ENABLED', 'true').lower() == 'true'
+    WAKE_DEDUP_HISTORY_SECONDS = float(os.getenv('WAKE_DEDUP_HISTORY_SECONDS', '5'))  # Chunk memory per client
+    WAKE_DEDUP_MIN_CORRELATION = float(os.getenv('WAKE_DEDUP_MIN_CORRELATION', '0.8'))  # Same audio at/above
+
+    # Voice activity detection settings
+    VAD_ENERGY_RATIO = float(os.getenv('VAD_ENERGY_RATIO', '3.0'))  # Speech RMS relative to noise floor
+    VAD_MIN_RMS = float(os.getenv('VAD_MIN_RMS', '200'))  # Quietest speech RMS on the int16 scale
+    VAD_MIN_SPEECH_MS = int(os.getenv('VAD_MIN_SPEECH_MS', '120'))  # Voiced audio needed to count as speech
     
     # Paths
     UPLOAD_FOLDER = BASE_DIR / 'uploads'
     TEMP_FOLDER = BASE_DIR / 'temp'
     RECORDINGS_FOLDER = BASE_DIR / 'recordings'
-    CONVERSATIONS_FOLDER = BASE_DIR / 'conversations'
+    CONVERSATIONS_FOLDER = Path(os.getenv('CONVERSATIONS_FOLDER', BASE_DIR / 'conversations'))  # Turn journal
+    CONVERSATION_JOURNAL_SEGMENT_MB = float(os.getenv('CONVERSATION_JOURNAL_SEGMENT_MB', '8'))  # Per segment
+    CONVERSATION_JOURNAL_FLUSH_SECONDS = float(os.getenv('CONVERSATION_JOURNAL_FLUSH_SECONDS', '1'))  # Fsync interval
     
     # Video Processing
     VIDEO_WIDTH = 640
     VIDEO_HEIGHT = 480
     VIDEO_FPS = 30
     FRAME_SKIP = 5  # Process every Nth frame
+    EMOTION_WINDOW_SIZE = int(os.getenv('EMOTION_WINDOW_SIZE', '5'))  # Frames per smoothing window
+    EMOTION_SESSION_IDLE_TIMEOUT = int(os.getenv('EMOTION_SESSION_IDLE_TIMEOUT', '300'))  # Seconds
+    EMOTION_SESSION_MAX = int(os.getenv('EMOTION_SESSION_MAX', '100'))
     
     # API settings
     ALLOWED_EXTENSIONS = {'wav', 'mp3', 'm4a', 'webm'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '128'))  # Completed results kept
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '300'))  # Seconds a result is replayed
+    IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '60'))  # Duplicates wait for the original
     
     # Speech recognition settings
     SPEECH_ENERGY_THRESHOLD = 1000
     SPEECH_PAUSE_THRESHOLD = 0.8
     SPEECH_PHRASE_THRESHOLD = 0.3
     
+    # Face detection settings
+    FACE_DETECTOR = os.getenv('FACE_DETECTOR', 'haar').lower()  # haar, lbp or dnn
+    FACE_MODELS_FOLDER = BASE_DIR / 'models'
+    FACE_DETECTOR_LBP_CASCADE = os.getenv(
+        'FACE_DETECTOR_LBP_CASCADE', str(FACE_MODELS_FOLDER / 'lbpcascade_frontalface_improved.xml'))
+    FACE_DETECTOR_DNN_MODEL = os.getenv(
+        'FACE_DETECTOR_DNN_MODEL', str(FACE_MODELS_FOLDER / 'res10_300x300_ssd_iter_140000.caffemodel'))
+    FACE_DETECTOR_DNN_CONFIG = os.getenv(
+        'FACE_DETECTOR_DNN_CONFIG', str(FACE_MODELS_FOLDER / 'deploy.prototxt'))
+    FACE_DETECTOR_DNN_CONFIDENCE = float(os.getenv('FACE_DETECTOR_DNN_CONFIDENCE', '0.5'))
+
     # Emotion detection settings
     EMOTION_THRESHOLD = 0.5
     EMOTIONS = [
@@ -82,8 +151,70 @@ class Config:
             raise ValueError("TEMPERATURE must be between 0 and 1")
         if cls.MAX_HISTORY < 1:
             raise ValueError("MAX_HISTORY must be greater than 0")
+        if not 0 < cls.CONTEXT_SUMMARY_TOKENS < cls.CONTEXT_TOKEN_BUDGET:
+            raise ValueError("Context settings must satisfy 0 < CONTEXT_SUMMARY_TOKENS < CONTEXT_TOKEN_BUDGET")
+        if cls.COMMAND_CACHE_MAX_ENTRIES < 1:
+            raise ValueError("COMMAND_CACHE_MAX_ENTRIES must be greater than 0")
+        if not 0 < cls.RESPONSE_CACHE_THRESHOLD <= 1:
+            raise ValueError("RESPONSE_CACHE_THRESHOLD must be between 0 and 1")
+        if cls.MEMORY_RECALL_TURNS and cls.CONTEXT_SUMMARY_TOKENS + cls.MEMORY_RECALL_TOKENS >= cls.CONTEXT_TOKEN_BUDGET:
+            raise ValueError("CONTEXT_SUMMARY_TOKENS and MEMORY_RECALL_TOKENS must leave room in CONTEXT_TOKEN_BUDGET")
         if not 0 <= cls.CONFIDENCE_THRESHOLD <= 100:
             raise ValueError("CONFIDENCE_THRESHOLD must be between 0 and 100")
+        if not 0 <= cls.WAKE_WORD_REJECT_SCORE <= cls.WAKE_WORD_ACCEPT_SCORE <= 1:
+            raise ValueError("Wake word scores must satisfy 0 <= REJECT <= ACCEPT <= 1")
+        if cls.AUDIO_DECODER not in ('auto', 'pyav', 'ffmpeg'):
+            raise ValueError("AUDIO_DECODER must be one of: auto, pyav, ffmpeg")
+        if cls.AUDIO_DECODER_POOL_SIZE < 0:
+            raise ValueError("AUDIO_DECODER_POOL_SIZE must not be negative")
+        if cls.RECOGNIZER_POOL_SIZE < 0:
+            raise ValueError("RECOGNIZER_POOL_SIZE must not be negative")
+        if not 8000 <= cls.WAKE_STREAM_SAMPLE_RATE <= 48000:
+            raise ValueError("WAKE_STREAM_SAMPLE_RATE must be between 8000 and 48000")
+        if not 0 < cls.WAKE_STREAM_HOP_SECONDS <= cls.WAKE_STREAM_WINDOW_SECONDS:
+            raise ValueError("Wake stream settings must satisfy 0 < HOP <= WINDOW")
+        if not 0 < cls.WAKE_DEDUP_MIN_CORRELATION <= 1:
+            raise ValueError("WAKE_DEDUP_MIN_CORRELATION must be between 0 and 1")
+        if not 1 <= len(cls.ASR_BACKENDS) <= 2:
+            raise ValueError("ASR_BACKENDS must list one or two backends")
+        if any(name not in ('google', 'whisper', 'stub') for name in cls.ASR_BACKENDS):
+            raise ValueError("ASR_BACKENDS entries must be google, whisper or stub")
+        if cls.ASR_DEADLINE <= 0:
+            raise ValueError("ASR_DEADLINE must be greater than 0")
+        if not 0 < cls.TRANSCRIBE_SEGMENT_MIN_SECONDS < cls.TRANSCRIBE_SEGMENT_MAX_SECONDS:
+            raise ValueError("Transcribe segment settings must satisfy 0 < MIN < MAX")
+        if cls.TRANSCRIBE_WORKERS < 1:
+            raise ValueError("TRANSCRIBE_WORKERS must be greater than 0")
+        if cls.IDEMPOTENCY_WAIT_SECONDS <= 0:
+            raise ValueError("IDEMPOTENCY_WAIT_SECONDS must be greater than 0")
+        if cls.TTS_WORKERS < 1:
+            raise ValueError("TTS_WORKERS must be greater than 0")
+        if cls.CONVERSATION_MAX_TURNS < 1:
+            raise ValueError("CONVERSATION_MAX_TURNS must be greater than 0")
+        if cls.CONVERSATION_MEMORY_MB <= 0:
+            raise ValueError("CONVERSATION_MEMORY_MB must be greater than 0")
+        if cls.CONVERSATION_JOURNAL_SEGMENT_MB <= 0 or cls.CONVERSATION_JOURNAL_FLUSH_SECONDS <= 0:
+            raise ValueError("Conversation journal segment size and flush interval must be greater than 0")
+        if cls.CONVERSATION_BACKEND not in ('memory', 'sqlite', 'file'):
+            raise ValueError("CONVERSATION_BACKEND must be one of: memory, sqlite, file")
+        if cls.VAD_ENERGY_RATIO < 1:
+            raise ValueError("VAD_ENERGY_RATIO must be at least 1")
+        if cls.EMOTION_WINDOW_SIZE < 1:
+            raise ValueError("EMOTION_WINDOW_SIZE must be greater than 0")
+        if cls.FACE_DETECTOR not in ('haar', 'lbp', 'dnn'):
+            raise ValueError("FACE_DETECTOR must be one of: haar, lbp, dnn")
+        if not 0 <= cls.FACE_DETECTOR_DNN_CONFIDENCE <= 1:
+            raise ValueError("FACE_DETECTOR_DNN_CONFIDENCE must be between 0 and 1")
+
+    @classmethod
+    def face_detector_options(cls):
+        """Keyword arguments for create_face_detector built from the settings above"""
+        return {
+            'lbp_cascade': cls.FACE_DETECTOR_LBP_CASCADE,
+            'dnn_model': cls.FACE_DETECTOR_DNN_MODEL,
+            'dnn_config': cls.FACE_DETECTOR_DNN_CONFIG,
+            'dnn_confidence': cls.FACE_DETECTOR_DNN_CONFIDENCE
+        }
 
 # Validate configuration on import
 Config.validate()
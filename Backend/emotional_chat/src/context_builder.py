@@ -0,0 +1,214 @@
+"""
+Token-budgeted conversation context
+
+The turns of a session are sent to the model newest first until a token
+budget is filled. Older turns are not dropped from memory: they are folded
+into a rolling summary that is sent instead. The summary is refreshed on a
+background thread, so it never delays a response; a request simply uses
+the latest summary that is ready. With a ConversationMemory, a few older
+exchanges relevant to what the patient just said are recalled as well.
+"""
+import re
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .ttl_cache import TTLCache
+
+# Words, numbers and single punctuation marks, roughly how BPE tokenizers split English text
+TOKEN_PIECE = re.compile(r"\w+|[^\w\s]")
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = """You keep a running summary of a conversation between Eva, a companion for a nursing home resident, and the resident.
+Update the summary with the new exchanges below. Keep names, people, places, preferences, worries and anything Eva promised.
+Write at most {max_words} words, in the third person, as plain text.
+
+Current summary:
+{summary}
+
+New exchanges:
+{exchanges}"""
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens in a text without calling a tokenizer
+
+    Words longer than four characters usually split into several tokens,
+    so each word counts one token per four characters.
+    """
+    return sum((len(piece) + 3) // 4 for piece in TOKEN_PIECE.findall(text or ''))
+
+
+def turn_messages(turn):
+    """Chat messages for a stored turn"""
+    return [
+        {"role": "user", "content": turn['user_text']},
+        {"role": "assistant", "content": turn['response']}
+    ]
+
+
+def message_tokens(message):
+    """Estimated tokens of a chat message, including the format overhead"""
+    return estimate_tokens(message['content']) + MESSAGE_OVERHEAD
+
+
+class ContextBuilder:
+    """Fits a session's history into a token budget, summarising what does not fit"""
+
+    def __init__(self, summarize=None, budget_tokens=1000, summary_tokens=150, max_sessions=1024,
+                 summary_ttl=24 * 3600, memory=None, recall_turns=3, recall_tokens=200):
+        """
+        Initialize the context builder
+
+        Args:
+            summarize (callable): summarize(summary, turns, max_tokens) returning the updated summary text,
+                                  None keeps only the turns that fit
+            budget_tokens (int): Tokens the history and summary may use together
+            summary_tokens (int): Tokens the summary may use
+            max_sessions (int): Sessions whose summary is kept
+            summary_ttl (float): Seconds an unused summary is kept
+            memory (ConversationMemory): Searchable past turns, None recalls nothing
+            recall_turns (int): Relevant older turns recalled per request
+            recall_tokens (int): Tokens the recalled turns may use
+        """
+        if budget_tokens <= summary_tokens + (recall_tokens if memory else 0):
+            raise ValueError("budget_tokens must be greater than summary_tokens and recall_tokens together")
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.memory = memory
+        self.recall_turns = recall_turns
+        self.recall_tokens = recall_tokens
+        self.recalled = 0
+        # session id -> (summary text, timestamp of the newest turn it covers)
+        self._summaries = TTLCache(max_entries=max_sessions, ttl=summary_ttl)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='summary')
+        self.refreshes = 0
+        self.failed_refreshes = 0
+
+    def summary(self, session_id):
+        """Get the current summary of a session and the timestamp of the newest turn it covers"""
+        return self._summaries.get(session_id, ('', None))
+
+    def build(self, session_id, turns, query=None):
+        """
+        Build the context messages for a session
+
+        Args:
+            session_id (str): Patient or device identifier
+            turns (list): The session's turns, oldest first
+            query (str): What the patient just said, used to recall relevant older turns
+
+        Returns:
+            list: Chat messages: the summary and recalled turns (if any), then the newest turns that fit
+        """
+        summary, covered = self.summary(session_id)
+        budget = self.budget_tokens - (self.summary_tokens if self.summarize else 0)
+        if self.memory and query:
+            budget -= self.recall_tokens
+        kept = []
+        used = 0
+        fitting = 0
+        for turn in reversed(turns):
+            messages = turn_messages(turn)
+            tokens = sum(message_tokens(message) for message in messages)
+            if used + tokens > budget:
+                break
+            kept[:0] = messages
+            used += tokens
+            fitting += 1
+        evicted = turns[:len(turns) - fitting]
+
+        if self.summarize:
+            unsummarised = [turn for turn in evicted if covered is None or turn['timestamp'] > covered]
+            if unsummarised:
+                self._schedule_refresh(session_id, unsummarised)
+        else:
+            summary = ''
+
+        if self.memory and query:
+            recalled = self._recall(session_id, query, before=turns[len(evicted)]['timestamp'] if fitting else None)
+            if recalled:
+                kept.insert(0, recalled)
+        if summary:
+            kept.insert(0, {"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+        return kept
+
+    def _recall(self, session_id, query, before):
+        """System message with the older turns most relevant to the query that fit recall_tokens"""
+        lines = []
+        used = MESSAGE_OVERHEAD
+        for _, turn in self.memory.search(session_id, query, self.recall_turns, before=before):
+            line = f"Resident: {turn['user_text']} / Eva: {turn['response']}"
+            tokens = estimate_tokens(line)
+            if used + tokens > self.recall_tokens:
+                continue
+            lines.append((turn.get('timestamp', ''), line))
+            used += tokens
+        if not lines:
+            return None
+        self.recalled += len(lines)
+        exchanges = '\n'.join(line for _, line in sorted(lines))
+        return {"role": "system", "content": f"Earlier exchanges that may be relevant:\n{exchanges}"}
+
+    def _schedule_refresh(self, session_id, turns):
+        """Fold turns into the session's summary on the background thread, once at a time per session"""
+        with self._lock:
+            if session_id in self._refreshing:
+                return
+            self._refreshing.add(session_id)
+        self._executor.submit(self._refresh, session_id, turns)
+
+    def _refresh(self, session_id, turns):
+        try:
+            summary, _ = self.summary(session_id)
+            updated = self.summarize(summary, turns, self.summary_tokens)
+            self._summaries.set(session_id, (updated.strip(), turns[-1]['timestamp']))
+            self.refreshes += 1
+        except Exception as e:
+            # The turns stay unsummarised and are tried again on the next request
+            self.failed_refreshes += 1
+            logging.warning(f"Could not refresh the summary of conversation session {session_id}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(session_id)
+
+    def stats(self):
+        """Get summary refresh counters"""
+        return {
+            'budget_tokens': self.budget_tokens,
+            'summary_tokens': self.summary_tokens,
+            'summaries': len(self._summaries),
+            'refreshes': self.refreshes,
+            'failed_refreshes': self.failed_refreshes,
+            'recalled': self.recalled
+        }
+
+
+def openai_summarizer(client, model, temperature=0.3):
+    """
+    Create a summarize() function for ContextBuilder that asks an OpenAI chat model
+
+    Args:
+        client (openai.OpenAI): OpenAI client
+        model (str): Chat model name
+        temperature (float): Sampling temperature
+
+    Returns:
+        callable: summarize(summary, turns, max_tokens)
+    """
+    def summarize(summary, turns, max_tokens):
+        exchanges = '\n'.join(f"Resident: {turn['user_text']}\nEva: {turn['response']}" for turn in turns)
+        response = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": SUMMARY_PROMPT.format(
+                max_words=int(max_tokens * 0.75), summary=summary or '(none yet)', exchanges=exchanges)}],
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return response.choices[0].message.content
+    return summarize
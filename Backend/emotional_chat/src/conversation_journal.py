@@ -0,0 +1,336 @@
+"""
+Append-only conversation journal
+
+Every completed turn is appended to JSON Lines segment files under the
+conversations folder. Appends only queue the record; a writer thread
+writes queued records in batches and fsyncs once per batch, so the cost of
+logging a turn does not depend on how long the assistant has been running.
+Segments are rotated at a size limit, and a small index records the time
+span and patients of each segment, so lookups only read the segments that
+can match.
+
+Several worker processes can share the folder: each writes only to segments
+named after its host and process id, the shared index is merged under a
+file lock, and segments written by other processes are scanned from where
+this process last read them before every lookup.
+"""
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from .session_backends import encode_turn
+
+try:
+    import fcntl
+except ImportError:  # Windows: the index is only locked within this process
+    fcntl = None
+
+INDEX_FILE = 'index.json'
+INDEX_LOCK_FILE = 'index.lock'
+
+
+def writer_name():
+    """Name of this process in segment file names, unique across the hosts sharing a folder"""
+    return f"{socket.gethostname()}-{os.getpid()}".replace(os.sep, '_')
+
+
+class ConversationJournal:
+    """Batched, segment-rotated JSONL log of conversation turns"""
+
+    def __init__(self, folder, segment_max_bytes=8 * 1024 * 1024, flush_interval=1.0, max_batch=256, writer=None):
+        """
+        Initialize the journal and start its writer thread
+
+        Args:
+            folder (str or Path): Folder holding the segments and their index
+            segment_max_bytes (int): Size at which a new segment is started
+            flush_interval (float): Seconds between batched writes and fsyncs
+            max_batch (int): Queued records that trigger a write before the interval ends
+            writer (str): Name of this process in its segment names, defaults to host and process id
+        """
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.writer = writer or writer_name()
+        self.segment_max_bytes = segment_max_bytes
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending = []
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._file = None
+        self.records_written = 0
+        self.batches = 0
+        with self._index_locked():
+            self._index = self._load_index()
+        self._thread = threading.Thread(target=self._run, name='conversation-journal', daemon=True)
+        self._thread.start()
+
+    def _segment_path(self, name):
+        return self.folder / name
+
+    def _own(self, name):
+        return name.startswith(f"journal-{self.writer}-")
+
+    @contextmanager
+    def _index_locked(self):
+        """Hold the index file lock against other processes sharing the folder"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.folder / INDEX_LOCK_FILE, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index_file(self):
+        """Entries of the shared index file by segment name (caller holds the index lock)"""
+        try:
+            with open(self.folder / INDEX_FILE, 'r', encoding='utf-8') as f:
+                return {entry['segment']: entry for entry in json.load(f)}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Rebuilding conversation journal index: {e}")
+            return {}
+
+    def _load_index(self):
+        """Read the index, rescanning segments it does not describe, e.g. after a crash (caller holds the index lock)"""
+        entries = self._read_index_file()
+        index = []
+        for path in sorted(self.folder.glob('journal-*.jsonl')):
+            entry = entries.get(path.name)
+            if entry is None or entry['bytes'] > path.stat().st_size:
+                entry = self._new_entry(path.name)
+            entry['sessions'] = set(entry['sessions'])
+            self._scan_segment(entry, whole=self._own(path.name))
+            index.append(entry)
+        return index
+
+    @staticmethod
+    def _new_entry(name):
+        return {'segment': name, 'start': None, 'end': None, 'records': 0, 'bytes': 0, 'sessions': set()}
+
+    def _scan_segment(self, entry, whole=False):
+        """
+        Index the records appended to a segment since its entry was last updated
+
+        A trailing partial line is left for the next scan, since another
+        process may still be writing it, unless whole is set: then it is a
+        record cut short by a crash and is skipped.
+        """
+        path = self._segment_path(entry['segment'])
+        try:
+            if path.stat().st_size <= entry['bytes']:
+                return
+            with open(path, 'rb') as f:
+                f.seek(entry['bytes'])
+                data = f.read()
+        except OSError as e:
+            logging.warning(f"Could not scan {entry['segment']}: {e}")
+            return
+        complete = data if whole else data[:data.rfind(b'\n') + 1]
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A record cut short by a crash; later appends start on a new line
+                logging.warning(f"Skipping unreadable record in {entry['segment']}")
+                continue
+            self._index_record(entry, record)
+        entry['bytes'] += len(complete)
+
+    def _refresh_index(self):
+        """Pick up segments other processes have written to since the last lookup (caller holds the write lock)"""
+        known = {entry['segment']: entry for entry in self._index}
+        for path in sorted(self.folder.glob('journal-*.jsonl')):
+            if self._own(path.name):
+                continue
+            entry = known.get(path.name)
+            if entry is None:
+                entry = self._new_entry(path.name)
+                self._index.append(entry)
+            self._scan_segment(entry)
+
+    @staticmethod
+    def _index_record(entry, record):
+        entry['start'] = record['ts'] if entry['start'] is None else min(entry['start'], record['ts'])
+        entry['end'] = record['ts'] if entry['end'] is None else max(entry['end'], record['ts'])
+        entry['records'] += 1
+        entry['sessions'].add(record['session_id'])
+
+    def _save_index(self):
+        """
+        Write this process's entries into the shared index atomically (caller holds the write lock)
+
+        Entries of other processes' segments are kept from the file unless
+        this process has indexed further into the segment.
+        """
+        path = self.folder / INDEX_FILE
+        temp_path = path.with_name(f"{INDEX_FILE}.{self.writer}.tmp")
+        with self._index_locked():
+            entries = self._read_index_file()
+            for entry in self._index:
+                saved = entries.get(entry['segment'])
+                if saved is None or self._own(entry['segment']) or saved['bytes'] < entry['bytes']:
+                    entries[entry['segment']] = dict(entry, sessions=sorted(entry['sessions']))
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump([entries[name] for name in sorted(entries)], f, separators=(',', ':'))
+                os.replace(temp_path, path)
+            except OSError as e:
+                logging.error(f"Could not save conversation journal index: {e}")
+
+    def _open_segment(self, size):
+        """Segment the next write goes to, starting a new one if it would overflow (caller holds the write lock)"""
+        own = [entry for entry in self._index if self._own(entry['segment'])]
+        current = own[-1] if own else None
+        if current is None or (current['bytes'] and current['bytes'] + size > self.segment_max_bytes):
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            number = int(current['segment'][-len('000000.jsonl'):-len('.jsonl')]) + 1 if current else 1
+            current = self._new_entry(f"journal-{self.writer}-{number:06d}.jsonl")
+            self._index.append(current)
+            self._save_index()
+        if self._file is None:
+            path = self._segment_path(current['segment'])
+            self._file = open(path, 'ab')
+            if current['bytes'] and not self._ends_with_newline(path):
+                # Terminate a record cut short by a crash, so the next one starts on its own line
+                self._file.write(b'\n')
+                current['bytes'] += 1
+        return current
+
+    @staticmethod
+    def _ends_with_newline(path):
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _write_pending(self):
+        """Write and fsync everything queued so far as one batch"""
+        with self._write_lock:
+            with self._condition:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            data = ''.join(encode_turn(record) + '\n' for record in batch).encode('utf-8')
+            try:
+                entry = self._open_segment(len(data))
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                logging.error(f"Could not write {len(batch)} conversation journal records: {e}")
+                return
+            entry['bytes'] += len(data)
+            for record in batch:
+                self._index_record(entry, record)
+            self.records_written += len(batch)
+            self.batches += 1
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closed or len(self._pending) >= self.max_batch,
+                                         timeout=self.flush_interval)
+                closed = self._closed
+            self._write_pending()
+            if closed:
+                return
+
+    def append(self, session_id, turn):
+        """
+        Queue a turn for the journal
+
+        Args:
+            session_id (str): Patient or device the turn belongs to
+            turn (dict): JSON-serialisable turn
+
+        Returns:
+            float: Unix time the turn is journalled at
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Conversation journal is closed")
+            # Stamped under the lock, so a read() flushing later sees every record stamped before it
+            record = {'ts': time.time(), 'session_id': session_id, 'turn': turn}
+            self._pending.append(record)
+            if len(self._pending) >= self.max_batch:
+                self._condition.notify()
+        return record['ts']
+
+    def flush(self):
+        """Write and fsync queued turns now instead of at the next interval"""
+        self._write_pending()
+
+    def read(self, session_id=None, since=None, until=None):
+        """
+        Read journalled turns, oldest first, including those of other processes sharing the folder
+
+        Args:
+            session_id (str): Only this patient's turns, None for all
+            since (float): Only turns at or after this Unix time
+            until (float): Only turns at or before this Unix time
+
+        Returns:
+            list: Records with 'ts', 'session_id' and 'turn'
+        """
+        self.flush()
+        with self._write_lock:
+            self._refresh_index()
+            segments = [
+                entry['segment'] for entry in self._index
+                if entry['records']
+                and (session_id is None or session_id in entry['sessions'])
+                and (since is None or entry['end'] >= since)
+                and (until is None or entry['start'] <= until)
+            ]
+        records = []
+        for name in segments:
+            with open(self._segment_path(name), 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if ((session_id is None or record['session_id'] == session_id)
+                            and (since is None or record['ts'] >= since)
+                            and (until is None or record['ts'] <= until)):
+                        records.append(record)
+        # Segments of different processes interleave in time
+        records.sort(key=lambda record: record['ts'])
+        return records
+
+    def close(self):
+        """Write queued turns, stop the writer thread and save the index"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._save_index()
+
+    def stats(self):
+        """Get segment, record and batch counts"""
+        with self._write_lock:
+            return {
+                'segments': len(self._index),
+                'records': sum(entry['records'] for entry in self._index),
+                'bytes': sum(entry['bytes'] for entry in self._index),
+                'pending': len(self._pending),
+                'batches': self.batches,
+                'records_written': self.records_written
+            }
@@ -0,0 +1,224 @@
+"""
+Per-patient conversation history with bounded memory
+
+Each patient or device gets its own session holding its most recent turns
+in a ring buffer. The store keeps a global memory budget: when it is
+exceeded the least recently used sessions are evicted, and spilled to disk
+if a spill folder is configured, so a returning patient's history is
+reloaded instead of lost.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from pathlib import Path
+
+
+def session_file_stem(session_id):
+    """File name for a session, hashed so any patient or device identifier is safe on disk"""
+    return hashlib.sha256(session_id.encode('utf-8')).hexdigest()[:32]
+
+
+def turn_size(turn):
+    """Approximate memory held by a turn, as the length of its JSON encoding"""
+    return len(json.dumps(turn, default=str))
+
+
+class ConversationSession:
+    """Most recent turns of one patient's conversation"""
+
+    def __init__(self, session_id, max_turns=50, turns=()):
+        """
+        Initialize the session
+
+        Args:
+            session_id (str): Patient or device identifier
+            max_turns (int): Turns kept, older ones are dropped
+            turns (iterable): Turns to start with, e.g. reloaded from disk
+        """
+        self.session_id = session_id
+        self._turns = deque(maxlen=max_turns)
+        self.size = 0
+        self.last_active = time.time()
+        self._lock = threading.Lock()
+        for turn in turns:
+            self.add_turn(turn)
+
+    def add_turn(self, turn):
+        """
+        Append a turn, dropping the oldest one if the session is full
+
+        Returns:
+            int: Change in the session's size
+        """
+        with self._lock:
+            self.last_active = time.time()
+            before = self.size
+            if len(self._turns) == self._turns.maxlen:
+                self.size -= turn_size(self._turns[0])
+            self._turns.append(turn)
+            self.size += turn_size(turn)
+            return self.size - before
+
+    def turns(self):
+        """Get a copy of the kept turns, oldest first"""
+        with self._lock:
+            return list(self._turns)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._turns)
+
+
+class ConversationStore:
+    """Conversation sessions keyed by patient or device, under a shared memory budget"""
+
+    name = 'memory'
+
+    def __init__(self, max_turns=50, max_bytes=16 * 1024 * 1024, spill_dir=None):
+        """
+        Initialize the store
+
+        Args:
+            max_turns (int): Turns kept per session
+            max_bytes (int): Approximate memory all sessions together may use
+            spill_dir (str or Path): Folder evicted sessions are written to, None drops them
+        """
+        if max_turns < 1:
+            raise ValueError("max_turns must be greater than 0")
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.spills = 0
+        self.reloads = 0
+
+    def _spill_path(self, session_id):
+        return self.spill_dir / f"{session_file_stem(session_id)}.json"
+
+    def _load(self, session_id):
+        """Create a session, reloading a spilled one from disk (caller holds the lock)"""
+        turns = ()
+        if self.spill_dir:
+            path = self._spill_path(session_id)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    turns = json.load(f)['turns']
+                os.remove(path)
+                self.reloads += 1
+                logging.info(f"Reloaded conversation session {session_id} ({len(turns)} turns) from disk")
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Could not reload conversation session {session_id}: {e}")
+        session = ConversationSession(session_id, self.max_turns, turns)
+        self._sessions[session_id] = session
+        self.total_bytes += session.size
+        return session
+
+    def _spill(self, session):
+        """Write a session to disk (caller holds the lock)"""
+        path = self._spill_path(session.session_id)
+        temp_path = path.with_suffix('.tmp')
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'session_id': session.session_id, 'turns': session.turns()}, f, default=str)
+            os.replace(temp_path, path)
+            self.spills += 1
+        except OSError as e:
+            logging.error(f"Could not spill conversation session {session.session_id}: {e}")
+
+    def _evict(self, keep):
+        """Evict least recently used sessions until within budget, never the one in use (caller holds the lock)"""
+        while self.total_bytes > self.max_bytes:
+            session_id = next((sid for sid in self._sessions if sid != keep), None)
+            if session_id is None:
+                break
+            session = self._sessions.pop(session_id)
+            self.total_bytes -= session.size
+            self.evictions += 1
+            if self.spill_dir:
+                self._spill(session)
+            logging.info(f"Evicted conversation session {session_id} ({session.size} bytes, memory budget reached)")
+
+    def get(self, session_id):
+        """Get a session, reloading or creating it as needed"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._load(session_id)
+                self._evict(keep=session_id)
+            else:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def add_turn(self, session_id, turn):
+        """
+        Record a turn in a session
+
+        Args:
+            session_id (str): Patient or device identifier
+            turn (dict): JSON-serialisable turn
+        """
+        with self._lock:
+            session = self._sessions.get(session_id) or self._load(session_id)
+            self._sessions.move_to_end(session_id)
+            self.total_bytes += session.add_turn(turn)
+            self._evict(keep=session_id)
+
+    def history(self, session_id):
+        """
+        Get a session's turns, oldest first
+
+        A lookup never creates a session: an unknown one has no turns, and a
+        spilled one is read from disk without being reloaded into memory.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                return session.turns()
+            if not self.spill_dir:
+                return []
+            try:
+                with open(self._spill_path(session_id), 'r', encoding='utf-8') as f:
+                    return json.load(f)['turns'][-self.max_turns:]
+            except FileNotFoundError:
+                return []
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Could not read spilled conversation session {session_id}: {e}")
+                return []
+
+    def flush(self):
+        """Spill every session in memory to disk, e.g. on shutdown"""
+        if not self.spill_dir:
+            return
+        with self._lock:
+            for session in self._sessions.values():
+                self._spill(session)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def stats(self):
+        """Get session count, memory use and eviction counters"""
+        with self._lock:
+            return {
+                'backend': self.name,
+                'sessions': len(self._sessions),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'max_turns': self.max_turns,
+                'evictions': self.evictions,
+                'spills': self.spills,
+                'reloads': self.reloads
+            }
@@ -0,0 +1,157 @@
+"""
+Streaming sliding-window aggregation of per-frame emotion labels
+"""
+import time
+from collections import Counter, deque
+
+
+class EmotionAggregator:
+    """
+    Incrementally summarises a stream of per-frame emotion labels
+
+    Each added label updates the sliding-window counts in O(1) (the number of
+    distinct emotions is a small constant), so long sessions and live streams
+    can be summarised at any point without re-scanning their history.
+    """
+
+    def __init__(self, window_size=5, max_segments=None):
+        """
+        Initialize the aggregator
+
+        Args:
+            window_size (int): Number of labels in the smoothing window
+            max_segments (int): Keep at most this many timeline segments (None for unbounded)
+        """
+        if window_size < 1:
+            raise ValueError("window_size must be greater than 0")
+        self.window_size = window_size
+        self.total_frames = 0
+        self._window = deque()
+        self._window_counts = Counter()
+        self._label_counts = Counter()
+        self._dominant_counts = Counter()
+        self._current = None
+        self._segments = deque(maxlen=max_segments)
+
+    def add(self, label, timestamp=None):
+        """
+        Add one per-frame emotion label
+
+        Args:
+            label (str): Detected emotion
+            timestamp (float): Time of the frame in seconds, defaults to now
+
+        Returns:
+            str: The smoothed (window dominant) emotion after this label
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        self._window.append(label)
+        self._window_counts[label] += 1
+        if len(self._window) > self.window_size:
+            oldest = self._window.popleft()
+            self._window_counts[oldest] -= 1
+            if not self._window_counts[oldest]:
+                del self._window_counts[oldest]
+
+        self._label_counts[label] += 1
+        self.total_frames += 1
+        self._current = self._window_dominant()
+        if len(self._window) == self.window_size:
+            self._dominant_counts[self._current] += 1
+
+        self._extend_timeline(self._current, timestamp)
+        return self._current
+
+    def extend(self, labels, timestamp=None):
+        """Add several labels detected in the same frame"""
+        for label in labels:
+            self.add(label, timestamp)
+        return self._current
+
+    def _window_dominant(self):
+        """Most frequent label in the window, keeping the previous dominant on ties"""
+        best = max(self._window_counts.values())
+        if self._window_counts.get(self._current) == best:
+            return self._current
+        return next(label for label, count in self._window_counts.items() if count == best)
+
+    def _extend_timeline(self, emotion, timestamp):
+        """Merge the smoothed emotion into the run-length encoded timeline"""
+        if self._segments and self._segments[-1]['emotion'] == emotion:
+            segment = self._segments[-1]
+            segment['end'] = timestamp
+            segment['frames'] += 1
+        else:
+            self._segments.append({
+                'emotion': emotion,
+                'start': timestamp,
+                'end': timestamp,
+                'frames': 1
+            })
+
+    @property
+    def current(self):
+        """The smoothed emotion for the most recent window"""
+        return self._current
+
+    def dominant(self):
+        """
+        Get the overall dominant emotion
+
+        Returns:
+            str: Emotion that dominated the most windows, or None if nothing was added
+        """
+        percentages = self.percentages()
+        if not percentages:
+            return None
+        return max(percentages.items(), key=lambda x: x[1])[0]
+
+    def percentages(self):
+        """
+        Get the share of windows dominated by each emotion
+
+        Returns:
+            dict: Emotion -> percentage of windows. Before the first full window the
+                  partial window counts as a single window.
+        """
+        total_windows = sum(self._dominant_counts.values())
+        if not total_windows:
+            return {self._current: 100.0} if self._current is not None else {}
+        return {
+            emotion: (count / total_windows) * 100
+            for emotion, count in self._dominant_counts.items()
+        }
+
+    def top_emotions(self, n=3):
+        """Get the n most frequent raw per-frame labels"""
+        return [emotion for emotion, count in self._label_counts.most_common(n)]
+
+    def timeline(self):
+        """
+        Get the compact emotion timeline
+
+        Returns:
+            list: Segments of consecutive frames sharing the same smoothed emotion,
+                  each a dict with emotion, start, end and frames
+        """
+        return [dict(segment) for segment in self._segments]
+
+    def summary(self):
+        """Get dominant emotion, percentages and timeline in one dict"""
+        return {
+            'dominant': self.dominant(),
+            'percentages': self.percentages(),
+            'timeline': self.timeline()
+        }
+
+    def reset(self):
+        """Forget everything that has been added"""
+        self.total_frames = 0
+        self._window.clear()
+        self._window_counts.clear()
+        self._label_counts.clear()
+        self._dominant_counts.clear()
+        self._current = None
+        self._segments.clear()
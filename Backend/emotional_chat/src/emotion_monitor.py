@@ -6,15 +6,23 @@ import cv2
 import numpy as np
 import logging
 from pathlib import Path
+from .face_detectors import create_face_detector
+from .emotion_aggregator import EmotionAggregator
+from .video_processor import read_gray_frames
 
 class EmotionMonitor:
     """Class for monitoring emotions in video streams and frames using OpenCV"""
     
-    def __init__(self):
-        """Initialize the emotion monitor"""
+    def __init__(self, face_detector=None):
+        """
+        Initialize the emotion monitor
+
+        Args:
+            face_detector (FaceDetector): Face detector backend, defaults to the Haar cascade
+        """
         # Initialize face detection
-        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        self.face_cascade = cv2.CascadeClassifier(cascade_path)
+        self.face_detector = face_detector or create_face_detector('haar')
+        logging.info(f"Using face detector backend: {self.face_detector.name}")
         
         # Define emotion labels
         self.emotions = ['neutral', 'happy', 'sad', 'surprise', 'angry']
@@ -26,62 +34,93 @@ class EmotionMonitor:
         # Configure logging
         logging.basicConfig(level=logging.INFO)
     
-    def process_video(self, video_path):
+    def analyze_video(self, video_path, aggregator=None, frame_skip=5):
         """
-        Process video file for emotion detection
-        
+        Stream a video file's per-frame emotions into an aggregator
+
         Args:
             video_path (str): Path to the video file
-            
+            aggregator (EmotionAggregator): Aggregator to feed, a new one is created if omitted
+            frame_skip (int): Process every Nth frame
+
         Returns:
-            list: List of detected emotions throughout the video
+            EmotionAggregator: The aggregator holding the video's emotion summary
+
+        Raises:
+            Exception: If the video cannot be read or its decoding fails part way, so a
+                       truncated clip is never summarised from the frames that arrived
         """
-        try:
-            # Verify video file exists
-            if not os.path.exists(video_path):
-                raise FileNotFoundError(f"Video file not found: {video_path}")
-                
-            logging.info(f"Processing video for emotions: {video_path}")
-            
-            # Open video file
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                raise Exception("Failed to open video file")
-                
-            emotions = []
-            frame_count = 0
+        if aggregator is None:
+            aggregator = EmotionAggregator()
+
+        # Verify video file exists
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+
+        logging.info(f"Processing video for emotions: {video_path}")
+
+        for timestamp, frame in self._read_frames(video_path, frame_skip):
+            frame_emotions, _ = self.analyze_frame(frame)
+            aggregator.extend(frame_emotions, timestamp)
+
+        return aggregator
+
+    def _read_frames(self, video_path, frame_skip):
+        """
+        Yield (timestamp, frame) for every Nth frame of a video
+
+        Cascade detectors only need luminance, so frames are decoded straight to
+        grayscale by PyAV or FFmpeg. Colour frames are decoded with OpenCV for
+        backends that need them, or when the grayscale decode cannot start.
+        """
+        if not self.face_detector.requires_color:
+            frames = 0
+            try:
+                for timestamp, frame in read_gray_frames(video_path, frame_skip):
+                    frames += 1
+                    yield timestamp, frame
+                return
+            except Exception as e:
+                # Frames already analysed would be counted twice by a second decoder
+                if frames:
+                    raise
+                logging.warning(f"Grayscale decode failed ({e}), decoding colour frames with OpenCV")
+
+        # Open video file
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise Exception("Failed to open video file")
             
+        frame_count = 0
+        
+        try:
             while True:
                 # Read frame
                 ret, frame = cap.read()
                 if not ret:
                     break
                     
-                # Process every 5th frame to reduce processing time
-                if frame_count % 5 == 0:
-                    # Detect emotion in frame
-                    frame_emotions = self.process_frame(frame)
-                    if frame_emotions:
-                        emotions.extend(frame_emotions)
+                # Process every Nth frame to reduce processing time
+                if frame_count % frame_skip == 0:
+                    yield cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0, frame
                         
                 frame_count += 1
-                
+        finally:
             # Close video file
             cap.release()
+
+    def process_video(self, video_path):
+        """
+        Process video file for emotion detection
+        
+        Args:
+            video_path (str): Path to the video file
             
-            # Get most common emotions
-            if emotions:
-                unique_emotions = list(set(emotions))
-                emotion_counts = [(emotion, emotions.count(emotion)) for emotion in unique_emotions]
-                emotion_counts.sort(key=lambda x: x[1], reverse=True)
-                top_emotions = [emotion for emotion, count in emotion_counts[:3]]
-                return top_emotions
-            else:
-                return ['neutral']
-                
-        except Exception as e:
-            logging.error(f"Error processing video: {str(e)}")
-            return ['neutral']
+        Returns:
+            list: Up to three most common emotions throughout the video
+        """
+        aggregator = self.analyze_video(video_path)
+        return aggregator.top_emotions(3) or ['neutral']
     
     def process_frame(self, frame_data):
         """
@@ -93,24 +132,45 @@ class EmotionMonitor:
         Returns:
             list: Detected emotions in the frame
         """
+        frame_emotions, _ = self.analyze_frame(frame_data)
+        return frame_emotions
+
+    def analyze_frame(self, frame_data, previous_faces=None):
+        """
+        Detect faces and emotions in a single frame
+
+        When the face boxes of the previous frame are given, detection first runs
+        on an expanded region around them and only falls back to the full frame
+        if no face is found there.
+
+        Args:
+            frame_data (bytes or numpy.ndarray): Frame data either as bytes or numpy array
+            previous_faces (list): Face boxes (x, y, w, h) found in the previous frame
+
+        Returns:
+            tuple: (detected emotions, face boxes)
+        """
         try:
-            # Convert bytes to numpy array if needed
+            # Convert bytes to numpy array if needed, decoding only luminance unless colour is needed
             if isinstance(frame_data, bytes):
                 nparr = np.frombuffer(frame_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                read_flag = cv2.IMREAD_COLOR if self.face_detector.requires_color else cv2.IMREAD_GRAYSCALE
+                frame = cv2.imdecode(nparr, read_flag)
+                if frame is None:
+                    raise ValueError("Could not decode frame image")
             else:
                 frame = frame_data
             
-            # Convert to grayscale
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            # Convert to grayscale unless the frame already is
+            gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            detector_input = frame if self.face_detector.requires_color else gray
             
-            # Detect faces
-            faces = self.face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30)
-            )
+            # Detect faces, near the previous faces first
+            faces = []
+            if previous_faces:
+                faces = self._detect_near(detector_input, previous_faces)
+            if not faces:
+                faces = self.face_detector.detect(detector_input)
             
             frame_emotions = []
             
@@ -124,11 +184,27 @@ class EmotionMonitor:
                 emotion = self._detect_emotion_from_features(roi_gray)
                 frame_emotions.append(emotion)
             
-            return frame_emotions if frame_emotions else ['neutral']
+            return (frame_emotions if frame_emotions else ['neutral']), list(faces)
             
         except Exception as e:
             logging.error(f"Error processing frame: {str(e)}")
-            return ['neutral']
+            return ['neutral'], []
+
+    def _detect_near(self, image, previous_faces, margin=0.5):
+        """Run the face detector on the region around previously seen faces"""
+        height, width = image.shape[:2]
+        x1 = min(x for x, y, w, h in previous_faces)
+        y1 = min(y for x, y, w, h in previous_faces)
+        x2 = max(x + w for x, y, w, h in previous_faces)
+        y2 = max(y + h for x, y, w, h in previous_faces)
+        pad_x = int((x2 - x1) * margin)
+        pad_y = int((y2 - y1) * margin)
+        x1, y1 = max(x1 - pad_x, 0), max(y1 - pad_y, 0)
+        x2, y2 = min(x2 + pad_x, width), min(y2 + pad_y, height)
+        if x2 <= x1 or y2 <= y1:
+            return []
+        faces = self.face_detector.detect(image[y1:y2, x1:x2])
+        return [(x + x1, y + y1, w, h) for x, y, w, h in faces]
     
     def _detect_emotion_from_features(self, face_roi):
         """
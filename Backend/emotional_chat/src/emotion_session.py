@@ -0,0 +1,165 @@
+"""
+Stateful real-time emotion sessions fed by streamed video frames
+"""
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from .emotion_aggregator import EmotionAggregator
+
+
+class EmotionSession:
+    """Emotion state for one streaming client: face tracker plus rolling aggregator"""
+
+    def __init__(self, session_id, emotion_monitor, window_size=5, max_segments=500, owner=None):
+        """
+        Initialize the session
+
+        Args:
+            session_id (str): Identifier shared with the client
+            emotion_monitor (EmotionMonitor): Monitor used to analyse frames
+            window_size (int): Smoothing window of the aggregator
+            max_segments (int): Bound on the kept emotion timeline
+            owner (object): Connection streaming into the session, None if no connection holds it
+        """
+        self.session_id = session_id
+        self.owner = owner
+        self.emotion_monitor = emotion_monitor
+        self.aggregator = EmotionAggregator(window_size=window_size, max_segments=max_segments)
+        self.last_faces = []
+        self.last_active = time.time()
+        self._lock = threading.Lock()
+
+    def process_frame(self, frame_data, timestamp=None):
+        """
+        Analyse one frame and update the rolling emotion state
+
+        Args:
+            frame_data (bytes or numpy.ndarray): Encoded image bytes or decoded frame
+            timestamp (float): Capture time in seconds, defaults to now
+
+        Returns:
+            dict: Smoothed emotion update for the client
+        """
+        with self._lock:
+            self.last_active = time.time()
+            frame_emotions, faces = self.emotion_monitor.analyze_frame(frame_data, self.last_faces)
+            self.last_faces = faces
+            current = self.aggregator.extend(frame_emotions, timestamp)
+            return {
+                'success': True,
+                'session_id': self.session_id,
+                'frame_emotions': frame_emotions,
+                'faces': len(faces),
+                'current': current,
+                'dominant': self.aggregator.dominant(),
+                'percentages': self.aggregator.percentages(),
+                'frames': self.aggregator.total_frames
+            }
+
+    def consume(self):
+        """
+        Take the emotion summary accumulated so far and start a new one
+
+        Returns:
+            dict: Summary with dominant, percentages and timeline, or None if no frames arrived
+        """
+        with self._lock:
+            self.last_active = time.time()
+            if not self.aggregator.total_frames:
+                return None
+            summary = self.aggregator.summary()
+            self.aggregator.reset()
+            return summary
+
+
+class EmotionSessionManager:
+    """Keeps emotion sessions alive between frames and evicts idle ones"""
+
+    def __init__(self, emotion_monitor, window_size=5, idle_timeout=300, max_sessions=100):
+        """
+        Initialize the session manager
+
+        Args:
+            emotion_monitor (EmotionMonitor): Monitor shared by all sessions
+            window_size (int): Smoothing window for new sessions
+            idle_timeout (float): Seconds without activity before a session is dropped
+            max_sessions (int): Maximum number of concurrent sessions
+        """
+        self.emotion_monitor = emotion_monitor
+        self.window_size = window_size
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id=None, owner=None):
+        """
+        Get an existing session or start a new one
+
+        Session ids are only issued here: an unknown id starts a new session under
+        a fresh id, which the caller learns from the session, so clients cannot
+        choose ids that another tablet might use.
+
+        Args:
+            session_id (str): Session the caller was given earlier
+            owner (object): Connection asking for the session, it holds a new session until released
+
+        Returns:
+            EmotionSession: The session
+
+        Raises:
+            PermissionError: If the session is held by another connection
+        """
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None:
+                if session.owner is not None and session.owner is not owner:
+                    raise PermissionError(f"Emotion session {session_id} belongs to another connection")
+                self._sessions.move_to_end(session_id)
+                return session
+
+            session_id = str(uuid.uuid4())
+            session = EmotionSession(session_id, self.emotion_monitor, self.window_size, owner=owner)
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                evicted, _ = self._sessions.popitem(last=False)
+                logging.info(f"Evicted emotion session {evicted} (session limit reached)")
+            logging.info(f"Started emotion session {session_id}")
+            return session
+
+    def get(self, session_id):
+        """Get a session if it exists"""
+        with self._lock:
+            self._evict_idle()
+            return self._sessions.get(session_id) if session_id else None
+
+    def consume(self, session_id):
+        """Take and reset the emotion summary of a session, None if unavailable"""
+        session = self.get(session_id)
+        return session.consume() if session else None
+
+    def release(self, session_id, owner):
+        """Let other callers use a session once the connection holding it has closed"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and session.owner is owner:
+                session.owner = None
+
+    def close(self, session_id):
+        """Drop a session"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _evict_idle(self):
+        """Remove sessions that have been idle for too long (caller holds the lock)"""
+        cutoff = time.time() - self.idle_timeout
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_active < cutoff]:
+            del self._sessions[session_id]
+            logging.info(f"Expired idle emotion session {session_id}")
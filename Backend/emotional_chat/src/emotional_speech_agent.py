@@ -7,18 +7,36 @@ import numpy as np
 from dotenv import load_dotenv
 from openai import OpenAI
 from datetime import datetime
-import json
 import logging  # Import the logging module
 from .emotion_monitor import EmotionMonitor
+from .emotion_aggregator import EmotionAggregator
+from .face_detectors import create_face_detector
 from .speech_converter import SpeechConverter
+from .asr import create_asr_service
+from .llm_stream import stream_chat_completion, split_sentences
+from .session_backends import create_session_backend
+from .conversation_journal import ConversationJournal
+from .context_builder import ContextBuilder, openai_summarizer
+from .memory_index import ConversationMemory
+from .response_cache import ResponseCache
 from .config import Config
 
 # Load environment variables
 load_dotenv()
 
+# Session used by the local microphone loop and by callers that do not identify a patient
+DEFAULT_SESSION = 'local'
+
+FALLBACK_RESPONSE = "I apologize, but I'm having trouble processing that right now. Could you please try again?"
+
 class EmotionalSpeechAgent:
-    def __init__(self):
-        """Initialize the emotional speech agent with its components"""
+    def __init__(self, asr_service=None):
+        """
+        Initialize the emotional speech agent with its components
+
+        Args:
+            asr_service (ASRService): Speech recognition for the microphone, built from ASR_BACKENDS if omitted
+        """
         print("\nInitializing components...")
         # Initialize OpenAI client
         api_key = os.getenv("OPENAI_API_KEY")
@@ -27,10 +45,50 @@ class EmotionalSpeechAgent:
         self.client = OpenAI(api_key=api_key)
 
         # Initialize components
-        self.emotion_monitor = EmotionMonitor()
-        self.speech_converter = SpeechConverter()
+        face_detector = create_face_detector(Config.FACE_DETECTOR, **Config.face_detector_options())
+        self.emotion_monitor = EmotionMonitor(face_detector)
+        if asr_service is None:
+            asr_service = create_asr_service(
+                Config.ASR_BACKENDS,
+                recognizer_pool_size=Config.RECOGNIZER_POOL_SIZE,
+                openai_client=self.client,
+                whisper_model=Config.WHISPER_MODEL,
+                stub_text=Config.ASR_STUB_TEXT,
+                deadline=Config.ASR_DEADLINE,
+                hedge_after=Config.ASR_HEDGE_AFTER or None
+            )
+        self.speech_converter = SpeechConverter(asr_service=asr_service)
         self.running = False
-        self.conversation_history = []
+        self.conversations = create_session_backend(
+            Config.CONVERSATION_BACKEND,
+            max_turns=Config.CONVERSATION_MAX_TURNS,
+            max_bytes=int(Config.CONVERSATION_MEMORY_MB * 1024 * 1024),
+            spill_dir=Config.CONVERSATION_SPILL_FOLDER if Config.CONVERSATION_SPILL else None,
+            db_path=Config.CONVERSATION_DB_PATH,
+            folder=Config.CONVERSATION_FILE_FOLDER
+        )
+        self.journal = ConversationJournal(
+            Config.CONVERSATIONS_FOLDER,
+            segment_max_bytes=int(Config.CONVERSATION_JOURNAL_SEGMENT_MB * 1024 * 1024),
+            flush_interval=Config.CONVERSATION_JOURNAL_FLUSH_SECONDS
+        )
+        # Rebuilt from the journal for patients whose index is not in memory
+        self.memory = ConversationMemory(
+            loader=lambda session_id, until: [record['turn'] for record in self.journal.read(session_id, until=until)],
+            max_sessions=Config.MEMORY_MAX_SESSIONS
+        )
+        self.context_builder = ContextBuilder(
+            summarize=openai_summarizer(self.client, Config.OPENAI_MODEL) if Config.CONTEXT_SUMMARY else None,
+            budget_tokens=Config.CONTEXT_TOKEN_BUDGET,
+            summary_tokens=Config.CONTEXT_SUMMARY_TOKENS,
+            memory=self.memory if Config.MEMORY_RECALL_TURNS else None,
+            recall_turns=Config.MEMORY_RECALL_TURNS,
+            recall_tokens=Config.MEMORY_RECALL_TOKENS
+        )
+        self.response_cache = ResponseCache(
+            ttl=Config.RESPONSE_CACHE_TTL,
+            threshold=Config.RESPONSE_CACHE_THRESHOLD
+        ) if Config.RESPONSE_CACHE_TTL > 0 else None
         print("Initialization complete!")
 
     def start(self):
@@ -48,7 +106,13 @@ class EmotionalSpeechAgent:
         print("Emotion monitoring stopped")
         print("System stopped.")
         # Save conversation on exit
-        self.save_conversation()
+        self.conversations.flush()
+        self.journal.close()
+
+    @property
+    def conversation_history(self):
+        """Turns of the local session, oldest first"""
+        return self.conversations.history(DEFAULT_SESSION)
 
     def generate_emotion_aware_prompt(self, user_text, emotion_data):
         """Generate an emotion-aware prompt that focuses 90% on user's text and 10% on emotional state"""
@@ -77,17 +141,51 @@ class EmotionalSpeechAgent:
             return f"""You are Eva, an empathetic AI assistant. Respond as naturally as possible to the user's input: '{user_text}'.
                       Maintain a conversational tone and keep the response concise (2-3 sentences).""" #Return default
     
-    def get_response(self, user_text, emotion_data):
-        """Get AI response with 90% weight on user's text and 10% on emotional state"""
+    def _chat_messages(self, session_id, user_text, prompt):
+        """The session's history within the token budget, followed by the prompt for this turn"""
+        if session_id is None:
+            return [{"role": "system", "content": prompt}]
+        history = self.context_builder.build(session_id, self.conversations.history(session_id), query=user_text)
+        return history + [{"role": "system", "content": prompt}]
+
+    def _previous_reply(self, session_id):
+        """What Eva said last in the session, or None"""
+        if session_id is None:
+            return None
+        history = self.conversations.history(session_id)
+        return history[-1]['response'] if history else None
+
+    def _cached_response(self, session_id, user_text, emotion_data, previous_reply):
+        """Reply to a recent near-identical utterance in the same emotion after the same reply, or None"""
+        if self.response_cache is None or session_id is None:
+            return None
+        return self.response_cache.get(session_id, emotion_data.get('dominant_emotion'), user_text, previous_reply)
+
+    def _cache_response(self, session_id, user_text, emotion_data, previous_reply, ai_response):
+        """Remember a generated reply for repeats of the utterance"""
+        if self.response_cache is not None and session_id is not None:
+            self.response_cache.put(session_id, emotion_data.get('dominant_emotion'), user_text, ai_response,
+                                    previous_reply)
+
+    def get_response(self, user_text, emotion_data, session_id=DEFAULT_SESSION):
+        """
+        Get AI response with 90% weight on user's text and 10% on emotional state, recorded in the patient's session
+
+        A session_id of None answers without any history and records nothing.
+        """
         try:
+            previous_reply = self._previous_reply(session_id)
+            cached = self._cached_response(session_id, user_text, emotion_data, previous_reply)
+            if cached is not None:
+                self._record_turn(session_id, user_text, emotion_data, cached)
+                return cached
+
             # Generate the emotion-aware prompt
             prompt = self.generate_emotion_aware_prompt(user_text, emotion_data)
 
             # Get response from OpenAI
             response = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": prompt},
-                ],
+                messages=self._chat_messages(session_id, user_text, prompt),
                 model=Config.OPENAI_MODEL,
                 max_tokens=Config.MAX_TOKENS,
                 temperature=Config.TEMPERATURE
@@ -95,21 +193,79 @@ class EmotionalSpeechAgent:
 
             # Extract the response text
             ai_response = response.choices[0].message.content.strip()
-
-            # Store in conversation history
-            self.conversation_history.append({
-                'timestamp': datetime.now().isoformat(),
-                'user_text': user_text,
-                'emotion': emotion_data,
-                'prompt': prompt,
-                'response': ai_response
-            })
-
+            self._record_turn(session_id, user_text, emotion_data, ai_response)
+            self._cache_response(session_id, user_text, emotion_data, previous_reply, ai_response)
             return ai_response
 
         except Exception as e:
             logging.error(f"Error getting AI response: {str(e)}", exc_info=True)
-            return "I apologize, but I'm having trouble processing that right now. Could you please try again?"
+            return FALLBACK_RESPONSE
+
+    def stream_response(self, user_text, emotion_data, session_id=DEFAULT_SESSION):
+        """
+        Stream the AI response sentence by sentence, see get_response()
+
+        The turn is added to the conversation history once the stream has finished.
+
+        Args:
+            user_text (str): What the user said
+            emotion_data (dict): Emotion with 'dominant_emotion' and optional 'confidence'
+            session_id (str): Patient or device whose session records the turn, None for no history
+
+        Yields:
+            str: Sentences of the response as they are generated
+        """
+        previous_reply = self._previous_reply(session_id)
+        cached = self._cached_response(session_id, user_text, emotion_data, previous_reply)
+        if cached is not None:
+            yield from split_sentences([cached])
+            self._record_turn(session_id, user_text, emotion_data, cached)
+            return
+
+        prompt = self.generate_emotion_aware_prompt(user_text, emotion_data)
+        # The raw fragments are stored, so line breaks the model wrote are kept
+        fragments = []
+
+        def recorded(stream):
+            for fragment in stream:
+                fragments.append(fragment)
+                yield fragment
+
+        started = False
+        try:
+            stream = stream_chat_completion(
+                self.client,
+                messages=self._chat_messages(session_id, user_text, prompt),
+                model=Config.OPENAI_MODEL,
+                max_tokens=Config.MAX_TOKENS,
+                temperature=Config.TEMPERATURE
+            )
+            for sentence in split_sentences(recorded(stream)):
+                started = True
+                yield sentence
+        except Exception as e:
+            logging.error(f"Error streaming AI response: {str(e)}", exc_info=True)
+            if not started:
+                yield FALLBACK_RESPONSE
+            return
+        ai_response = ''.join(fragments).strip()
+        self._record_turn(session_id, user_text, emotion_data, ai_response)
+        self._cache_response(session_id, user_text, emotion_data, previous_reply, ai_response)
+
+    def _record_turn(self, session_id, user_text, emotion_data, ai_response):
+        """Store a completed exchange in the patient's session"""
+        if session_id is None:
+            return
+        # The prompt is rebuilt from these fields on demand, so it is not kept per turn
+        turn = {
+            'timestamp': datetime.now().isoformat(),
+            'user_text': user_text,
+            'emotion': emotion_data,
+            'response': ai_response
+        }
+        self.conversations.add_turn(session_id, turn)
+        journalled = self.journal.append(session_id, turn)
+        self.memory.add_turn(session_id, turn, journalled)
 
     def process_interaction(self):
         """Process one round of user interaction"""
@@ -126,25 +282,20 @@ class EmotionalSpeechAgent:
             print(f"\nDetected Emotion: {emotion_data['dominant_emotion']}") #Print dominant emotion
             print(f"Confidence: {emotion_data['confidence']:.1f}%") # Print confidence level
 
-            # Get and speak response
-            response = self.get_response(text, emotion_data)
-            if response:
-                print("\nAI Response:", response)
-                self.speech_converter.convert_to_speech(response)
+            # Speak the response sentence by sentence while the rest is generated
+            print("\nAI Response:", end=" ")
+            for sentence in self.stream_response(text, emotion_data):
+                print(sentence, end=" ", flush=True)
+                self.speech_converter.speak(sentence)
+            print()
 
         except Exception as e:
             print(f"Error in interaction: {e}")
 
     def save_conversation(self):
-        """Save the conversation history to a file"""
-        try:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'conversation_{timestamp}.json'
-            with open(filename, 'w') as f:
-                json.dump(self.conversation_history, f, indent=2)
-            print(f"\nConversation saved to {filename}")
-        except Exception as e:
-            print(f"Error saving conversation history: {str(e)}")
+        """Write journalled turns to disk now rather than at the next flush interval"""
+        self.journal.flush()
+        print(f"\nConversation saved to {self.journal.folder}")
 
     def process_video(self, video_path):
         """
@@ -156,58 +307,27 @@ class EmotionalSpeechAgent:
         """
         logging.info(f"Starting video processing for {video_path}")
         try:
-            # Process video frames for emotion detection
+            # Stream video frames through the sliding-window aggregator
             logging.info("Processing video frames for emotion detection...")
-            detected_emotions = self.emotion_monitor.process_video(video_path)
-            logging.info(f"Detected emotions: {detected_emotions}")
-            
-            if not detected_emotions:
-                logging.warning("No emotions detected in the video")
-                return {
-                    'success': False,
-                    'error': 'No emotions detected'
-                }
-
-            # Use sliding window to analyze emotions
-            window_size = 5
-            windows = []
-            # Create windows of emotions
-            for i in range(len(detected_emotions) - window_size + 1):
-                window = detected_emotions[i:i + window_size]
-                windows.append(window)
-
-            # If we have fewer emotions than window size, just use what we have
-            if not windows and detected_emotions:
-                windows = [detected_emotions]
-
-            # Calculate dominant emotion for each window
-            window_dominants = []
-            for window in windows:
-                emotion_counts = {}
-                for emotion in window:
-                    emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-                dominant = max(emotion_counts.items(), key=lambda x: x[1])[0]
-                window_dominants.append(dominant)
-
-            # Calculate overall emotion percentages
-            total_windows = len(window_dominants)
-            emotion_percentages = {}
-            for emotion in set(window_dominants):
-                count = window_dominants.count(emotion)
-                emotion_percentages[emotion] = (count / total_windows) * 100
-
-            # Get the final dominant emotion
-            final_dominant = max(emotion_percentages.items(), key=lambda x: x[1])[0]
-            logging.info(f"Final dominant emotion: {final_dominant}")
-            logging.info(f"Emotion percentages: {emotion_percentages}")
+            aggregator = self.emotion_monitor.analyze_video(
+                video_path,
+                EmotionAggregator(window_size=Config.EMOTION_WINDOW_SIZE),
+                frame_skip=Config.FRAME_SKIP
+            )
+
+            if not aggregator.total_frames:
+                # Clips without video frames fall back to neutral; decode errors fail the request below
+                logging.warning("No emotions detected in the video, assuming neutral")
+                aggregator.add('neutral', 0.0)
+
+            summary = aggregator.summary()
+            logging.info(f"Final dominant emotion: {summary['dominant']}")
+            logging.info(f"Emotion percentages: {summary['percentages']}")
 
             # Return the emotion analysis result
             return {
                 'success': True,
-                'emotions': {
-                    'dominant': final_dominant,
-                    'percentages': emotion_percentages
-                }
+                'emotions': summary
             }
 
         except Exception as e:
@@ -222,7 +342,7 @@ class EmotionalSpeechAgent:
         Process a single video frame for emotion detection
 
         Args:
-            frame_data (str): Base64 encoded image data
+            frame_data (bytes): Encoded image bytes
 
         Returns:
             dict: Dictionary containing success status and detected emotions
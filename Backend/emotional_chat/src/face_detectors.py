@@ -0,0 +1,195 @@
+"""
+Face detector backends for the emotion monitor
+
+Every backend exposes the same ``detect`` method so the emotion pipeline can
+switch between them through ``Config.FACE_DETECTOR``. Use
+``benchmark_face_detectors.py`` to compare speed and agreement on real footage.
+"""
+import os
+import threading
+import cv2
+import numpy as np
+
+FACE_DETECTOR_BACKENDS = ('haar', 'lbp', 'dnn')
+
+
+class FaceDetector:
+    """Base class for face detectors"""
+
+    name = 'base'
+    # Backends that need a 3-channel BGR image set this to True
+    requires_color = False
+
+    def detect(self, image):
+        """
+        Detect faces in an image
+
+        Args:
+            image (numpy.ndarray): Grayscale or BGR image
+
+        Returns:
+            list: Face boxes as (x, y, w, h) tuples
+        """
+        raise NotImplementedError
+
+    def _to_gray(self, image):
+        """Return a single-channel view of the image"""
+        if image.ndim == 2:
+            return image
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+class CascadeFaceDetector(FaceDetector):
+    """Face detector based on an OpenCV cascade classifier"""
+
+    def __init__(self, cascade_path, scale_factor=1.1, min_neighbors=5, min_size=(30, 30)):
+        """Load the cascade from disk"""
+        if not cascade_path or not os.path.exists(cascade_path):
+            raise FileNotFoundError(f"Cascade file not found: {cascade_path}")
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise ValueError(f"Failed to load cascade: {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, image):
+        """Detect faces using the cascade classifier"""
+        faces = self.cascade.detectMultiScale(
+            self._to_gray(image),
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=self.min_size
+        )
+        return [tuple(int(v) for v in face) for face in faces]
+
+
+class HaarFaceDetector(CascadeFaceDetector):
+    """Haar cascade detector bundled with OpenCV (the original default)"""
+
+    name = 'haar'
+
+    def __init__(self, cascade_path=None, **kwargs):
+        cascade_path = cascade_path or cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        super().__init__(cascade_path, **kwargs)
+
+
+class LBPFaceDetector(CascadeFaceDetector):
+    """
+    LBP cascade detector
+
+    LBP features are integer-only and noticeably faster than Haar on CPU, at the
+    cost of some accuracy. The cascade is not shipped with opencv-python, so the
+    path to ``lbpcascade_frontalface_improved.xml`` must be configured.
+    """
+
+    name = 'lbp'
+
+
+class DNNFaceDetector(FaceDetector):
+    """Single-shot face detector running on OpenCV's DNN module (ResNet-10 SSD)"""
+
+    name = 'dnn'
+    requires_color = True
+
+    def __init__(self, model_path, config_path=None, confidence=0.5, input_size=(300, 300)):
+        """Load the network from disk and pin it to the CPU"""
+        if not model_path:
+            raise FileNotFoundError("DNN face model path is not configured")
+        for path in (model_path, config_path):
+            if path and not os.path.exists(path):
+                raise FileNotFoundError(f"DNN face model file not found: {path}")
+        self.net = cv2.dnn.readNet(model_path, config_path or '')
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.confidence = confidence
+        self.input_size = input_size
+        # setInput/forward share state inside the network, so calls are serialised
+        self._lock = threading.Lock()
+
+    def detect(self, image):
+        """Detect faces using the SSD network"""
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        height, width = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(image, 1.0, self.input_size, (104.0, 177.0, 123.0))
+        with self._lock:
+            self.net.setInput(blob)
+            detections = self.net.forward()
+
+        faces = []
+        for detection in detections.reshape(-1, 7):
+            if detection[2] < self.confidence:
+                continue
+            x1, y1, x2, y2 = (detection[3:7] * np.array([width, height, width, height])).astype(int)
+            x1, y1 = max(x1, 0), max(y1, 0)
+            x2, y2 = min(x2, width), min(y2, height)
+            if x2 > x1 and y2 > y1:
+                faces.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1)))
+        return faces
+
+
+def create_face_detector(backend='haar', lbp_cascade=None, dnn_model=None, dnn_config=None,
+                         dnn_confidence=0.5):
+    """
+    Create a face detector for the given backend name
+
+    Args:
+        backend (str): One of FACE_DETECTOR_BACKENDS
+        lbp_cascade (str): Path to the LBP cascade XML (lbp backend)
+        dnn_model (str): Path to the DNN weights (dnn backend)
+        dnn_config (str): Path to the DNN network description (dnn backend)
+        dnn_confidence (float): Minimum detection confidence (dnn backend)
+
+    Returns:
+        FaceDetector: The configured detector
+    """
+    backend = (backend or 'haar').lower()
+    if backend == 'haar':
+        return HaarFaceDetector()
+    if backend == 'lbp':
+        return LBPFaceDetector(lbp_cascade)
+    if backend == 'dnn':
+        return DNNFaceDetector(dnn_model, dnn_config, confidence=dnn_confidence)
+    raise ValueError(f"Unknown face detector backend: {backend}. "
+                     f"Expected one of {', '.join(FACE_DETECTOR_BACKENDS)}")
+
+
+def box_iou(box_a, box_b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    intersection = inter_w * inter_h
+    union = aw * ah + bw * bh - intersection
+    return intersection / union if union else 0.0
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """
+    Greedily match candidate boxes to reference boxes
+
+    Args:
+        reference (list): Boxes from the reference detector
+        candidate (list): Boxes from the detector under test
+        iou_threshold (float): Minimum IoU for two boxes to count as the same face
+
+    Returns:
+        int: Number of matched pairs
+    """
+    pairs = sorted(
+        ((box_iou(r, c), i, j) for i, r in enumerate(reference) for j, c in enumerate(candidate)),
+        reverse=True
+    )
+    used_ref, used_cand = set(), set()
+    for iou, i, j in pairs:
+        if iou < iou_threshold:
+            break
+        if i in used_ref or j in used_cand:
+            continue
+        used_ref.add(i)
+        used_cand.add(j)
+    return len(used_ref)
@@ -0,0 +1,129 @@
+"""
+Idempotency layer for retried media requests
+
+Completed results are served from a bounded TTL cache, and duplicates that
+arrive while the original request is still running wait for its result
+instead of starting the same work again, up to a timeout.
+"""
+import hashlib
+import logging
+import threading
+from .ttl_cache import TTLCache
+
+_MISSING = object()
+
+
+def request_key(namespace, idempotency_key=None, payload=None, scope=()):
+    """
+    Build the cache key for a request
+
+    The key hashes the payload together with the client supplied key and the
+    caller's scope, so a key reused for other content, or the same content
+    sent for another patient or device, never replays someone else's result.
+
+    Args:
+        namespace (str): Endpoint name, so different endpoints never share results
+        idempotency_key (str): Client supplied key, None when the client sent none
+        payload (bytes): Decoded request payload
+        scope (tuple): Identifiers of the caller, e.g. device and conversation ids, None where absent
+
+    Returns:
+        str: Cache key
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (*scope, idempotency_key):
+        text = b'' if part is None else str(part).encode('utf-8')
+        # Length prefixes keep ('ab', 'c') and ('a', 'bc') apart
+        digest.update(len(text).to_bytes(4, 'big') + text)
+    digest.update(payload or b'')
+    kind = 'key' if idempotency_key else 'hash'
+    return f"{namespace}:{kind}:{digest.hexdigest()}"
+
+
+class InFlightTimeout(Exception):
+    """A duplicate request gave up waiting for the original one to finish"""
+
+
+class _InFlight:
+    """Result slot shared by a running computation and the duplicates waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class IdempotencyCache:
+    """Deduplicates identical requests, both completed and in flight"""
+
+    def __init__(self, max_entries=128, ttl=300, should_cache=None, wait_timeout=60):
+        """
+        Initialize the idempotency cache
+
+        Args:
+            max_entries (int): Maximum number of completed results kept
+            ttl (float): Seconds a completed result is replayed for
+            should_cache (callable): Predicate deciding whether a result may be replayed later.
+                                     Failed results are still shared with in-flight duplicates.
+            wait_timeout (float): Seconds a duplicate waits for the request in flight
+        """
+        self._results = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._should_cache = should_cache or (lambda result: True)
+        self.wait_timeout = wait_timeout
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the result for a key, computing it at most once at a time
+
+        Args:
+            key (str): Request key from request_key()
+            compute (callable): Produces the result when it is not cached
+
+        Returns:
+            tuple: (result, replayed) where replayed is True if the result was not computed by this call
+
+        Raises:
+            InFlightTimeout: If the same request is in flight and does not finish within wait_timeout
+        """
+        with self._lock:
+            cached = self._results.get(key, _MISSING)
+            if cached is not _MISSING:
+                logging.info(f"Replaying cached result for {key}")
+                return cached, True
+
+            pending = self._in_flight.get(key)
+            owner = pending is None
+            if owner:
+                pending = _InFlight()
+                self._in_flight[key] = pending
+
+        if not owner:
+            logging.info(f"Waiting for in-flight request {key}")
+            if not pending.done.wait(self.wait_timeout):
+                raise InFlightTimeout(f"Request {key} is still being processed")
+            if pending.error is not None:
+                raise pending.error
+            return pending.result, True
+
+        try:
+            pending.result = compute()
+            if self._should_cache(pending.result):
+                self._results.set(key, pending.result)
+            return pending.result, False
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            pending.done.set()
+
+    def stats(self):
+        """Get cache statistics and the number of requests in flight"""
+        stats = self._results.stats()
+        with self._lock:
+            stats['in_flight'] = len(self._in_flight)
+        return stats
+
@@ -0,0 +1,53 @@
+"""
+Streaming chat completions split into sentences
+
+Speech and the HTTP response can start on the first sentence of a reply
+instead of waiting for the whole completion, so the patient hears Eva
+answer after the time it takes to generate one sentence.
+"""
+import re
+
+# A sentence ends at . ! ? (optionally followed by closing quotes or brackets) before whitespace
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+
+def stream_chat_completion(client, **kwargs):
+    """
+    Request a chat completion and yield its text as it is generated
+
+    Args:
+        client (openai.OpenAI): OpenAI client
+        **kwargs: Arguments for client.chat.completions.create()
+
+    Yields:
+        str: Text fragments in order
+    """
+    stream = client.chat.completions.create(stream=True, **kwargs)
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def split_sentences(fragments, min_length=20):
+    """
+    Regroup streamed text fragments into sentences
+
+    Args:
+        fragments (iterable): Text fragments in order
+        min_length (int): Shorter sentences are joined with the next one, so a
+                          lone "Hi!" is not synthesised as its own clip
+
+    Yields:
+        str: Sentences, stripped of surrounding whitespace, the last one flushed when the stream ends
+    """
+    pending = ''
+    for fragment in fragments:
+        pending += fragment
+        start = 0
+        for match in SENTENCE_END.finditer(pending):
+            if match.end() - start >= min_length:
+                yield pending[start:match.end()].strip()
+                start = match.end()
+        pending = pending[start:]
+    if pending.strip():
+        yield pending.strip()
@@ -0,0 +1,230 @@
+"""
+Searchable long-term conversation memory
+
+Each patient's past turns are kept in an in-memory BM25 inverted index
+that grows by one document per turn, so "what did we talk about related to
+X" is answered in milliseconds without an external service. Indexes of
+patients who have not talked for a while are dropped and rebuilt from the
+conversation journal in the background when they are next needed; until
+the rebuild finishes, nothing is recalled for that patient.
+"""
+import re
+import math
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, OrderedDict, deque
+
+# Words that say nothing about what a turn was about
+STOPWORDS = frozenset("""
+a an and are as at be but by can could do does did for from had has have he her him his how i i'm if in into
+is it its just me my no not of on or our she so that the their them then there they this to was we were what
+when where which who will with would you your
+""".split())
+
+TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [token for token in TOKEN.findall((text or '').lower()) if token not in STOPWORDS]
+
+
+def turn_text(turn):
+    """Searchable text of a turn: what the patient said and what Eva answered"""
+    return f"{turn.get('user_text', '')} {turn.get('response', '')}"
+
+
+class MemoryIndex:
+    """Incremental BM25 index over one patient's turns"""
+
+    def __init__(self, max_turns=2000, k1=1.5, b=0.75):
+        """
+        Initialize the index
+
+        Args:
+            max_turns (int): Turns indexed, the oldest are removed beyond this
+            k1 (float): BM25 term frequency saturation
+            b (float): BM25 length normalisation
+        """
+        self.max_turns = max_turns
+        self.k1 = k1
+        self.b = b
+        self._turns = deque()  # (number, turn, term counts, length)
+        self._postings = {}  # term -> {turn number: frequency}
+        self._total_length = 0
+        self._next_number = 0
+
+    def add(self, turn):
+        """Index a turn, removing the oldest one if the index is full"""
+        terms = Counter(tokenize(turn_text(turn)))
+        length = sum(terms.values())
+        number = self._next_number
+        self._next_number += 1
+        self._turns.append((number, turn, terms, length))
+        self._total_length += length
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[number] = frequency
+        if len(self._turns) > self.max_turns:
+            old_number, _, old_terms, old_length = self._turns.popleft()
+            self._total_length -= old_length
+            for term in old_terms:
+                postings = self._postings[term]
+                del postings[old_number]
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query, k=3, before=None):
+        """
+        Find the turns most relevant to a query
+
+        Args:
+            query (str): What to look for
+            k (int): Turns returned
+            before (str): Only turns with an earlier ISO timestamp, e.g. older than those already in the prompt
+
+        Returns:
+            list: (score, turn) pairs, best first
+        """
+        if not self._turns:
+            return []
+        first = self._turns[0][0]
+        count = len(self._turns)
+        average_length = self._total_length / count or 1
+        scores = Counter()
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for number, frequency in postings.items():
+                length = self._turns[number - first][3]
+                norm = 1 - self.b + self.b * length / average_length
+                scores[number] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+        results = []
+        for number, score in scores.most_common():
+            turn = self._turns[number - first][1]
+            if before is not None and turn.get('timestamp', '') >= before:
+                continue
+            results.append((score, turn))
+            if len(results) == k:
+                break
+        return results
+
+    def __len__(self):
+        return len(self._turns)
+
+
+class ConversationMemory:
+    """Memory indexes keyed by patient or device, the least recently used dropped beyond max_sessions"""
+
+    def __init__(self, loader=None, max_sessions=256, max_turns=2000, clock=time.time):
+        """
+        Initialize the memory
+
+        Args:
+            loader (callable): loader(session_id, until) returning a session's turns journalled at or
+                               before the Unix time until, oldest first, used to rebuild an index that
+                               is not in memory
+            max_sessions (int): Session indexes kept in memory
+            max_turns (int): Turns indexed per session
+            clock (callable): Time source matching the journal's timestamps, injectable for tests
+        """
+        self.loader = loader
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self._clock = clock
+        self._indexes = OrderedDict()
+        # session id -> (rebuild cutoff, [(journalled, turn)] added while rebuilding)
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='memory-load')
+        self.loads = 0
+
+    def _index(self, session_id):
+        """Get a session's index, scheduling a rebuild if it is not in memory (caller holds the lock)"""
+        index = self._indexes.get(session_id)
+        if index is not None:
+            self._indexes.move_to_end(session_id)
+            return index
+        if session_id not in self._loading:
+            if self.loader is None:
+                return self._store(session_id, MemoryIndex(max_turns=self.max_turns))
+            until = self._clock()
+            self._loading[session_id] = (until, [])
+            self._executor.submit(self._load, session_id, until)
+        return None
+
+    def _store(self, session_id, index):
+        """Keep an index, dropping the least recently used beyond max_sessions (caller holds the lock)"""
+        self._indexes[session_id] = index
+        while len(self._indexes) > self.max_sessions:
+            self._indexes.popitem(last=False)
+        return index
+
+    def _load(self, session_id, until):
+        """Rebuild a session's index from the loader on the background thread"""
+        index = MemoryIndex(max_turns=self.max_turns)
+        try:
+            for turn in self.loader(session_id, until):
+                index.add(turn)
+            loaded = True
+        except Exception as e:
+            loaded = False
+            logging.warning(f"Could not load conversation memory of session {session_id}: {e}")
+        with self._lock:
+            _, added = self._loading.pop(session_id)
+            if not loaded:
+                # Tried again on the next search
+                return
+            # Turns journalled after the cutoff were not loaded
+            for journalled, turn in added:
+                if journalled is None or journalled > until:
+                    index.add(turn)
+            self.loads += 1
+            self._store(session_id, index)
+
+    def add_turn(self, session_id, turn, journalled=None):
+        """
+        Index a new turn
+
+        A session whose index is not in memory is left alone: the loader
+        includes the turn when the index is next rebuilt. During a rebuild the
+        turn is kept and added afterwards, unless it was journalled before the
+        rebuild's cutoff and so is loaded already.
+
+        Args:
+            session_id (str): Patient or device identifier
+            turn (dict): Turn with 'user_text', 'response' and 'timestamp'
+            journalled (float): Unix time the journal recorded the turn at
+        """
+        with self._lock:
+            loading = self._loading.get(session_id)
+            if loading is not None:
+                loading[1].append((journalled, turn))
+                return
+            index = self._indexes.get(session_id)
+            if index is not None:
+                self._indexes.move_to_end(session_id)
+                index.add(turn)
+
+    def search(self, session_id, query, k=3, before=None):
+        """
+        Find a session's turns most relevant to a query, see MemoryIndex.search()
+
+        Returns no turns while the session's index is being rebuilt.
+        """
+        with self._lock:
+            index = self._index(session_id)
+            return index.search(query, k, before) if index is not None else []
+
+    def stats(self):
+        """Get the number of indexed sessions and turns"""
+        with self._lock:
+            return {
+                'sessions': len(self._indexes),
+                'turns': sum(len(index) for index in self._indexes.values()),
+                'loading': len(self._loading),
+                'loads': self.loads
+            }
@@ -0,0 +1,211 @@
+"""
+Semantic response cache for repeated utterances
+
+Residents often repeat themselves within minutes. A new utterance is
+matched against the patient's recent ones, exactly after normalisation or
+by character trigram similarity, and a close enough match is answered with
+the earlier reply instead of a model call. Replies are kept per patient and
+per detected emotion, so a sad and a happy "hello" never share one, and
+per previous reply, so "yes" or "tell me more" are only matched against
+utterances that followed the same thing Eva said. Utterances with too few
+content words to stand on their own are never cached.
+"""
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict, Counter
+from .ttl_cache import TTLCache
+
+# Hesitations and the wake word carry no meaning for matching
+FILLERS = frozenset(['um', 'uh', 'er', 'erm', 'hmm', 'eva', 'ava', 'please', 'oh'])
+
+# Function words, which do not make an utterance specific enough to reuse a reply
+FUNCTION_WORDS = frozenset("""
+a an and are as at be but by can could do for from i i'm if in is it me my of on or our so that the
+this to was we you your more yes no ok okay yeah not
+""".split())
+
+# Utterances with fewer content words depend on what was said before them
+MIN_CONTENT_WORDS = 3
+
+
+def normalize(text):
+    """Lowercase words without punctuation, fillers or repeated whitespace"""
+    words = re.findall(r"[a-z0-9']+", (text or '').lower())
+    return ' '.join(word for word in words if word not in FILLERS)
+
+
+def content_words(normalised):
+    """Words of a normalised utterance that are not function words"""
+    return [word for word in normalised.split() if word not in FUNCTION_WORDS]
+
+
+def context_key(previous_reply):
+    """Short hash of the reply the utterance answers"""
+    return hashlib.blake2b((previous_reply or '').encode('utf-8'), digest_size=8).hexdigest()
+
+
+def char_ngrams(text, n=3):
+    """Character n-grams of a normalised text, padded so word boundaries count"""
+    padded = f" {text} "
+    return frozenset(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+class _Bucket:
+    """Recent utterances of one patient in one emotion, with an n-gram inverted index"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # id -> (created, normalised text, n-grams, response)
+        self.exact = {}  # normalised text -> id
+        self.postings = {}  # n-gram -> set of ids
+        self.next_id = 0
+
+    def remove(self, entry_id):
+        _, text, grams, _ = self.entries.pop(entry_id)
+        if self.exact.get(text) == entry_id:
+            del self.exact[text]
+        for gram in grams:
+            ids = self.postings[gram]
+            ids.discard(entry_id)
+            if not ids:
+                del self.postings[gram]
+
+    def expire(self, oldest):
+        """Remove entries created before oldest; entries are kept in creation order"""
+        while self.entries:
+            entry_id, (created, _, _, _) = next(iter(self.entries.items()))
+            if created >= oldest:
+                break
+            self.remove(entry_id)
+
+    def add(self, created, text, grams, response):
+        if text in self.exact:
+            self.remove(self.exact[text])
+        entry_id = self.next_id
+        self.next_id += 1
+        self.entries[entry_id] = (created, text, grams, response)
+        self.exact[text] = entry_id
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(entry_id)
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+
+    def best_match(self, text, grams):
+        """
+        (Jaccard similarity, response) of the most similar entry, found through shared n-grams
+
+        Entries mentioning other numbers never match, e.g. "room 12" and "room 13".
+        """
+        digits = re.findall(r"\d+", text)
+        overlap = Counter()
+        for gram in grams:
+            for entry_id in self.postings.get(gram, ()):
+                overlap[entry_id] += 1
+        best = (0.0, None)
+        for entry_id, shared in overlap.items():
+            _, entry_text, entry_grams, response = self.entries[entry_id]
+            if re.findall(r"\d+", entry_text) != digits:
+                continue
+            similarity = shared / (len(grams) + len(entry_grams) - shared)
+            if similarity > best[0]:
+                best = (similarity, response)
+        return best
+
+
+class ResponseCache:
+    """Replies to recent utterances, per patient and emotion, matched by normalised text and n-gram similarity"""
+
+    def __init__(self, ttl=600, threshold=0.8, max_entries=64, max_patients=1024, ngram=3, clock=time.monotonic):
+        """
+        Initialize the cache
+
+        Args:
+            ttl (float): Seconds a reply may be reused
+            threshold (float): Jaccard similarity of character n-grams at or above which utterances match
+            max_entries (int): Utterances kept per patient and emotion
+            max_patients (int): Patient and emotion pairs kept, the least recently used are dropped
+            ngram (int): Characters per n-gram
+            clock (callable): Time source, injectable for tests
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be between 0 and 1")
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ngram = ngram
+        self._clock = clock
+        self._buckets = TTLCache(max_entries=max_patients, ttl=ttl, clock=clock)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def cacheable(self, normalised):
+        """Whether an utterance says enough on its own for its reply to be reused"""
+        return len(content_words(normalised)) >= MIN_CONTENT_WORDS
+
+    def get(self, session_id, emotion, text, previous_reply=None):
+        """
+        Get the reply to a matching recent utterance
+
+        Args:
+            session_id (str): Patient or device identifier
+            emotion (str): Dominant emotion of this utterance
+            text (str): Transcribed utterance
+            previous_reply (str): What Eva said last, None at the start of a conversation
+
+        Returns:
+            str: Cached reply, or None
+        """
+        normalised = normalize(text)
+        if not self.cacheable(normalised):
+            with self._lock:
+                self.skipped += 1
+            return None
+        with self._lock:
+            bucket = self._buckets.get((session_id, emotion, context_key(previous_reply)))
+            if bucket is None:
+                self.misses += 1
+                return None
+            bucket.expire(self._clock() - self.ttl)
+            entry_id = bucket.exact.get(normalised)
+            if entry_id is not None:
+                self.exact_hits += 1
+                return bucket.entries[entry_id][3]
+            similarity, response = bucket.best_match(normalised, char_ngrams(normalised, self.ngram))
+            if response is not None and similarity >= self.threshold:
+                self.similar_hits += 1
+                return response
+            self.misses += 1
+            return None
+
+    def put(self, session_id, emotion, text, response, previous_reply=None):
+        """Remember the reply to an utterance, see get()"""
+        normalised = normalize(text)
+        if not response or not self.cacheable(normalised):
+            return
+        with self._lock:
+            key = (session_id, emotion, context_key(previous_reply))
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = _Bucket(self.max_entries)
+            bucket.add(self._clock(), normalised, char_ngrams(normalised, self.ngram), response)
+            # Setting the bucket again restarts its time to live
+            self._buckets.set(key, bucket)
+
+    def stats(self):
+        """Get hit and miss counters"""
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                'exact_hits': self.exact_hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'skipped': self.skipped,
+                'hit_rate': round((self.exact_hits + self.similar_hits) / lookups, 3) if lookups else 0.0,
+                'ttl': self.ttl,
+                'threshold': self.threshold
+            }
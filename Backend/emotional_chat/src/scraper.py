@@ -92,22 +92,89 @@ def search_image(query: str) -> Optional[str]:
             return img['src']
     return None
 
+class StreamingCommandParser:
+    """
+    Separates [COMMAND:...] markers from a streamed response as it arrives
+
+    Text is passed through as soon as it cannot be part of a marker, and each
+    marker is parsed and handed to on_command the moment its closing bracket
+    arrives, so a lookup can run while the rest of the reply is still being
+    generated and spoken.
+
+    A deliberate copy of the parser in ai/voice_assistant.py, which is
+    deployed separately; keep the two in sync.
+    """
+    MARKER = '[COMMAND:'
+
+    def __init__(self, on_command=None, max_marker_length=300):
+        """
+        Initialize the parser
+
+        Args:
+            on_command: Called with each Command as soon as its marker is complete
+            max_marker_length: An unclosed marker longer than this is treated as plain text
+        """
+        self.on_command = on_command
+        self.max_marker_length = max_marker_length
+        self.commands: List[Command] = []
+        self._pending = ''
+
+    def feed(self, fragment: str) -> str:
+        """Add a fragment of the response and return the clean text that is now final"""
+        text = self._pending + fragment
+        clean = []
+        position = 0
+        while True:
+            start = text.find('[', position)
+            if start == -1:
+                clean.append(text[position:])
+                self._pending = ''
+                break
+            clean.append(text[position:start])
+            rest = text[start:]
+            if not rest.startswith(self.MARKER):
+                if self.MARKER.startswith(rest):
+                    # Could still become a marker once more text arrives
+                    self._pending = rest
+                    break
+                clean.append('[')
+                position = start + 1
+                continue
+            end = text.find(']', start)
+            if end == -1:
+                if len(rest) > self.max_marker_length:
+                    clean.append('[')
+                    position = start + 1
+                    continue
+                self._pending = rest
+                break
+            self._dispatch(text[start + len(self.MARKER):end])
+            position = end + 1
+        return ''.join(clean)
+
+    def flush(self) -> str:
+        """Return text held back at the end of the stream, such as an unclosed marker"""
+        text, self._pending = self._pending, ''
+        return text
+
+    def _dispatch(self, command_str: str):
+        try:
+            command = Command.parse(command_str)
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring malformed command '{command_str}': {e}")
+            return
+        if command is None:
+            return
+        self.commands.append(command)
+        if self.on_command:
+            self.on_command(command)
+
 def parse_commands(response: str) -> Tuple[str, List[Command]]:
     """Parse the response for any commands"""
-    commands = []
-    
     # Look for commands in the format: [COMMAND:type=play_youtube,query=Frank Sinatra]
-    command_pattern = r'\[COMMAND:([^\]]+)\]'
-    matches = re.finditer(command_pattern, response)
-
-    for match in matches:
-        command_str = match.group(1)
-        command = Command.parse(command_str)
-        commands.append(command)
-
-    # Remove the command text from the response
-    clean_response = re.sub(command_pattern, '', response)
-    return clean_response, commands
+    parser = StreamingCommandParser()
+    clean_response = parser.feed(response) + parser.flush()
+    return clean_response, parser.commands
 
 def get_user_input():
     """Get user input through text"""
@@ -0,0 +1,183 @@
+"""
+Segmented transcription of long recordings
+
+Cloud speech recognition takes one utterance-sized request at a time, so a
+multi-minute recording is cut into bounded segments at its quietest points,
+the segments are transcribed concurrently, and the text is stitched back
+together in order with timestamps. Audio is read in blocks and only a few
+segments are held at once, so memory does not grow with the recording length.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .voice_activity import VoiceActivityDetector
+from .asr import ASRError, SpeechNotUnderstood, audio_data_from_samples
+
+
+class SilenceSegmenter:
+    """Cuts a stream of PCM blocks into segments, splitting where the audio is quietest"""
+
+    def __init__(self, sample_rate, min_segment_seconds=5.0, max_segment_seconds=25.0,
+                 frame_ms=20, smoothing_ms=300):
+        """
+        Initialize the segmenter
+
+        Args:
+            sample_rate (int): Sample rate of the incoming PCM
+            min_segment_seconds (float): Shortest segment, except for the last one
+            max_segment_seconds (float): Longest segment, kept below the recognizer's request limit
+            frame_ms (int): Frame length for the energy measurement
+            smoothing_ms (int): Energy is averaged over this span, so a cut lands in a pause
+                                rather than in a single quiet frame inside a word
+        """
+        if not 0 < min_segment_seconds < max_segment_seconds:
+            raise ValueError("Need 0 < min_segment_seconds < max_segment_seconds")
+        self.sample_rate = sample_rate
+        self.min_samples = int(min_segment_seconds * sample_rate)
+        self.max_samples = int(max_segment_seconds * sample_rate)
+        self.frame_len = max(1, int(sample_rate * frame_ms / 1000))
+        self.smoothing_frames = max(1, smoothing_ms // frame_ms)
+        self._buffer = np.zeros(0, dtype=np.int16)
+        self._offset = 0
+
+    def _cut_point(self, samples):
+        """Sample index between min and max segment length where the audio is quietest"""
+        n_frames = min(len(samples), self.max_samples) // self.frame_len
+        frames = samples[:n_frames * self.frame_len].reshape(n_frames, self.frame_len).astype(np.float32)
+        energy = np.mean(frames ** 2, axis=1)
+        kernel = np.ones(self.smoothing_frames) / self.smoothing_frames
+        smoothed = np.convolve(energy, kernel, mode='same')
+        first = self.min_samples // self.frame_len
+        return (first + int(np.argmin(smoothed[first:]))) * self.frame_len
+
+    def feed(self, samples):
+        """
+        Add samples
+
+        Args:
+            samples (numpy.ndarray): Next block of mono int16 samples
+
+        Returns:
+            list: (start sample, numpy.ndarray) for each segment completed by this block
+        """
+        self._buffer = np.concatenate((self._buffer, samples))
+        segments = []
+        while len(self._buffer) >= self.max_samples:
+            cut = self._cut_point(self._buffer)
+            segments.append((self._offset, self._buffer[:cut]))
+            self._buffer = self._buffer[cut:]
+            self._offset += cut
+        return segments
+
+    def flush(self):
+        """Return the remaining audio as a final segment, if there is any"""
+        segments = []
+        if len(self._buffer):
+            segments.append((self._offset, self._buffer))
+            self._offset += len(self._buffer)
+            self._buffer = np.zeros(0, dtype=np.int16)
+        return segments
+
+
+class SegmentedTranscriber:
+    """Transcribes long recordings as concurrently recognised segments"""
+
+    def __init__(self, asr_service, voice_activity_detector=None, min_segment_seconds=5.0,
+                 max_segment_seconds=25.0, max_workers=4):
+        """
+        Initialize the transcriber
+
+        Args:
+            asr_service (ASRService): Speech recognition for each segment
+            voice_activity_detector (VoiceActivityDetector): Skips segments without speech
+            min_segment_seconds (float): Shortest segment, except for the last one
+            max_segment_seconds (float): Longest segment
+            max_workers (int): Segments transcribed at the same time
+        """
+        self.asr_service = asr_service
+        self.voice_activity_detector = voice_activity_detector or VoiceActivityDetector()
+        self.min_segment_seconds = min_segment_seconds
+        self.max_segment_seconds = max_segment_seconds
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='segment')
+
+    def _transcribe_segment(self, start, samples, sample_rate):
+        """Transcribe one segment into its result dict"""
+        segment = {
+            'start': round(start / sample_rate, 2),
+            'end': round((start + len(samples)) / sample_rate, 2),
+            'text': ''
+        }
+        span = self.voice_activity_detector.speech_span(samples, sample_rate)
+        if span is None:
+            segment['speech_detected'] = False
+            return segment
+        begin, end = span
+        try:
+            audio = audio_data_from_samples(samples[begin:end], sample_rate)
+            segment['text'] = self.asr_service.transcribe(audio)['text']
+        except SpeechNotUnderstood:
+            pass
+        except ASRError as e:
+            logging.warning(f"Segment at {segment['start']:.2f}s failed: {e}")
+            segment['error'] = str(e)
+        return segment
+
+    def transcribe_stream(self, blocks, sample_rate):
+        """
+        Transcribe a stream of PCM blocks
+
+        Args:
+            blocks (iterable): Consecutive blocks of mono int16 samples
+            sample_rate (int): Sample rate in Hz
+
+        Returns:
+            dict: Stitched text, per-segment start/end/text in order, duration in seconds
+                  and the number of segments that failed
+        """
+        segmenter = SilenceSegmenter(sample_rate, self.min_segment_seconds, self.max_segment_seconds)
+        # Bounds how far reading runs ahead of recognition, and with it the audio held in memory
+        in_flight = threading.BoundedSemaphore(2 * self.max_workers)
+        futures = []
+
+        def submit(segments):
+            for start, samples in segments:
+                in_flight.acquire()
+                future = self._executor.submit(self._transcribe_segment, start, samples, sample_rate)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+
+        try:
+            for block in blocks:
+                submit(segmenter.feed(block))
+            submit(segmenter.flush())
+        except BaseException:
+            # The input failed: drop segments not started yet instead of waiting for them
+            for future in futures:
+                future.cancel()
+            raise
+        segments = [future.result() for future in futures]
+
+        duration = segments[-1]['end'] if segments else 0.0
+        failed = sum(1 for segment in segments if 'error' in segment)
+        logging.info(f"Transcribed {duration:.1f}s in {len(segments)} segments, {failed} failed")
+        return {
+            'text': ' '.join(segment['text'] for segment in segments if segment['text']),
+            'segments': segments,
+            'duration': duration,
+            'failed': failed
+        }
+
+    def transcribe_file(self, path, audio_decoder):
+        """
+        Transcribe an audio or video file, streaming it from disk
+
+        Args:
+            path (str): Path to the file
+            audio_decoder (AudioDecoder): Decoder producing the ASR service's sample rate
+
+        Returns:
+            dict: See transcribe_stream()
+        """
+        return self.transcribe_stream(audio_decoder.stream_file(path), audio_decoder.sample_rate)
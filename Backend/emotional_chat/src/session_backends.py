@@ -0,0 +1,256 @@
+"""
+Conversation session backends shared between worker processes
+
+ConversationStore keeps sessions in the memory of one process, so with
+several workers a patient's consecutive requests would see different
+histories. The SQLite and file backends keep every session outside the
+process instead: any worker can serve any request, without sticky sessions.
+All backends offer add_turn(), history(), flush() and stats().
+"""
+import os
+import json
+import zlib
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from .conversation_store import ConversationStore, session_file_stem
+
+try:
+    import fcntl
+except ImportError:  # Windows: sessions are only locked within this process
+    fcntl = None
+
+SESSION_BACKENDS = ('memory', 'sqlite', 'file')
+
+
+def encode_turn(turn):
+    """Compact JSON encoding of a turn"""
+    return json.dumps(turn, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+class SessionLocks:
+    """Per-session locks within a process, striped so memory does not grow with the number of sessions"""
+
+    def __init__(self, stripes=64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def __call__(self, session_id):
+        return self._locks[zlib.crc32(session_id.encode('utf-8')) % len(self._locks)]
+
+
+class SQLiteSessionBackend:
+    """Sessions as rows of one SQLite database, one row per turn"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, max_turns=50, timeout=10.0):
+        """
+        Initialize the backend
+
+        Args:
+            path (str or Path): Database file, shared by all workers
+            max_turns (int): Turns kept per session
+            timeout (float): Seconds to wait for another worker's write to finish
+        """
+        if max_turns < 1:
+            raise ValueError("max_turns must be greater than 0")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_turns = max_turns
+        self.timeout = timeout
+        self._locks = SessionLocks()
+        self._local = threading.local()
+        with self._connection() as conn:
+            # WAL lets workers read while another one writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS turns ('
+                'session_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL, '
+                'PRIMARY KEY (session_id, seq)) WITHOUT ROWID'
+            )
+
+    def _connection(self):
+        """Connection of the calling thread, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def add_turn(self, session_id, turn):
+        """
+        Record a turn in a session, dropping turns beyond max_turns
+
+        Args:
+            session_id (str): Patient or device identifier
+            turn (dict): JSON-serialisable turn
+        """
+        conn = self._connection()
+        with self._locks(session_id):
+            # IMMEDIATE takes the write lock up front, so two workers cannot pick the same seq
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                seq = conn.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM turns WHERE session_id = ?',
+                                   (session_id,)).fetchone()[0]
+                conn.execute('INSERT INTO turns (session_id, seq, data) VALUES (?, ?, ?)',
+                             (session_id, seq, encode_turn(turn)))
+                conn.execute('DELETE FROM turns WHERE session_id = ? AND seq <= ?',
+                             (session_id, seq - self.max_turns))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def history(self, session_id):
+        """Get a session's turns, oldest first"""
+        rows = self._connection().execute('SELECT data FROM turns WHERE session_id = ? ORDER BY seq',
+                                          (session_id,)).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def flush(self):
+        """Nothing to do, every turn is committed when it is added"""
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(DISTINCT session_id) FROM turns').fetchone()[0]
+
+    def stats(self):
+        """Get session and turn counts"""
+        conn = self._connection()
+        sessions, turns = conn.execute('SELECT COUNT(DISTINCT session_id), COUNT(*) FROM turns').fetchone()
+        return {
+            'backend': self.name,
+            'sessions': sessions,
+            'turns': turns,
+            'max_turns': self.max_turns,
+            'path': str(self.path)
+        }
+
+
+class FileSessionBackend:
+    """Sessions as JSON Lines files in a shared folder, one file per session"""
+
+    name = 'file'
+
+    def __init__(self, folder, max_turns=50):
+        """
+        Initialize the backend
+
+        Args:
+            folder (str or Path): Folder shared by all workers, e.g. on a network volume
+            max_turns (int): Turns kept per session
+        """
+        if max_turns < 1:
+            raise ValueError("max_turns must be greater than 0")
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.max_turns = max_turns
+        self._locks = SessionLocks()
+
+    def _path(self, session_id):
+        return self.folder / f"{session_file_stem(session_id)}.jsonl"
+
+    @contextmanager
+    def _locked(self, session_id, exclusive=True):
+        """Hold the session's lock, both within this process and against other workers"""
+        with self._locks(session_id):
+            if fcntl is None:
+                yield
+                return
+            # A separate lock file, so the data file can be replaced while the lock is held
+            with open(self.folder / f"{session_file_stem(session_id)}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_lines(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+    def add_turn(self, session_id, turn):
+        """
+        Record a turn in a session, dropping turns beyond max_turns
+
+        Args:
+            session_id (str): Patient or device identifier
+            turn (dict): JSON-serialisable turn
+        """
+        path = self._path(session_id)
+        line = encode_turn(turn) + '\n'
+        with self._locked(session_id):
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            # Turns are appended; the file is only rewritten once it holds twice the turns kept
+            lines = self._read_lines(path)
+            if len(lines) > 2 * self.max_turns:
+                temp_path = path.with_suffix('.tmp')
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(lines[-self.max_turns:]) + '\n')
+                os.replace(temp_path, path)
+
+    def history(self, session_id):
+        """Get a session's turns, oldest first, without creating files for an unknown session"""
+        path = self._path(session_id)
+        if not path.exists():
+            return []
+        with self._locked(session_id, exclusive=False):
+            lines = self._read_lines(path)
+        turns = []
+        for line in lines[-self.max_turns:]:
+            try:
+                turns.append(json.loads(line))
+            except ValueError:
+                logging.warning(f"Skipping unreadable turn in conversation session {session_id}")
+        return turns
+
+    def flush(self):
+        """Nothing to do, every turn is written when it is added"""
+
+    def __len__(self):
+        return sum(1 for _ in self.folder.glob('*.jsonl'))
+
+    def stats(self):
+        """Get the session count"""
+        return {
+            'backend': self.name,
+            'sessions': len(self),
+            'max_turns': self.max_turns,
+            'folder': str(self.folder)
+        }
+
+
+def create_session_backend(backend='memory', max_turns=50, max_bytes=16 * 1024 * 1024, spill_dir=None,
+                           db_path=None, folder=None):
+    """
+    Create a conversation session backend for the given name
+
+    Args:
+        backend (str): One of SESSION_BACKENDS
+        max_turns (int): Turns kept per session
+        max_bytes (int): Memory budget for all sessions (memory backend)
+        spill_dir (str or Path): Folder evicted sessions are written to (memory backend)
+        db_path (str or Path): Database file (sqlite backend)
+        folder (str or Path): Session folder (file backend)
+
+    Returns:
+        The configured backend
+    """
+    backend = (backend or 'memory').lower()
+    if backend == 'memory':
+        return ConversationStore(max_turns=max_turns, max_bytes=max_bytes, spill_dir=spill_dir)
+    if backend == 'sqlite':
+        if not db_path:
+            raise ValueError("The sqlite session backend needs a database path")
+        return SQLiteSessionBackend(db_path, max_turns=max_turns)
+    if backend == 'file':
+        if not folder:
+            raise ValueError("The file session backend needs a folder")
+        return FileSessionBackend(folder, max_turns=max_turns)
+    raise ValueError(f"Unknown session backend: {backend}. Expected one of {', '.join(SESSION_BACKENDS)}")
@@ -1,24 +1,34 @@
 """
 Speech conversion module using SpeechRecognition
 """
-import os
-import tempfile
-from pathlib import Path
 import speech_recognition as sr
 import base64
 import numpy as np
 import logging
 import pyttsx3
 from typing import Optional
-from pydub import AudioSegment
-import shutil
+from .asr import ASRService, GoogleASRBackend, ASRError, SpeechNotUnderstood, audio_data_from_samples
+from .audio_decoder import AudioDecoder
+from .segmented_transcriber import SegmentedTranscriber
 
 class SpeechConverter:
     """Class for converting speech to text using SpeechRecognition"""
 
-    def __init__(self):
-        """Initialize the speech converter"""
+    def __init__(self, asr_service=None, segmented_transcriber=None, audio_decoder=None):
+        """
+        Initialize the speech converter
+
+        Args:
+            asr_service (ASRService): Speech recognition used for transcription, Google only by default
+            segmented_transcriber (SegmentedTranscriber): Transcribes long recordings, built on
+                                                          asr_service when first needed by default
+            audio_decoder (AudioDecoder): Decodes uploads to the ASR sample rate, built when first
+                                          needed by default
+        """
         self.recognizer = sr.Recognizer()
+        self.asr_service = asr_service or ASRService([GoogleASRBackend()])
+        self._audio_decoder = audio_decoder
+        self._segmented_transcriber = segmented_transcriber
 
         # Adjust recognition settings
         self.recognizer.energy_threshold = 4000
@@ -42,11 +52,26 @@ class SpeechConverter:
         except Exception as e:
             logging.error(f"Error during microphone initialization: {e}")
 
+    @property
+    def audio_decoder(self):
+        if self._audio_decoder is None:
+            self._audio_decoder = AudioDecoder(sample_rate=self.asr_service.sample_rate)
+        return self._audio_decoder
+
+    @property
+    def segmented_transcriber(self):
+        if self._segmented_transcriber is None:
+            self._segmented_transcriber = SegmentedTranscriber(self.asr_service)
+        return self._segmented_transcriber
+
     def process_video(self, video_path):
-        # This is a test comment
         """
         Extract audio from video and convert speech to text
 
+        The audio is streamed from the file and transcribed in segments, so
+        long recordings neither exceed the recognizer's request limit nor get
+        loaded into memory whole.
+
         Args:
             video_path (str): Path to the video file
 
@@ -55,76 +80,23 @@ class SpeechConverter:
         """
         logging.info(f"process_video called with video_path: {video_path}")
         try:
-            # Create temp directory for audio extraction
-            temp_dir = Path(tempfile.mkdtemp())
-            audio_path = temp_dir / 'temp_audio.wav'
-            logging.info(f"Created temp directory: {temp_dir}")
-            logging.info(f"Audio path: {audio_path}")
-
-            try:
-                # Extract audio using pydub
-                logging.info("Extracting audio from video using pydub...")
-                video = AudioSegment.from_file(video_path)
-                video.export(str(audio_path), format='wav')
-                logging.info("Audio extraction complete.")
-
-                import os
-                import shutil
-                from pathlib import Path
-
-                # Create test directory outside the temp directory
-                base_dir = Path(__file__).resolve().parent  # Get the directory of the current file
-                test_dir = base_dir / "test"
-                if not os.path.exists(test_dir):
-                    os.makedirs(test_dir)
-                test_audio_path = test_dir / "temp_audio.wav"
-                shutil.copy(audio_path, test_audio_path)
-                logging.info(f"Copied audio file to test directory: {test_audio_path}")
-
-                # Convert audio to text
-                logging.info("Converting audio to text using SpeechRecognition...")
-                with sr.AudioFile(str(audio_path)) as source:
-                    # Adjust for ambient noise in the audio file
-                    logging.info("Adjusting for ambient noise...")
-                    self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                    
-                    # Record the entire file
-                    logging.info("Recording audio...")
-                    audio = self.recognizer.record(source)
-                    
-                    # Use Google's speech recognition
-                    logging.info("Using Google's speech recognition...")
-                    try:
-                        text = self.recognizer.recognize_google(audio)
-                        logging.info(f"Transcription successful: {text}")
-                        return text
-                    except sr.UnknownValueError:
-                        logging.warning("Google Speech Recognition could not understand audio")
-                        return ""
-                    except sr.RequestError as e:
-                        logging.error(f"Could not request results from Google Speech Recognition service: {e}")
-                        return ""
-
-            except Exception as e:
-                logging.error(f"Error during audio processing: {e}", exc_info=True)
-                return ""
-
-            finally:
-                # Cleanup temp files
-                try:
-                    logging.info("Cleaning up temporary files...")
-                    # if audio_path.exists():
-                    #     audio_path.unlink()
-                    #     logging.info(f"Deleted audio file: {audio_path}")
-                    # temp_dir.rmdir()
-                    # logging.info(f"Removed temp directory: {temp_dir}")
-                except Exception as e:
-                    logging.warning(f"Error during temporary file cleanup: {e}")
-
+            return self.transcribe_long_audio(video_path)['text']
         except Exception as e:
             logging.exception(f"Error processing video audio:")
             return ""
 
+    def transcribe_long_audio(self, path):
+        """
+        Transcribe a long recording in concurrently recognised segments
+
+        Args:
+            path (str): Path to an audio or video file
+
+        Returns:
+            dict: Stitched text and the segments with their start and end times
+        """
+        return self.segmented_transcriber.transcribe_file(str(path), self.audio_decoder)
+
     def process_audio_data(self, audio_data):
         """
         Process base64 encoded audio data
@@ -136,48 +108,19 @@ class SpeechConverter:
             dict: Dictionary containing success status and transcribed text
         """
         logging.info("process_audio_data called")
-        temp_dir = None
-        audio_path = None
         try:
-            # Create temp directory
-            temp_dir = Path(tempfile.mkdtemp())
-            audio_path = temp_dir / 'temp_audio.wav'
-            logging.info(f"Created temp directory: {temp_dir}")
-            logging.info(f"Audio path: {audio_path}")
-
-            try:
-                # Decode and save audio data
-                logging.info("Decoding base64 audio data...")
-                audio_bytes = base64.b64decode(audio_data.split(',')[1] if ',' in audio_data else audio_data)
-                with open(audio_path, 'wb') as f:
-                    f.write(audio_bytes)
-                logging.info("Audio data saved to file.")
-
-                # Convert to text
-                logging.info("Converting audio to text using SpeechRecognition...")
-                with sr.AudioFile(str(audio_path)) as source:
-                    # Adjust for ambient noise
-                    logging.info("Adjusting for ambient noise...")
-                    self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                    # Record the entire file
-                    logging.info("Recording audio...")
-                    audio = self.recognizer.record(source)
-                    # Use Google's speech recognition
-                    logging.info("Using Google's speech recognition...")
-                    text = self.recognizer.recognize_google(audio)
-                    logging.info(f"Transcription: {text}")
-
-                return {
-                    'success': True,
-                    'text': text
-                }
-
-            except Exception as e:
-                logging.error(f"Error during audio processing: {e}")
-                return {
-                    'success': False,
-                    'error': str(e)
-                }
+            # Decode base64 audio data
+            logging.info("Decoding base64 audio data...")
+            audio_bytes = base64.b64decode(audio_data.split(',')[1] if ',' in audio_data else audio_data)
+
+            # Use the configured speech recognition backends
+            logging.info("Using speech recognition service...")
+            text = self.asr_service.transcribe(self._audio_from_bytes(audio_bytes))['text']
+            logging.info(f"Transcription: {text}")
+            return {
+                'success': True,
+                'text': text
+            }
 
         except Exception as e:
             logging.error(f"Error processing audio data: {str(e)}")
@@ -186,18 +129,10 @@ class SpeechConverter:
                 'error': str(e)
             }
 
-        finally:
-            # Cleanup temp files
-            try:
-                logging.info("Cleaning up temporary files...")
-                # if audio_path and audio_path.exists():
-                #     os.remove(str(audio_path))
-                #     logging.info(f"Deleted audio file: {audio_path}")
-                # if temp_dir and temp_dir.exists():
-                #     temp_dir.rmdir()
-                #     logging.info(f"Removed temp directory: {temp_dir}")
-            except Exception as e:
-                logging.warning(f"Error during temporary file cleanup: {e}")
+    def _audio_from_bytes(self, audio_bytes):
+        """Decode an audio upload in memory into recognizer audio, without a temporary file"""
+        samples, sample_rate = self.audio_decoder.decode(audio_bytes)
+        return audio_data_from_samples(samples, sample_rate)
 
     def listen_and_convert(self) -> Optional[str]:
         """Listen for speech and convert to text
@@ -212,14 +147,14 @@ class SpeechConverter:
                 audio = self.recognizer.listen(source)
 
             logging.info("Processing speech...")
-            text = self.recognizer.recognize_google(audio)
+            text = self.asr_service.transcribe(audio)['text']
             logging.info(f"Transcribed: {text}")
             return text
 
-        except sr.UnknownValueError:
+        except SpeechNotUnderstood:
             logging.warning("Could not understand audio")
             return None
-        except sr.RequestError as e:
+        except ASRError as e:
             logging.error(f"Could not request results; {e}")
             return None
         except Exception as e:
@@ -250,63 +185,12 @@ class SpeechConverter:
         """
         logging.info("process_audio_data_bytes called")
         try:
-            # Create temp file for audio data
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_file.write(audio_data)
-                temp_path = temp_file.name
-            logging.info(f"Created temp file: {temp_path}")
-
-            # Convert to text
-            with sr.AudioFile(temp_path) as source:
-                # Adjust for ambient noise
-                logging.info("Adjusting for ambient noise...")
-                self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                # Record the entire file
-                logging.info("Recording audio...")
-                audio = self.recognizer.record(source)
-                # Use Google's speech recognition
-                logging.info("Using Google's speech recognition...")
-                text = self.recognizer.recognize_google(audio)
-                logging.info(f"Transcription: {text}")
-                return text
+            # Use the configured speech recognition backends
+            logging.info("Using speech recognition service...")
+            text = self.asr_service.transcribe(self._audio_from_bytes(audio_data))['text']
+            logging.info(f"Transcription: {text}")
+            return text
 
         except Exception as e:
             logging.error(f"Error processing audio data: {e}")
             return None
-
-        finally:
-            # Cleanup temp file
-            try:
-                logging.info("Cleaning up temporary file...")
-                # os.unlink(temp_path)
-                # logging.info(f"Deleted temp file: {temp_path}")
-            except Exception as e:
-                logging.warning(f"Error during temporary file cleanup: {e}")
-
-def main():
-    """Test the speech converter"""
-    converter = SpeechConverter()
-
-    try:
-        while True:
-            # Get text input for text-to-speech conversion
-            text_input = input("\nEnter text to convert to speech (or 'q' to quit): ")
-            if text_input.lower() == 'q':
-                break
-            converter.speak(text_input)
-
-            # Get speech input
-            text = converter.listen_and_convert()
-            if text:
-                print(f"\nYou said: {text}")
-
-                # Convert back to speech
-                converter.speak(f"You said: {text}")
-
-    except KeyboardInterrupt:
-        print("\nStopping speech converter...")
-    except Exception as e:
-        print(f"\nError: {e}")
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
@@ -2,92 +2,139 @@
 Video processing utilities for the Emotional Chat System
 """
 import os
+import tempfile
 import subprocess
 import logging
 from pathlib import Path
+import cv2
+import numpy as np
+
+try:
+    import av
+except ImportError:
+    av = None
 
 # FFmpeg path
 FFMPEG_PATH = "ffmpeg"  # Rely on system PATH
+DEFAULT_FPS = 30.0  # Used when the container does not report a usable frame rate
 
-def split_video(video_path):
+def extract_audio(video_path, decoder):
     """
-    Split video into separate video and audio streams using FFmpeg
-    Returns paths to video and audio files
+    Extract a video's audio track as mono 16-bit samples
+
+    Decoding goes through the shared AudioDecoder, so no ffmpeg process is
+    started for the request, nothing is written to disk, and the audio comes
+    out at the decoder's sample rate, which the app sets to the format the
+    ASR backends want.
+
+    Args:
+        video_path (str): Path to the video file
+        decoder (AudioDecoder): Decoder used for the audio track
+
+    Returns:
+        tuple: (numpy.ndarray of int16 samples, sample rate), or None if extraction failed
     """
-    video_stream = None
-    audio_stream = None
     try:
-        # Verify input file exists
-        if not os.path.exists(video_path):
-            raise FileNotFoundError(f"Input video file not found: {video_path}")
-
-        # Check if video has audio stream
-        probe_result = subprocess.run([
-            FFMPEG_PATH,
-            '-i', video_path
-        ], capture_output=True, text=True)
-        logging.info(f"FFmpeg probe output: {probe_result.stderr}")
-        
-        # Create output paths
-        video_stream = str(Path(video_path).with_suffix('.video.mp4'))
-        audio_stream = str(Path(video_path).with_suffix('.audio.wav'))
-        
-        logging.info(f"Processing video: {video_path}")
-        logging.info(f"Video output: {video_stream}")
-        logging.info(f"Audio output: {audio_stream}")
-
-        # Extract audio as WAV
-        logging.info("Running ffmpeg to extract audio stream...")
-        result = subprocess.run([
-            FFMPEG_PATH,
-            '-i', video_path,
-            '-vn',  # No video
-            '-acodec', 'pcm_s16le',  # PCM format
-            '-ar', '44100',  # Sample rate
-            '-ac', '2',  # Stereo
-            '-y',  # Overwrite output files
-            audio_stream
-        ], capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            logging.error(f"FFmpeg audio extraction failed: {result.stderr}")
-            return None, None
-            
-        logging.info(f"FFmpeg audio extraction output: {result.stderr}")
-        logging.info("ffmpeg audio stream extraction completed")
-
-        # Extract video without audio
-        logging.info("Running ffmpeg to extract video stream...")
-        result = subprocess.run([
-            FFMPEG_PATH,
-            '-i', video_path,
-            '-c:v', 'libx264',  # Use H.264 codec
-            '-preset', 'ultrafast',
-            '-y',  # Overwrite output files
-            video_stream
-        ], capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            logging.error(f"FFmpeg video extraction failed: {result.stderr}")
-            return None, None
-            
-        logging.info(f"FFmpeg video extraction output: {result.stderr}")
-        logging.info("ffmpeg video stream extraction completed")
-
-        # Verify output files were created and have content
-        if not os.path.exists(audio_stream) or os.path.getsize(audio_stream) == 0:
-            logging.error("Audio extraction failed or file is empty")
-            return None, None
-
-        if not os.path.exists(video_stream) or os.path.getsize(video_stream) == 0:
-            logging.error("Video extraction failed or file is empty")
-            return None, None
-
-        return video_stream, audio_stream
+        samples, sample_rate = decoder.decode_file(video_path)
+        if len(samples) == 0:
+            logging.error("Video has no audio samples")
+            return None
+        logging.info(f"Extracted {len(samples) / sample_rate:.2f}s of {sample_rate} Hz mono audio "
+                     f"({2 * len(samples)} bytes)")
+        return samples, sample_rate
 
     except Exception as e:
-        logging.error(f"Error in split_video: {str(e)}")
-        return None, None
+        logging.error(f"Error in extract_audio: {str(e)}")
+        return None
+
+def read_gray_frames(video_path, frame_skip=1):
+    """
+    Decode a video to 8-bit grayscale frames
+
+    Frames are decoded in-process with PyAV when it is installed, otherwise by
+    an FFmpeg process that drops the skipped frames and chroma planes itself.
+    Either way only one byte per pixel of the frames we analyse reaches
+    Python. A decode that fails part way raises instead of ending early, so a
+    broken upload is not mistaken for a short, neutral one.
+
+    Args:
+        video_path (str): Path to the video file
+        frame_skip (int): Yield every Nth frame
+
+    Yields:
+        tuple: (timestamp in seconds, numpy.ndarray of shape (height, width))
+
+    Raises:
+        FileNotFoundError: Neither PyAV nor FFmpeg is available
+    """
+    if av is not None:
+        yield from _read_gray_frames_pyav(video_path, frame_skip)
+    else:
+        yield from _read_gray_frames_ffmpeg(video_path, frame_skip)
+
+def _read_gray_frames_pyav(video_path, frame_skip):
+    with av.open(video_path) as container:
+        if not container.streams.video:
+            raise Exception("No video stream found")
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        fps = float(stream.average_rate or 0)
+        if not fps or fps > 240:
+            fps = DEFAULT_FPS
+        for index, frame in enumerate(container.decode(stream)):
+            if index % frame_skip == 0:
+                timestamp = frame.time if frame.time is not None else index / fps
+                yield timestamp, frame.to_ndarray(format='gray')
+
+def _read_gray_frames_ffmpeg(video_path, frame_skip):
+    # Probe the stream geometry without decoding any frames
+    cap = cv2.VideoCapture(video_path)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    if not width or not height:
+        raise Exception("Failed to open video file")
+    if not fps or fps > 240:
+        fps = DEFAULT_FPS
+
+    command = [
+        FFMPEG_PATH,
+        '-v', 'error',
+        '-i', video_path,
+        '-an',  # No audio
+        '-vf', f'select=not(mod(n\\,{frame_skip})),scale={width}:{height}',
+        '-vsync', 'passthrough',  # One output frame per selected frame
+        '-pix_fmt', 'gray',
+        '-f', 'rawvideo',
+        'pipe:1'
+    ]
+    # stderr goes to a file rather than a pipe, so a chatty FFmpeg can never block on it
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        frame_size = width * height
+        index = 0
+        finished = False
+        try:
+            while True:
+                data = process.stdout.read(frame_size)
+                if len(data) < frame_size:
+                    break
+                yield index * frame_skip / fps, np.frombuffer(data, np.uint8).reshape(height, width)
+                index += 1
+            finished = True
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        # Only report exits FFmpeg chose, not the kill when the caller stopped reading early
+        if finished and process.returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode(errors='replace').strip()
+            logging.error(f"FFmpeg grayscale decode failed with code {process.returncode} "
+                          f"after {index} frames: {message}")
+            raise Exception(f"FFmpeg failed to decode {video_path}: {message}")
 
 def cleanup_temp_files(*files):
     """Remove temporary processing files"""
@@ -0,0 +1,91 @@
+"""
+Voice activity detection on decoded PCM audio
+
+Frames are classified with numpy using short-time energy relative to the
+clip's own noise floor, and zero-crossing rate to tell voiced speech from
+broadband hiss. Clips without speech can be answered immediately instead of
+waiting on a cloud speech recognition round-trip, and clips with speech are
+trimmed to the part that contains it.
+"""
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """Energy and zero-crossing rate voice activity detector"""
+
+    def __init__(self, frame_ms=20, energy_ratio=3.0, min_rms=200.0, max_threshold_rms=2000.0,
+                 max_zcr=0.35, min_speech_ms=120, padding_ms=250):
+        """
+        Initialize the detector
+
+        Args:
+            frame_ms (int): Analysis frame length in milliseconds
+            energy_ratio (float): How far above the noise floor a frame's RMS must be to count as speech
+            min_rms (float): Absolute RMS below which a frame is never speech, on the int16 scale
+            max_threshold_rms (float): Cap on the adaptive threshold, so clips that are speech
+                                       from start to end are still detected
+            max_zcr (float): Highest zero-crossing rate (crossings per sample) of a voiced frame
+            min_speech_ms (int): Minimum total voiced duration for a clip to contain speech
+            padding_ms (int): Audio kept either side of the voiced span, so unvoiced
+                              consonants at the edges are not cut off
+        """
+        self.frame_ms = frame_ms
+        self.energy_ratio = energy_ratio
+        self.min_rms = min_rms
+        self.max_threshold_rms = max_threshold_rms
+        self.max_zcr = max_zcr
+        self.min_speech_ms = min_speech_ms
+        self.padding_ms = padding_ms
+
+    def _frames(self, samples, sample_rate):
+        """Split samples into non-overlapping frames, dropping the incomplete tail"""
+        frame_len = max(1, int(sample_rate * self.frame_ms / 1000))
+        n_frames = len(samples) // frame_len
+        return samples[:n_frames * frame_len].reshape(n_frames, frame_len).astype(np.float32), frame_len
+
+    def voiced_frames(self, samples, sample_rate):
+        """
+        Classify each frame as voiced or not
+
+        Args:
+            samples (numpy.ndarray): Mono int16 samples
+            sample_rate (int): Sample rate in Hz
+
+        Returns:
+            tuple: (boolean numpy.ndarray per frame, frame length in samples)
+        """
+        frames, frame_len = self._frames(samples, sample_rate)
+        if len(frames) == 0:
+            return np.zeros(0, dtype=bool), frame_len
+
+        frames -= frames.mean(axis=1, keepdims=True)
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_len
+
+        # The quietest tenth of the clip approximates the background noise level
+        noise_floor = np.percentile(rms, 10)
+        threshold = max(self.min_rms, min(noise_floor * self.energy_ratio, self.max_threshold_rms))
+        return (rms > threshold) & (zcr < self.max_zcr), frame_len
+
+    def speech_span(self, samples, sample_rate):
+        """
+        Find the part of a clip that contains speech
+
+        Args:
+            samples (numpy.ndarray): Mono int16 samples
+            sample_rate (int): Sample rate in Hz
+
+        Returns:
+            tuple: (start, end) sample indices of the padded speech span, or None if there is no speech
+        """
+        voiced, frame_len = self.voiced_frames(samples, sample_rate)
+        voiced_ms = np.count_nonzero(voiced) * self.frame_ms
+        if voiced_ms < self.min_speech_ms:
+            return None
+
+        indices = np.flatnonzero(voiced)
+        padding = int(sample_rate * self.padding_ms / 1000)
+        start = max(0, indices[0] * frame_len - padding)
+        end = min(len(samples), (indices[-1] + 1) * frame_len + padding)
+        return int(start), int(end)
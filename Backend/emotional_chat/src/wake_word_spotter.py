@@ -0,0 +1,264 @@
+"""
+Local keyword spotting for the wake word
+
+Audio is turned into MFCC features with numpy and matched against enrolled
+recordings of the wake word using subsequence dynamic time warping. A chunk
+scores in a few milliseconds; only scores close to the threshold need to be
+confirmed by cloud speech recognition.
+
+Enrol a keyword by recording a few short WAV clips of it into the templates
+folder, named ``<keyword>_<n>.wav`` (e.g. ``eva_1.wav``). To tune thresholds,
+score a clip against the templates:
+
+    python -m src.wake_word_spotter wake_words/ clip.wav
+"""
+import sys
+import time
+import wave
+import logging
+from pathlib import Path
+import numpy as np
+
+ACCEPT = 'accept'
+ESCALATE = 'escalate'
+REJECT = 'reject'
+
+
+def read_wav(source):
+    """
+    Read 16-bit PCM WAV data into mono int16 samples
+
+    Args:
+        source (str, Path or file-like): WAV file path or open binary stream
+
+    Returns:
+        tuple: (numpy.ndarray of int16 samples, sample rate)
+    """
+    with wave.open(source if not isinstance(source, Path) else str(source), 'rb') as wav_file:
+        if wav_file.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM WAV audio is supported")
+        channels = wav_file.getnchannels()
+        sample_rate = wav_file.getframerate()
+        samples = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype='<i2')
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, sample_rate
+
+
+class FeatureExtractor:
+    """MFCC features computed with numpy, with filterbanks cached per sample rate"""
+
+    def __init__(self, n_mels=40, n_mfcc=13, frame_ms=25, hop_ms=10, fmin=60.0, fmax=7600.0):
+        self.n_mels = n_mels
+        self.n_mfcc = n_mfcc
+        self.frame_ms = frame_ms
+        self.hop_ms = hop_ms
+        self.fmin = fmin
+        self.fmax = fmax
+        self._filterbanks = {}
+        # DCT-II basis turning log-mel energies into cepstral coefficients
+        k = np.arange(n_mfcc)[:, None]
+        n = np.arange(n_mels)[None, :]
+        self._dct = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels))
+
+    def _filterbank(self, sample_rate, n_fft):
+        """Triangular mel filterbank for the given sample rate and FFT size"""
+        key = (sample_rate, n_fft)
+        if key not in self._filterbanks:
+            fmax = min(self.fmax, sample_rate / 2)
+            mel_points = np.linspace(self._hz_to_mel(self.fmin), self._hz_to_mel(fmax), self.n_mels + 2)
+            bins = np.floor((n_fft + 1) * self._mel_to_hz(mel_points) / sample_rate).astype(int)
+            filterbank = np.zeros((self.n_mels, n_fft // 2 + 1))
+            for m in range(1, self.n_mels + 1):
+                left, center, right = bins[m - 1], bins[m], bins[m + 1]
+                if center > left:
+                    filterbank[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+                if right > center:
+                    filterbank[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+            self._filterbanks[key] = filterbank
+        return self._filterbanks[key]
+
+    @staticmethod
+    def _hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    @staticmethod
+    def _mel_to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    def extract(self, samples, sample_rate):
+        """
+        Compute per-frame MFCC features
+
+        Args:
+            samples (numpy.ndarray): Mono audio samples
+            sample_rate (int): Sample rate in Hz
+
+        Returns:
+            numpy.ndarray: (frames, n_mfcc) features, mean-normalised and unit length per frame
+        """
+        signal = samples.astype(np.float32)
+        frame_len = int(sample_rate * self.frame_ms / 1000)
+        hop = int(sample_rate * self.hop_ms / 1000)
+        if len(signal) < frame_len:
+            return np.zeros((0, self.n_mfcc), dtype=np.float32)
+
+        # Pre-emphasis boosts the high frequencies that carry consonants
+        signal = np.append(signal[0], signal[1:] - 0.97 * signal[:-1])
+        n_frames = 1 + (len(signal) - frame_len) // hop
+        frames = np.lib.stride_tricks.as_strided(
+            signal,
+            shape=(n_frames, frame_len),
+            strides=(signal.strides[0] * hop, signal.strides[0])
+        ) * np.hamming(frame_len)
+
+        n_fft = 1 << (frame_len - 1).bit_length()
+        power = np.abs(np.fft.rfft(frames, n_fft)) ** 2 / n_fft
+        mel_energies = np.log(power @ self._filterbank(sample_rate, n_fft).T + 1e-10)
+        mfcc = mel_energies @ self._dct.T
+
+        # Cepstral mean normalisation removes microphone and room colouring
+        mfcc -= mfcc.mean(axis=0)
+        norms = np.linalg.norm(mfcc, axis=1, keepdims=True)
+        return (mfcc / np.maximum(norms, 1e-8)).astype(np.float32)
+
+
+def subsequence_dtw(template, features):
+    """
+    Best alignment cost of a template anywhere inside a longer feature sequence
+
+    Each step consumes one template frame and advances the input by 0, 1 or 2
+    frames. An Itakura-style slope constraint forbids two consecutive steps
+    that stay on the same input frame, so the input matched is between half
+    and double the template's length, i.e. speaking rates from half to double
+    the template's. Every row is still computed with vectorised operations.
+
+    Args:
+        template (numpy.ndarray): (m, d) unit-length template features
+        features (numpy.ndarray): (n, d) unit-length input features
+
+    Returns:
+        float: Mean cosine distance along the best path (0 is identical, 2 is opposite),
+               inf if the input is too short for any allowed path
+    """
+    if len(template) == 0 or len(features) == 0:
+        return float('inf')
+    cost = 1.0 - template @ features.T
+    # Best cost of paths whose last step advanced the input, and of those whose last step stayed
+    moved = cost[0].copy()
+    stayed = np.full_like(moved, np.inf)
+    for i in range(1, len(template)):
+        best = np.minimum(moved, stayed)
+        step = np.concatenate(([np.inf], best[:-1]))
+        skip = np.concatenate(([np.inf, np.inf], best[:-2]))
+        stayed = cost[i] + moved
+        moved = cost[i] + np.minimum(step, skip)
+    return float(np.minimum(moved, stayed).min() / len(template))
+
+
+class WakeWordSpotter:
+    """Scores audio against enrolled wake word templates"""
+
+    def __init__(self, accept_score=0.85, reject_score=0.7, feature_extractor=None):
+        """
+        Initialize the spotter
+
+        Args:
+            accept_score (float): Scores at or above this are accepted locally
+            reject_score (float): Scores below this are rejected locally, scores in between
+                                  are escalated to cloud speech recognition
+            feature_extractor (FeatureExtractor): Feature pipeline, defaults to 13 MFCCs
+        """
+        if reject_score > accept_score:
+            raise ValueError("reject_score must not be greater than accept_score")
+        self.accept_score = accept_score
+        self.reject_score = reject_score
+        self.features = feature_extractor or FeatureExtractor()
+        self.templates = []
+
+    @classmethod
+    def from_directory(cls, directory, **kwargs):
+        """Create a spotter with every ``<keyword>_<n>.wav`` template found in a folder"""
+        spotter = cls(**kwargs)
+        directory = Path(directory)
+        if directory.is_dir():
+            for path in sorted(directory.glob('*.wav')):
+                try:
+                    samples, sample_rate = read_wav(path)
+                    spotter.enroll(samples, sample_rate, path.stem.split('_')[0].lower())
+                except Exception as e:
+                    logging.warning(f"Skipping wake word template {path}: {e}")
+        logging.info(f"Loaded {len(spotter.templates)} wake word templates from {directory}")
+        return spotter
+
+    def enroll(self, samples, sample_rate, keyword):
+        """
+        Add a recording of a keyword as a template
+
+        Args:
+            samples (numpy.ndarray): Mono audio of the keyword alone
+            sample_rate (int): Sample rate in Hz
+            keyword (str): Keyword the recording contains
+        """
+        features = self.features.extract(samples, sample_rate)
+        if len(features) == 0:
+            raise ValueError("Template recording is too short")
+        self.templates.append((keyword, features))
+
+    @property
+    def enrolled(self):
+        """Whether any templates are available"""
+        return bool(self.templates)
+
+    def spot(self, samples, sample_rate):
+        """
+        Score audio against all templates
+
+        Args:
+            samples (numpy.ndarray): Mono audio samples
+            sample_rate (int): Sample rate in Hz
+
+        Returns:
+            dict: decision (accept, escalate or reject), best score in [0, 1], matching
+                  keyword and elapsed_ms. Without templates the decision is always escalate.
+        """
+        start = time.perf_counter()
+        if not self.templates:
+            return {'decision': ESCALATE, 'score': None, 'keyword': None, 'elapsed_ms': 0.0}
+
+        features = self.features.extract(samples, sample_rate)
+        best_score, best_keyword = 0.0, None
+        for keyword, template in self.templates:
+            score = max(0.0, 1.0 - subsequence_dtw(template, features))
+            if score > best_score:
+                best_score, best_keyword = score, keyword
+
+        if best_score >= self.accept_score:
+            decision = ACCEPT
+        elif best_score >= self.reject_score:
+            decision = ESCALATE
+        else:
+            decision = REJECT
+
+        return {
+            'decision': decision,
+            'score': best_score,
+            'keyword': best_keyword,
+            'elapsed_ms': (time.perf_counter() - start) * 1000
+        }
+
+
+def main():
+    """Score WAV clips against a templates folder"""
+    if len(sys.argv) < 3:
+        print("Usage: python -m src.wake_word_spotter TEMPLATES_DIR CLIP.wav [CLIP.wav ...]")
+        return
+    spotter = WakeWordSpotter.from_directory(sys.argv[1])
+    for clip in sys.argv[2:]:
+        samples, sample_rate = read_wav(clip)
+        result = spotter.spot(samples, sample_rate)
+        print(f"{clip}: {result['decision']} score={result['score']} "
+              f"keyword={result['keyword']} ({result['elapsed_ms']:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Streaming wake word detection over a continuous PCM stream
+
+A tablet pushes raw 16-bit mono PCM over one connection instead of posting
+overlapping one-second clips. The server keeps the most recent audio in a
+ring buffer and evaluates an analysis window every hop, so consecutive
+windows overlap without the audio ever being uploaded twice. Windows are
+scored on a WakeWordWorker thread, so the connection keeps receiving audio
+while a slow recognizer runs, and hops that arrive meanwhile are skipped.
+"""
+import queue
+import logging
+import threading
+import numpy as np
+
+# Sample rates a client may stream at
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+
+def validate_sample_rate(sample_rate):
+    """Raise ValueError unless a client-supplied sample rate is between MIN_SAMPLE_RATE and MAX_SAMPLE_RATE"""
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise ValueError(f"sample_rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE}")
+
+
+class PCMRingBuffer:
+    """Fixed-size buffer holding the most recent int16 samples"""
+
+    def __init__(self, capacity):
+        """
+        Initialize the buffer
+
+        Args:
+            capacity (int): Number of samples kept
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be greater than 0")
+        self.capacity = capacity
+        self._buffer = np.zeros(capacity, dtype=np.int16)
+        self._end = 0
+        self.total_written = 0
+
+    def write(self, samples):
+        """Append samples, overwriting the oldest ones when full"""
+        self.total_written += len(samples)
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        first = min(n, self.capacity - self._end)
+        self._buffer[self._end:self._end + first] = samples[:first]
+        self._buffer[:n - first] = samples[first:]
+        self._end = (self._end + n) % self.capacity
+
+    def __len__(self):
+        return min(self.total_written, self.capacity)
+
+    def latest(self, n):
+        """
+        Get the most recent samples in order
+
+        Args:
+            n (int): Number of samples, at most the number currently held
+
+        Returns:
+            numpy.ndarray: Copy of the last n samples
+        """
+        n = min(n, len(self))
+        start = self._end - n
+        if start >= 0:
+            return self._buffer[start:self._end].copy()
+        return np.concatenate((self._buffer[start:], self._buffer[:self._end]))
+
+
+class WakeWordStream:
+    """Per-connection wake word state: ring buffer plus analysis window scheduling"""
+
+    def __init__(self, audio_processor, sample_rate=16000, window_seconds=1.5, hop_seconds=0.5):
+        """
+        Initialize the stream
+
+        Args:
+            audio_processor (AudioProcessor): Processor whose detect_wake_word() scores each window
+            sample_rate (int): Sample rate of the incoming PCM
+            window_seconds (float): Length of each analysis window
+            hop_seconds (float): New audio required before the next window is analysed
+        """
+        if hop_seconds <= 0 or window_seconds < hop_seconds:
+            raise ValueError("Need 0 < hop_seconds <= window_seconds")
+        self.audio_processor = audio_processor
+        self.sample_rate = sample_rate
+        self.window = int(window_seconds * sample_rate)
+        self.hop = int(hop_seconds * sample_rate)
+        self.buffer = PCMRingBuffer(self.window)
+        self._pending = b''
+        self._analysed_at = 0
+        self._suppress_until = 0
+        self.windows_analysed = 0
+
+    def feed(self, pcm_bytes):
+        """
+        Add PCM audio and analyse the latest window if a hop's worth of new audio arrived
+
+        Args:
+            pcm_bytes (bytes): Little-endian 16-bit mono PCM, may split samples across calls
+
+        Returns:
+            list: Wake events detected, each a dict with the detection result and stream_time
+        """
+        due = self.add(pcm_bytes)
+        return self.analyse(*due) if due else []
+
+    def add(self, pcm_bytes):
+        """
+        Add PCM audio without analysing it
+
+        Args:
+            pcm_bytes (bytes): Little-endian 16-bit mono PCM, may split samples across calls
+
+        Returns:
+            tuple: (latest window, samples received so far) when a hop's worth of new audio arrived, else None
+        """
+        data = self._pending + pcm_bytes
+        usable = len(data) - len(data) % 2
+        self._pending = data[usable:]
+        if usable:
+            self.buffer.write(np.frombuffer(data[:usable], dtype='<i2'))
+
+        total = self.buffer.total_written
+        if total < self.window or total - self._analysed_at < self.hop:
+            return None
+
+        # Only the latest window is scored, so a backlog skips stale hops instead of queueing them
+        self._analysed_at = total
+        return self.buffer.latest(self.window), total
+
+    def analyse(self, window, total):
+        """
+        Score a window returned by add()
+
+        Returns:
+            list: Wake events detected, see feed()
+        """
+        if total < self._suppress_until:
+            return []
+        self.windows_analysed += 1
+        result = self.audio_processor.detect_wake_word(window, self.sample_rate)
+        if not result.get('wake_word_detected'):
+            if not result.get('success'):
+                logging.warning(f"Wake word stream analysis failed: {result.get('error')}")
+            return []
+
+        # Windows still containing this utterance must not fire again
+        self._suppress_until = total + self.window
+        event = {key: value for key, value in result.items() if key != 'success'}
+        event['stream_time'] = total / self.sample_rate
+        return [event]
+
+
+class WakeWordWorker:
+    """Scores a stream's windows on a background thread, keeping only the newest window waiting"""
+
+    def __init__(self, stream, on_event):
+        """
+        Initialize the worker and start its thread
+
+        Args:
+            stream (WakeWordStream): Stream whose windows are scored
+            on_event (callable): Called from the worker thread with each wake event
+        """
+        self.stream = stream
+        self.on_event = on_event
+        # One slot: a window waiting while another is scored is replaced by a newer one
+        self._queue = queue.Queue(maxsize=1)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name='wake-word-stream', daemon=True)
+        self._thread.start()
+
+    def feed(self, pcm_bytes):
+        """Add PCM audio, queueing the latest window for analysis if a hop is due, see WakeWordStream.add()"""
+        due = self.stream.add(pcm_bytes)
+        if due is None:
+            return
+        while True:
+            try:
+                self._queue.put_nowait(due)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while True:
+            due = self._queue.get()
+            if due is None:
+                return
+            try:
+                for event in self.stream.analyse(*due):
+                    self.on_event(event)
+            except Exception:
+                logging.exception("Wake word stream analysis failed")
+
+    def close(self, timeout=None):
+        """Stop the worker after the window being scored, discarding any waiting one"""
+        try:
+            self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._queue.put(None)
+        self._thread.join(timeout)
@@ -0,0 +1,51 @@
+import unittest
+import os
+import sys
+from unittest import mock
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import app as app_module
+
+class RecordingStream:
+    """Stands in for stream_chat_completion, recording the messages of every request"""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, client, messages, **kwargs):
+        self.requests.append(messages)
+        yield "That sounds like a lovely afternoon."
+
+class TestConversationSessions(unittest.TestCase):
+    ADDRESS = {'REMOTE_ADDR': '10.1.2.3'}
+
+    def chat(self, message, **data):
+        response = self.client.post('/api/chat/stream', json=dict(data, message=message),
+                                    environ_base=self.ADDRESS)
+        self.assertEqual(response.status_code, 200)
+        response.get_data()
+
+    def setUp(self):
+        self.client = app_module.app.test_client()
+        self.stream = RecordingStream()
+        patcher = mock.patch('src.emotional_speech_agent.stream_chat_completion', self.stream)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requests_without_ids_do_not_share_a_history(self):
+        self.chat("My daughter Anne visited me today")
+        self.chat("Who visited me today?")
+        second = ' '.join(message['content'] for message in self.stream.requests[1])
+        self.assertNotIn("Anne", second)
+        self.assertEqual(app_module.speech_agent.conversations.history('10.1.2.3'), [])
+
+    def test_requests_with_a_client_id_keep_their_history(self):
+        self.chat("My son Tom is a carpenter", client_id='tablet-sessions-test')
+        self.chat("What does Tom do?", client_id='tablet-sessions-test')
+        second = ' '.join(message['content'] for message in self.stream.requests[1])
+        self.assertIn("My son Tom is a carpenter", second)
+
+if __name__ == '__main__':
+    unittest.main()
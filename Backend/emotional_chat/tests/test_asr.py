@@ -0,0 +1,122 @@
+import unittest
+import os
+import sys
+import time
+from unittest import mock
+import numpy as np
+import speech_recognition as sr
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.asr import (ASRService, StubASRBackend, ASRBackend, ASRError, ASRTimeout, SpeechNotUnderstood,
+                     audio_data_from_samples, create_asr_service)
+
+class FailingBackend(ASRBackend):
+    name = 'failing'
+
+    def transcribe(self, audio, language='en-US', timeout=None):
+        raise ASRError("service unavailable")
+
+AUDIO = sr.AudioData(b'\x00\x00' * 16000, 16000, 2)
+
+class RecordingBackend(StubASRBackend):
+    """Stub that keeps the audio of every call"""
+
+    def __init__(self, text='hello', latency=0.0):
+        super().__init__(text, latency)
+        self.audio = []
+
+    def transcribe(self, audio, language='en-US', timeout=None):
+        self.audio.append(audio)
+        return super().transcribe(audio, language, timeout)
+
+def stub(name, text='hello', latency=0.0, backend_class=StubASRBackend):
+    backend = backend_class(text, latency)
+    backend.name = name
+    return backend
+
+class TestASRService(unittest.TestCase):
+    def test_fast_primary_is_not_hedged(self):
+        service = ASRService([stub('primary'), stub('secondary')], hedge_after=0.5)
+        result = service.transcribe(AUDIO)
+        self.assertEqual((result['backend'], result['hedged']), ('primary', False))
+        self.assertEqual(service.stats()['backends']['secondary']['calls'], 0)
+
+    def test_slow_primary_is_hedged_and_first_answer_wins(self):
+        service = ASRService([stub('primary', 'slow', 1.0), stub('secondary', 'fast')], hedge_after=0.05)
+        start = time.perf_counter()
+        result = service.transcribe(AUDIO)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual((result['text'], result['backend'], result['hedged']), ('fast', 'secondary', True))
+        self.assertEqual(service.stats()['hedged'], 1)
+
+    def test_failed_primary_falls_over_without_waiting(self):
+        service = ASRService([FailingBackend(), stub('secondary')], hedge_after=5)
+        start = time.perf_counter()
+        self.assertEqual(service.transcribe(AUDIO)['backend'], 'secondary')
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(service.stats()['backends']['failing']['errors'], 1)
+
+    def test_deadline(self):
+        service = ASRService([stub('primary', latency=1.0)], deadline=0.1)
+        start = time.perf_counter()
+        with self.assertRaises(ASRTimeout):
+            service.transcribe(AUDIO)
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_not_understood_is_an_answer(self):
+        service = ASRService([stub('primary', text=''), stub('secondary')], hedge_after=0.5)
+        with self.assertRaises(SpeechNotUnderstood):
+            service.transcribe(AUDIO)
+        self.assertEqual(service.stats()['hedged'], 0)
+
+    def test_hedge_delay_follows_primary_tail_latency(self):
+        service = ASRService([stub('primary'), stub('secondary')], hedge_after=2.0, min_samples=20)
+        self.assertEqual(service.hedge_delay(), 2.0)
+        for latency in [0.1] * 19 + [0.9]:
+            service.latency['primary'].record(latency)
+        self.assertAlmostEqual(service.hedge_delay(), 0.9)
+
+class TestAudioFormat(unittest.TestCase):
+    def test_audio_in_backend_format_is_sent_as_is(self):
+        backend = stub('primary', backend_class=RecordingBackend)
+        service = ASRService([backend])
+        service.transcribe(AUDIO)
+        self.assertIs(backend.audio[0], AUDIO)
+        self.assertEqual(service.stats()['bytes_sent'], 32000)
+        self.assertEqual(service.stats()['resampled'], 0)
+
+    def test_cd_quality_audio_is_resampled_once(self):
+        backend = stub('primary', backend_class=RecordingBackend)
+        service = ASRService([backend])
+        # One second of 44.1 kHz 32-bit audio, as a microphone might deliver it
+        service.transcribe(sr.AudioData(b'\x00' * 4 * 44100, 44100, 4))
+        sent = backend.audio[0]
+        self.assertEqual((sent.sample_rate, sent.sample_width), (16000, 2))
+        self.assertAlmostEqual(len(sent.frame_data) / 32000, 1.0, places=2)
+        self.assertEqual(service.stats()['resampled'], 1)
+
+    def test_audio_data_views_samples_without_copying(self):
+        samples = np.arange(1000, dtype=np.int16)
+        audio = audio_data_from_samples(samples[100:900], 16000)
+        self.assertTrue(np.shares_memory(np.frombuffer(audio.frame_data, dtype='<i2'), samples))
+        self.assertEqual(audio.get_raw_data(), samples[100:900].tobytes())
+
+    def test_service_uses_the_richest_backend_format(self):
+        wideband = stub('wideband')
+        wideband.sample_rate = 24000
+        self.assertEqual(ASRService([stub('primary'), wideband]).sample_rate, 24000)
+
+class TestCreateASRService(unittest.TestCase):
+    def test_recognizer_pool_is_only_built_for_google(self):
+        with mock.patch('src.asr.RecognizerPool') as pool:
+            service = create_asr_service(['stub'], stub_text='hello')
+            pool.assert_not_called()
+            self.assertEqual(service.transcribe(AUDIO)['text'], 'hello')
+            service = create_asr_service(['google', 'stub'], recognizer_pool_size=2)
+            pool.assert_called_once_with(size=2)
+        self.assertIs(service.backends[0].recognizer_pool, pool.return_value)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import os
+import io
+import sys
+import time
+import tempfile
+import wave
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.audio_decoder import AudioDecoder, AudioDecodeError, FFmpegWorkerPool, av
+
+# Stands in for ffmpeg: copies stdin to stdout, or fails on a marker
+ECHO_COMMAND = [
+    sys.executable, '-c',
+    "import sys; data = sys.stdin.buffer.read(); "
+    "sys.exit('bad input') if data == b'fail' else sys.stdout.buffer.write(data)"
+]
+
+def wav_bytes(samples, sample_rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.astype('<i2').tobytes())
+    return buffer.getvalue()
+
+def wait_for_idle(pool, count):
+    deadline = time.time() + 10
+    while pool.stats()['idle'] < count and time.time() < deadline:
+        time.sleep(0.01)
+
+class TestFFmpegWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = FFmpegWorkerPool(ECHO_COMMAND, size=2)
+        self.addCleanup(self.pool.close)
+
+    def test_requests_use_prestarted_workers(self):
+        wait_for_idle(self.pool, 2)
+        for i in range(4):
+            self.assertEqual(self.pool.run(f'chunk {i}'.encode()), f'chunk {i}'.encode())
+            wait_for_idle(self.pool, 2)
+        stats = self.pool.stats()
+        self.assertEqual((stats['warm'], stats['cold'], stats['idle']), (4, 0, 2))
+
+    def test_failures_raise_and_workers_are_replaced(self):
+        wait_for_idle(self.pool, 2)
+        with self.assertRaises(AudioDecodeError):
+            self.pool.run(b'fail')
+        wait_for_idle(self.pool, 2)
+        self.assertEqual(self.pool.run(b'ok'), b'ok')
+
+class TestAudioDecoder(unittest.TestCase):
+    def test_pcm_wav_is_read_without_a_backend(self):
+        decoder = AudioDecoder(backend='ffmpeg', pool_size=0, ffmpeg_path='missing-ffmpeg')
+        samples = (np.arange(800) % 200 - 100).astype(np.int16)
+        decoded, sample_rate = decoder.decode(wav_bytes(samples, 8000))
+        self.assertEqual(sample_rate, 8000)
+        np.testing.assert_array_equal(decoded, samples)
+        decoder.close()
+
+    @unittest.skipIf(av is None, "PyAV is not installed")
+    def test_stream_file_yields_bounded_blocks_at_decoder_rate(self):
+        samples = (3000 * np.sin(np.arange(3 * 8000) / 5)).astype(np.int16)
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f:
+            f.write(wav_bytes(samples, 8000))
+        self.addCleanup(os.remove, f.name)
+        decoder = AudioDecoder(backend='pyav', sample_rate=16000)
+        blocks = list(decoder.stream_file(f.name, block_seconds=0.5))
+        self.assertGreater(len(blocks), 4)
+        self.assertLess(max(len(block) for block in blocks), 16000)
+        self.assertAlmostEqual(sum(len(block) for block in blocks), 3 * 16000, delta=200)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            AudioDecoder(backend='gstreamer')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import os
+import io
+import sys
+import shutil
+import time
+import wave
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.audio_processor import AudioProcessor
+from src.asr import ASRService, GoogleASRBackend, RecognizerPool
+from src.audio_decoder import AudioDecoder
+
+SAMPLE_RATE = 16000
+
+class FakeRecognizer:
+    """Echoes the clip length back and fails if two threads ever use it at once"""
+
+    def __init__(self):
+        self.in_use = threading.Lock()
+
+    def recognize_google(self, audio, language=None):
+        if not self.in_use.acquire(blocking=False):
+            raise AssertionError("Recognizer shared between requests")
+        try:
+            time.sleep(0.002)
+            return f"hey eva {len(audio.frame_data) // 2}"
+        finally:
+            self.in_use.release()
+
+def voiced_wav(n_samples, freq):
+    t = np.arange(n_samples) / SAMPLE_RATE
+    samples = (6000 * np.sin(2 * np.pi * freq * t)).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+class TestAudioProcessorConcurrency(unittest.TestCase):
+    def setUp(self):
+        self.pool = RecognizerPool(size=2, factory=FakeRecognizer)
+        self.processor = AudioProcessor(
+            audio_decoder=AudioDecoder(backend='ffmpeg', pool_size=0, ffmpeg_path='missing-ffmpeg'),
+            asr_service=ASRService([GoogleASRBackend(self.pool)], max_workers=16)
+        )
+        self.addCleanup(self.processor.cleanup)
+
+    def test_concurrent_requests_get_their_own_results(self):
+        # Every clip has a distinct length, so a mixed-up buffer shows up in the transcription
+        lengths = [SAMPLE_RATE // 2 + 320 * i for i in range(200)]
+        clips = [voiced_wav(n, 180 + i) for i, n in enumerate(lengths)]
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(self.processor.process_audio_bytes, clips))
+
+        for n, result in zip(lengths, results):
+            self.assertTrue(result['success'], result)
+            self.assertTrue(result['wake_word_detected'])
+            self.assertEqual(result['transcription'], f"hey eva {n}")
+        # Busy periods borrow extra recognizers but only the pool size is kept
+        self.assertGreaterEqual(self.pool.created, 2)
+        self.assertLessEqual(self.pool._idle.qsize(), 2)
+
+    def test_process_audio_file_leaves_other_files_alone(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = []
+        for i in range(20):
+            path = os.path.join(directory, f"clip_{i}.wav")
+            with open(path, 'wb') as f:
+                f.write(voiced_wav(SAMPLE_RATE // 2 + 160 * i, 200))
+            paths.append(path)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(self.processor.process_audio_file, paths))
+
+        self.assertTrue(all(result['success'] for result in results))
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+class TestAudioProcessorInMemory(unittest.TestCase):
+    def setUp(self):
+        self.pool = RecognizerPool(size=1, factory=FakeRecognizer)
+        self.samples = (6000 * np.sin(np.arange(SAMPLE_RATE) / 10)).astype(np.int16)
+
+    def processor(self, **kwargs):
+        processor = AudioProcessor(asr_service=ASRService([GoogleASRBackend(self.pool)]), **kwargs)
+        self.addCleanup(processor.cleanup)
+        return processor
+
+    def test_samples_are_recognised_in_memory(self):
+        processor = self.processor()
+        result = processor.process_audio_samples(self.samples, SAMPLE_RATE)
+        self.assertEqual(result['transcription'], f"hey eva {SAMPLE_RATE}")
+        self.assertIsNone(processor.debug_capture_dir)
+
+    def test_debug_capture_saves_the_clip(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.processor(debug_capture_dir=directory).process_audio_samples(self.samples, SAMPLE_RATE)
+        (name,) = os.listdir(directory)
+        with wave.open(os.path.join(directory, name), 'rb') as wav_file:
+            self.assertEqual(wav_file.getnframes(), SAMPLE_RATE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import os
+import sys
+import time
+import threading
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.chunk_deduplicator import ChunkDeduplicator, find_offset
+
+SAMPLE_RATE = 16000
+
+class RecordingAnalyser:
+    def __init__(self):
+        self.lengths = []
+
+    def __call__(self, samples, sample_rate):
+        self.lengths.append(len(samples))
+        return {'success': True, 'wake_word_detected': False}
+
+class TestChunkDeduplicator(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # Ten seconds of "room audio" that the staggered recorders cut chunks from
+        self.stream = rng.normal(0, 3000, SAMPLE_RATE * 10)
+        self.rng = rng
+        self.dedup = ChunkDeduplicator()
+        self.analyse = RecordingAnalyser()
+
+    def chunk(self, start, duration=2.0):
+        """A recorder's chunk, with its own small encoding noise"""
+        begin = int(start * SAMPLE_RATE)
+        samples = self.stream[begin:begin + int(duration * SAMPLE_RATE)]
+        return (samples + self.rng.normal(0, 300, len(samples))).astype(np.int16)
+
+    def test_find_offset(self):
+        reference = self.stream[:SAMPLE_RATE]
+        offset, score = find_offset(reference, reference[1234:1234 + 4000])
+        self.assertEqual(offset, 1234)
+        self.assertAlmostEqual(score, 1.0, places=6)
+
+    def test_staggered_chunks_only_analyse_new_audio(self):
+        # Two recorders, 2 s chunks, 1 s stagger
+        for start in (0, 1, 2, 3):
+            self.dedup.process('tablet', self.chunk(start), SAMPLE_RATE, self.analyse)
+        new_and_context = int(1.5 * SAMPLE_RATE)
+        self.assertEqual(self.analyse.lengths, [2 * SAMPLE_RATE] + [new_and_context] * 3)
+        self.assertEqual(self.dedup.stats()['partial'], 3)
+
+    def test_near_total_overlap_reuses_result(self):
+        self.dedup.process('tablet', self.chunk(0), SAMPLE_RATE, self.analyse)
+        result = self.dedup.process('tablet', self.chunk(0.1, 1.8), SAMPLE_RATE, self.analyse)
+        self.assertEqual(result['deduplicated'], 'reused')
+        self.assertEqual(len(self.analyse.lengths), 1)
+
+    def test_reused_result_does_not_repeat_a_detection(self):
+        detect = lambda samples, sample_rate: {'success': True, 'wake_word_detected': True, 'detected_words': ['eva']}
+        first = self.dedup.process('tablet', self.chunk(0), SAMPLE_RATE, detect)
+        second = self.dedup.process('tablet', self.chunk(0.1, 1.8), SAMPLE_RATE, detect)
+        self.assertTrue(first['wake_word_detected'])
+        self.assertEqual(second['deduplicated'], 'reused')
+        self.assertFalse(second['wake_word_detected'])
+        self.assertEqual(second['detected_words'], [])
+
+    def test_chunks_from_one_client_are_processed_one_at_a_time(self):
+        active = []
+        overlapping = []
+        started = threading.Event()
+
+        def slow_analyse(samples, sample_rate):
+            active.append(1)
+            overlapping.append(len(active))
+            started.set()
+            time.sleep(0.05)
+            active.pop()
+            return {'success': True, 'wake_word_detected': False}
+
+        threads = [threading.Thread(target=self.dedup.process,
+                                    args=('tablet', self.chunk(start), SAMPLE_RATE, slow_analyse))
+                   for start in (0, 1)]
+        threads[0].start()
+        # The second chunk arrives while the first is still being analysed
+        started.wait(5)
+        threads[1].start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(max(overlapping), 1)
+        # The later chunk was compared with the earlier one instead of both being analysed fully
+        self.assertEqual(self.dedup.stats()['full'], 1)
+
+    def test_unrelated_chunks_and_clients_are_analysed_fully(self):
+        self.dedup.process('tablet', self.chunk(0), SAMPLE_RATE, self.analyse)
+        self.dedup.process('tablet', self.chunk(5), SAMPLE_RATE, self.analyse)
+        self.dedup.process('other', self.chunk(6), SAMPLE_RATE, self.analyse)
+        self.assertEqual(self.analyse.lengths, [2 * SAMPLE_RATE] * 3)
+
+if __name__ == '__main__':
+    unittest.main()
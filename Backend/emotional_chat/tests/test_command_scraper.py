@@ -0,0 +1,49 @@
+import unittest
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.command_scraper import commandScraper
+
+class FakeCompletions:
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.text))])
+
+class TestCommandCaches(unittest.TestCase):
+    def setUp(self):
+        self.scraper = commandScraper()
+        self.completions = FakeCompletions("Frank Sinatra My Way")
+        self.scraper.client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+
+    @patch('src.command_scraper.search_youtube', return_value="https://www.youtube.com/watch?v=qQzdAsjWGPg")
+    def test_repeat_request_needs_no_upstream_call(self, search):
+        first = self.scraper.get_response("play_music", "Play Frank Sinatra")
+        second = self.scraper.get_response("play_music", "Eva, play Frank Sinatra!")
+        self.assertEqual(first, second)
+        self.assertEqual((self.completions.calls, search.call_count), (1, 1))
+        stats = self.scraper.cache_stats()
+        self.assertEqual((stats['queries']['hits'], stats['media']['hits']), (1, 1))
+
+    @patch('src.command_scraper.search_image', return_value="https://example.com/cat.jpg")
+    def test_different_request_with_same_query_reuses_the_media(self, search):
+        self.scraper.get_response("show_image", "Show me cats")
+        self.scraper.get_response("show_image", "I would like to see some cats")
+        self.assertEqual((self.completions.calls, search.call_count), (2, 1))
+
+    @patch('src.command_scraper.search_youtube', return_value=None)
+    def test_failed_search_is_retried(self, search):
+        self.assertIsNone(self.scraper.get_response("play_youtube", "Play Frank Sinatra"))
+        self.scraper.get_response("play_youtube", "Play Frank Sinatra")
+        self.assertEqual(search.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
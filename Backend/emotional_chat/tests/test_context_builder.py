@@ -0,0 +1,105 @@
+import unittest
+import os
+import sys
+import time
+import threading
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.context_builder import ContextBuilder, estimate_tokens, message_tokens, turn_messages
+
+def turns(count):
+    return [{'timestamp': f"2025-01-01T10:{i:02d}:00", 'user_text': f"Tell me about day {i} please",
+             'response': f"Day {i} was a lovely sunny day in the garden."} for i in range(count)]
+
+TURN_TOKENS = sum(message_tokens(message) for message in turn_messages(turns(1)[0]))
+
+class RecordingSummarizer:
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+        self.done = threading.Event()
+
+    def __call__(self, summary, turns, max_tokens):
+        time.sleep(self.delay)
+        self.calls.append((summary, [turn['timestamp'] for turn in turns]))
+        self.done.set()
+        return f"{summary} {len(turns)} earlier turns".strip()
+
+def wait_for(builder, session_id):
+    deadline = time.time() + 2
+    while time.time() < deadline and not builder.summary(session_id)[0]:
+        time.sleep(0.01)
+
+class TestEstimateTokens(unittest.TestCase):
+    def test_words_and_punctuation(self):
+        self.assertEqual(estimate_tokens("Hello, world!"), 6)
+        self.assertEqual(estimate_tokens(""), 0)
+
+class TestContextBuilder(unittest.TestCase):
+    def test_newest_turns_fill_the_budget(self):
+        builder = ContextBuilder(budget_tokens=3 * TURN_TOKENS + 1, summary_tokens=1)
+        messages = builder.build('alice', turns(10))
+        self.assertEqual(len(messages), 6)
+        self.assertEqual(messages[0]['content'], "Tell me about day 7 please")
+        self.assertEqual(messages[-1]['content'], "Day 9 was a lovely sunny day in the garden.")
+
+    def test_history_within_budget_is_sent_whole(self):
+        builder = ContextBuilder(summarize=RecordingSummarizer(), budget_tokens=10 * TURN_TOKENS)
+        self.assertEqual(len(builder.build('alice', turns(3))), 6)
+        self.assertEqual(builder.stats()['refreshes'], 0)
+
+    def test_evicted_turns_are_summarised_in_the_background(self):
+        summarizer = RecordingSummarizer(delay=0.2)
+        builder = ContextBuilder(summarize=summarizer, budget_tokens=3 * TURN_TOKENS + 10, summary_tokens=10)
+        start = time.perf_counter()
+        first = builder.build('alice', turns(10))
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertNotEqual(first[0]['role'], 'system')
+        wait_for(builder, 'alice')
+        messages = builder.build('alice', turns(10))
+        self.assertEqual(messages[0], {"role": "system", "content": "Summary of the earlier conversation: 7 earlier turns"})
+        self.assertEqual(len(summarizer.calls), 1)
+
+    def test_summary_is_extended_with_newly_evicted_turns_only(self):
+        summarizer = RecordingSummarizer()
+        builder = ContextBuilder(summarize=summarizer, budget_tokens=3 * TURN_TOKENS + 10, summary_tokens=10)
+        builder.build('alice', turns(5))
+        wait_for(builder, 'alice')
+        builder.build('alice', turns(6))
+        deadline = time.time() + 2
+        while time.time() < deadline and len(summarizer.calls) < 2:
+            time.sleep(0.01)
+        self.assertEqual(summarizer.calls[1], ("2 earlier turns", ["2025-01-01T10:02:00"]))
+
+class StaticMemory:
+    def __init__(self, turns):
+        self.turns = turns
+        self.queries = []
+
+    def search(self, session_id, query, k=3, before=None):
+        self.queries.append((query, before))
+        return [(1.0, turn) for turn in self.turns if before is None or turn['timestamp'] < before][:k]
+
+class TestRecall(unittest.TestCase):
+    def test_relevant_older_turns_are_recalled_before_the_history(self):
+        history = turns(10)
+        memory = StaticMemory([history[1]])
+        builder = ContextBuilder(budget_tokens=2 * TURN_TOKENS + 210, summary_tokens=10, memory=memory,
+                                 recall_tokens=200)
+        messages = builder.build('alice', history, query="What about day 1?")
+        self.assertEqual(messages[0]['role'], 'system')
+        self.assertIn("Tell me about day 1 please", messages[0]['content'])
+        self.assertEqual(len(messages), 5)
+        # Only turns older than the oldest one already in the prompt are recalled
+        self.assertEqual(memory.queries, [("What about day 1?", history[8]['timestamp'])])
+
+    def test_nothing_is_recalled_without_a_query(self):
+        memory = StaticMemory(turns(1))
+        builder = ContextBuilder(budget_tokens=1000, memory=memory)
+        self.assertEqual(len(builder.build('alice', turns(2))), 4)
+        self.assertEqual(memory.queries, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.conversation_journal import ConversationJournal
+
+def turn(text):
+    return {'user_text': text, 'response': 'ok'}
+
+class TestConversationJournal(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folder = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_turns_are_written_in_batches(self):
+        journal = ConversationJournal(self.folder, flush_interval=60)
+        for i in range(10):
+            journal.append('alice', turn(f"message {i}"))
+        self.assertEqual(journal.stats()['pending'], 10)
+        journal.flush()
+        self.assertEqual((journal.stats()['batches'], journal.stats()['records_written']), (1, 10))
+        journal.close()
+
+    def test_segments_rotate_at_size_limit(self):
+        journal = ConversationJournal(self.folder, segment_max_bytes=500, flush_interval=60)
+        for i in range(20):
+            journal.append('alice', turn(f"message {i}"))
+            journal.flush()
+        journal.close()
+        segments = sorted(self.folder.glob('journal-*.jsonl'))
+        self.assertGreater(len(segments), 1)
+        self.assertTrue(all(path.stat().st_size <= 500 for path in segments))
+        lines = [json.loads(line) for path in segments for line in path.read_text().splitlines()]
+        self.assertEqual([record['turn']['user_text'] for record in lines], [f"message {i}" for i in range(20)])
+
+    def test_read_by_patient_and_time(self):
+        journal = ConversationJournal(self.folder, segment_max_bytes=300, flush_interval=60)
+        journal.append('alice', turn("first"))
+        journal.append('bob', turn("hello"))
+        journal.flush()
+        middle = journal.read()[-1]['ts']
+        journal.append('alice', turn("second"))
+        self.assertEqual([r['turn']['user_text'] for r in journal.read('alice')], ["first", "second"])
+        self.assertEqual([r['turn']['user_text'] for r in journal.read('alice', since=middle)], ["second"])
+        self.assertEqual(journal.read('carol'), [])
+        journal.close()
+
+    def test_reopened_journal_continues_and_keeps_its_index(self):
+        journal = ConversationJournal(self.folder, flush_interval=60)
+        journal.append('alice', turn("before restart"))
+        journal.close()
+        journal = ConversationJournal(self.folder, flush_interval=60)
+        journal.append('alice', turn("after restart"))
+        self.assertEqual([r['turn']['user_text'] for r in journal.read('alice')],
+                         ["before restart", "after restart"])
+        journal.close()
+        index = json.loads((self.folder / 'index.json').read_text())
+        self.assertEqual((len(index), index[0]['records'], index[0]['sessions']), (1, 2, ['alice']))
+
+    def test_record_cut_short_by_a_crash_is_skipped(self):
+        journal = ConversationJournal(self.folder, flush_interval=60)
+        journal.append('alice', turn("saved"))
+        journal.close()
+        segment, = self.folder.glob('journal-*.jsonl')
+        self.assertIn(f"-{os.getpid()}-000001", segment.name)
+        with open(segment, 'a') as f:
+            f.write('{"ts": 1, "session_id": "al')
+        journal = ConversationJournal(self.folder, flush_interval=60)
+        journal.append('alice', turn("after crash"))
+        self.assertEqual([r['turn']['user_text'] for r in journal.read('alice')], ["saved", "after crash"])
+        journal.close()
+
+    def test_processes_sharing_a_folder_write_separate_segments(self):
+        first = ConversationJournal(self.folder, flush_interval=60, writer='host-1')
+        second = ConversationJournal(self.folder, flush_interval=60, writer='host-2')
+        first.append('alice', turn("to the first worker"))
+        first.flush()
+        second.append('alice', turn("to the second worker"))
+        second.append('bob', turn("hello"))
+        second.flush()
+        first.append('alice', turn("first again"))
+        self.assertEqual([r['turn']['user_text'] for r in first.read('alice')],
+                         ["to the first worker", "to the second worker", "first again"])
+        self.assertEqual([r['turn']['user_text'] for r in first.read('bob')], ["hello"])
+        first.close()
+        second.close()
+        index = json.loads((self.folder / 'index.json').read_text())
+        self.assertEqual([(entry['segment'], entry['records']) for entry in index],
+                         [('journal-host-1-000001.jsonl', 2), ('journal-host-2-000001.jsonl', 2)])
+
+if __name__ == '__main__':
+    unittest.main()
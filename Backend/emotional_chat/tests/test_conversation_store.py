@@ -0,0 +1,72 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.conversation_store import ConversationStore, turn_size
+
+def turn(text):
+    return {'user_text': text, 'response': 'ok'}
+
+class TestConversationStore(unittest.TestCase):
+    def test_session_keeps_most_recent_turns(self):
+        store = ConversationStore(max_turns=3)
+        for i in range(5):
+            store.add_turn('patient', turn(f"message {i}"))
+        history = store.history('patient')
+        self.assertEqual([t['user_text'] for t in history], ['message 2', 'message 3', 'message 4'])
+        self.assertEqual(store.stats()['bytes'], sum(turn_size(t) for t in history))
+
+    def test_sessions_are_separate(self):
+        store = ConversationStore()
+        store.add_turn('alice', turn("hello"))
+        store.add_turn('bob', turn("good morning"))
+        self.assertEqual(store.history('alice'), [turn("hello")])
+        self.assertEqual(store.history('bob'), [turn("good morning")])
+
+    def test_least_recently_used_session_is_evicted_over_budget(self):
+        size = turn_size(turn("message"))
+        store = ConversationStore(max_bytes=2 * size)
+        store.add_turn('alice', turn("message"))
+        store.add_turn('bob', turn("message"))
+        store.history('alice')
+        store.add_turn('carol', turn("message"))
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.stats()['evictions'], 1)
+        # bob was used least recently, so his history is gone without a spill folder
+        self.assertEqual(store.history('bob'), [])
+
+    def test_evicted_session_is_reloaded_from_disk(self):
+        size = turn_size(turn("message"))
+        with tempfile.TemporaryDirectory() as spill_dir:
+            store = ConversationStore(max_bytes=size, spill_dir=spill_dir)
+            store.add_turn('alice', turn("message"))
+            store.add_turn('bob', turn("message"))
+            self.assertEqual(store.stats()['spills'], 1)
+            # Reading a spilled session does not bring it back into memory
+            self.assertEqual(store.history('alice'), [turn("message")])
+            self.assertEqual(store.stats()['reloads'], 0)
+            store.add_turn('alice', turn("again"))
+            self.assertEqual(store.history('alice'), [turn("message"), turn("again")])
+            self.assertEqual(store.stats()['reloads'], 1)
+
+    def test_history_of_unknown_session_creates_nothing(self):
+        size = turn_size(turn("message"))
+        store = ConversationStore(max_bytes=size)
+        store.add_turn('alice', turn("message"))
+        self.assertEqual(store.history('mallory'), [])
+        self.assertEqual(store.stats()['sessions'], 1)
+        self.assertEqual(store.stats()['evictions'], 0)
+
+    def test_flush_persists_sessions_for_a_new_store(self):
+        with tempfile.TemporaryDirectory() as spill_dir:
+            store = ConversationStore(spill_dir=spill_dir)
+            store.add_turn('alice', turn("hello"))
+            store.flush()
+            self.assertEqual(ConversationStore(spill_dir=spill_dir).history('alice'), [turn("hello")])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import os
+import sys
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.emotion_aggregator import EmotionAggregator
+
+def sliding_window_reference(labels, window_size):
+    """The original list-slicing implementation, used as an oracle"""
+    windows = [labels[i:i + window_size] for i in range(len(labels) - window_size + 1)]
+    if not windows and labels:
+        windows = [labels]
+    dominants = []
+    for window in windows:
+        counts = {}
+        for label in window:
+            counts[label] = counts.get(label, 0) + 1
+        dominants.append(max(counts.items(), key=lambda x: x[1])[0])
+    return {e: dominants.count(e) / len(dominants) * 100 for e in set(dominants)}
+
+class TestEmotionAggregator(unittest.TestCase):
+    def test_empty(self):
+        aggregator = EmotionAggregator()
+        self.assertIsNone(aggregator.dominant())
+        self.assertEqual(aggregator.percentages(), {})
+        self.assertEqual(aggregator.timeline(), [])
+
+    def test_partial_window_counts_as_one(self):
+        aggregator = EmotionAggregator(window_size=5)
+        for label in ['happy', 'happy', 'sad']:
+            aggregator.add(label, 0.0)
+        self.assertEqual(aggregator.dominant(), 'happy')
+        self.assertEqual(aggregator.percentages(), {'happy': 100.0})
+
+    def test_matches_reference_without_ties(self):
+        labels = ['happy'] * 7 + ['sad'] * 9 + ['neutral'] * 5 + ['happy'] * 3
+        aggregator = EmotionAggregator(window_size=5)
+        for i, label in enumerate(labels):
+            aggregator.add(label, float(i))
+        expected = sliding_window_reference(labels, 5)
+        self.assertEqual(aggregator.percentages().keys(), expected.keys())
+        for emotion, percentage in expected.items():
+            self.assertAlmostEqual(aggregator.percentages()[emotion], percentage)
+        self.assertEqual(aggregator.dominant(), 'sad')
+
+    def test_timeline_segments(self):
+        aggregator = EmotionAggregator(window_size=1)
+        for i, label in enumerate(['happy', 'happy', 'sad', 'sad', 'sad', 'happy']):
+            aggregator.add(label, i * 0.5)
+        self.assertEqual(aggregator.timeline(), [
+            {'emotion': 'happy', 'start': 0.0, 'end': 0.5, 'frames': 2},
+            {'emotion': 'sad', 'start': 1.0, 'end': 2.0, 'frames': 3},
+            {'emotion': 'happy', 'start': 2.5, 'end': 2.5, 'frames': 1},
+        ])
+
+    def test_smoothing_ignores_single_frame_flicker(self):
+        aggregator = EmotionAggregator(window_size=3)
+        for i, label in enumerate(['neutral', 'neutral', 'angry', 'neutral', 'neutral']):
+            aggregator.add(label, float(i))
+        self.assertEqual([s['emotion'] for s in aggregator.timeline()], ['neutral'])
+
+    def test_bounded_timeline(self):
+        aggregator = EmotionAggregator(window_size=1, max_segments=2)
+        for i, label in enumerate(['happy', 'sad', 'angry']):
+            aggregator.add(label, float(i))
+        self.assertEqual([s['emotion'] for s in aggregator.timeline()], ['sad', 'angry'])
+
+    def test_top_emotions_and_reset(self):
+        aggregator = EmotionAggregator()
+        aggregator.extend(['sad', 'sad', 'happy'], 0.0)
+        self.assertEqual(aggregator.top_emotions(1), ['sad'])
+        aggregator.reset()
+        self.assertEqual(aggregator.total_frames, 0)
+        self.assertIsNone(aggregator.current)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import os
+import sys
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.emotion_session import EmotionSession, EmotionSessionManager
+
+class FakeMonitor:
+    """Returns the frame itself as the detected emotions and remembers the faces it was given"""
+
+    def __init__(self):
+        self.previous_faces = []
+
+    def analyze_frame(self, frame_data, last_faces=None):
+        self.previous_faces.append(last_faces)
+        return list(frame_data), [(0, 0, 10, 10)] * len(frame_data)
+
+class TestEmotionSession(unittest.TestCase):
+    def test_frames_update_rolling_state_and_track_faces(self):
+        monitor = FakeMonitor()
+        session = EmotionSession('tablet-1', monitor, window_size=3)
+        session.process_frame(['happy'], 0.0)
+        update = session.process_frame(['happy', 'sad'], 0.1)
+        self.assertEqual((update['session_id'], update['faces'], update['frames']), ('tablet-1', 2, 3))
+        self.assertEqual(update['dominant'], 'happy')
+        # Faces found in one frame are handed to the monitor with the next
+        self.assertEqual(monitor.previous_faces, [[], [(0, 0, 10, 10)]])
+
+    def test_consume_returns_summary_once_and_resets(self):
+        session = EmotionSession('tablet-1', FakeMonitor())
+        self.assertIsNone(session.consume())
+        session.process_frame(['sad'], 0.0)
+        session.process_frame(['sad'], 0.5)
+        summary = session.consume()
+        self.assertEqual(summary['dominant'], 'sad')
+        self.assertIsNone(session.consume())
+        session.process_frame(['happy'], 1.0)
+        self.assertEqual(session.consume()['dominant'], 'happy')
+
+class TestEmotionSessionManager(unittest.TestCase):
+    def test_get_or_create_reuses_sessions(self):
+        manager = EmotionSessionManager(FakeMonitor())
+        session = manager.get_or_create()
+        self.assertTrue(session.session_id)
+        self.assertIs(manager.get_or_create(session.session_id), session)
+        self.assertIs(manager.get(session.session_id), session)
+        self.assertIsNone(manager.get('unknown'))
+        self.assertIsNone(manager.get(None))
+
+    def test_ids_are_issued_by_the_server(self):
+        manager = EmotionSessionManager(FakeMonitor())
+        session = manager.get_or_create('chosen-by-client')
+        self.assertNotEqual(session.session_id, 'chosen-by-client')
+        self.assertIsNone(manager.get('chosen-by-client'))
+
+    def test_session_held_by_a_connection_is_refused_to_others(self):
+        manager = EmotionSessionManager(FakeMonitor())
+        connection = object()
+        session = manager.get_or_create(owner=connection)
+        self.assertIs(manager.get_or_create(session.session_id, owner=connection), session)
+        with self.assertRaises(PermissionError):
+            manager.get_or_create(session.session_id)
+        with self.assertRaises(PermissionError):
+            manager.get_or_create(session.session_id, owner=object())
+        manager.release(session.session_id, connection)
+        self.assertIs(manager.get_or_create(session.session_id), session)
+
+    def test_idle_sessions_are_evicted(self):
+        manager = EmotionSessionManager(FakeMonitor(), idle_timeout=60)
+        idle = manager.get_or_create()
+        manager.get_or_create()
+        idle.last_active = time.time() - 61
+        self.assertIsNone(manager.get(idle.session_id))
+        self.assertEqual(len(manager), 1)
+
+    def test_least_recently_used_session_is_evicted_at_max_sessions(self):
+        manager = EmotionSessionManager(FakeMonitor(), max_sessions=2)
+        a = manager.get_or_create().session_id
+        b = manager.get_or_create().session_id
+        # Using a again makes b the least recently used
+        manager.get_or_create(a)
+        manager.get_or_create()
+        self.assertEqual(len(manager), 2)
+        self.assertIsNone(manager.get(b))
+        self.assertIsNotNone(manager.get(a))
+
+    def test_consume_and_close(self):
+        manager = EmotionSessionManager(FakeMonitor())
+        session = manager.get_or_create()
+        session.process_frame(['neutral'], 0.0)
+        self.assertEqual(manager.consume(session.session_id)['dominant'], 'neutral')
+        self.assertIsNone(manager.consume('unknown'))
+        manager.close(session.session_id)
+        self.assertEqual(len(manager), 0)
+
+if __name__ == '__main__':
+    unittest.main()
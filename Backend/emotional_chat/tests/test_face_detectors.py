@@ -0,0 +1,78 @@
+import unittest
+import os
+import sys
+import cv2
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.face_detectors import (
+    HaarFaceDetector, create_face_detector, box_iou, match_detections
+)
+from src.emotion_monitor import EmotionMonitor
+
+class TestFaceDetectors(unittest.TestCase):
+    def test_factory_defaults_to_haar(self):
+        """The factory keeps the original Haar cascade as the default backend."""
+        self.assertIsInstance(create_face_detector(), HaarFaceDetector)
+        self.assertIsInstance(create_face_detector('HAAR'), HaarFaceDetector)
+
+    def test_factory_rejects_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_face_detector('mtcnn')
+
+    def test_missing_model_files(self):
+        with self.assertRaises(FileNotFoundError):
+            create_face_detector('lbp', lbp_cascade='/nonexistent/lbpcascade.xml')
+        with self.assertRaises(FileNotFoundError):
+            create_face_detector('dnn', dnn_model=None)
+
+    def test_haar_accepts_gray_and_color(self):
+        detector = HaarFaceDetector()
+        blank_gray = np.zeros((120, 160), dtype=np.uint8)
+        blank_color = np.zeros((120, 160, 3), dtype=np.uint8)
+        self.assertEqual(detector.detect(blank_gray), [])
+        self.assertEqual(detector.detect(blank_color), [])
+
+    def test_box_iou(self):
+        self.assertAlmostEqual(box_iou((0, 0, 10, 10), (0, 0, 10, 10)), 1.0)
+        self.assertAlmostEqual(box_iou((0, 0, 10, 10), (5, 0, 10, 10)), 50 / 150)
+        self.assertEqual(box_iou((0, 0, 10, 10), (20, 20, 5, 5)), 0.0)
+
+    def test_match_detections(self):
+        reference = [(0, 0, 10, 10), (50, 50, 10, 10)]
+        candidate = [(51, 50, 10, 10), (100, 100, 10, 10)]
+        self.assertEqual(match_detections(reference, candidate), 1)
+        self.assertEqual(match_detections(reference, []), 0)
+
+    def test_monitor_uses_injected_detector(self):
+        class FixedDetector:
+            name = 'fixed'
+            requires_color = False
+
+            def __init__(self):
+                self.calls = 0
+
+            def detect(self, image):
+                self.calls += 1
+                return [(0, 0, 48, 48)]
+
+        detector = FixedDetector()
+        monitor = EmotionMonitor(detector)
+        frame = np.full((96, 96, 3), 128, dtype=np.uint8)
+        emotions = monitor.process_frame(frame)
+        self.assertEqual(detector.calls, 1)
+        self.assertEqual(len(emotions), 1)
+
+        # Frames that are already single-channel skip colour conversion
+        gray_frame = np.full((96, 96), 128, dtype=np.uint8)
+        self.assertEqual(len(monitor.process_frame(gray_frame)), 1)
+
+        # Encoded frames are decoded straight to grayscale for cascade backends
+        encoded = cv2.imencode('.png', frame)[1].tobytes()
+        _, faces = monitor.analyze_frame(encoded)
+        self.assertEqual(faces, [(0, 0, 48, 48)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import unittest
+import os
+import sys
+import threading
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ttl_cache import TTLCache
+from src.idempotency import IdempotencyCache, InFlightTimeout, request_key
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTTLCache(unittest.TestCase):
+    def test_expiry_and_stats(self):
+        clock = FakeClock()
+        cache = TTLCache(max_entries=2, ttl=10, clock=clock)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        clock.now = 11
+        self.assertIsNone(cache.get('a'))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['expirations']), (1, 1, 1))
+
+    def test_lru_eviction(self):
+        cache = TTLCache(max_entries=2, ttl=10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+class TestIdempotencyCache(unittest.TestCase):
+    def test_request_key(self):
+        self.assertEqual(request_key('wake', payload=b'abc'), request_key('wake', payload=b'abc'))
+        self.assertNotEqual(request_key('wake', payload=b'abc'), request_key('video', payload=b'abc'))
+        self.assertEqual(request_key('wake', 'retry-1', b'abc'), request_key('wake', 'retry-1', b'abc'))
+        self.assertNotEqual(request_key('wake', payload=b'abc'), request_key('wake', 'retry-1', b'abc'))
+
+    def test_request_key_is_bound_to_payload_and_scope(self):
+        # A key reused for other content, e.g. a counter reset by a restart
+        self.assertNotEqual(request_key('wake', 'retry-1', b'abc'), request_key('wake', 'retry-1', b'xyz'))
+        # The same content from another patient or device
+        self.assertNotEqual(request_key('video', 'retry-1', b'abc', scope=('alice', None)),
+                            request_key('video', 'retry-1', b'abc', scope=('bob', None)))
+        self.assertNotEqual(request_key('video', payload=b'abc', scope=('alice', None)),
+                            request_key('video', payload=b'abc', scope=('alice', 'emotions-1')))
+        self.assertNotEqual(request_key('video', payload=b'abc', scope=('ab', 'c')),
+                            request_key('video', payload=b'abc', scope=('a', 'bc')))
+
+    def test_replays_completed_result(self):
+        cache = IdempotencyCache()
+        calls = []
+        compute = lambda: calls.append(1) or {'success': True}
+        self.assertEqual(cache.get_or_compute('k', compute), ({'success': True}, False))
+        self.assertEqual(cache.get_or_compute('k', compute), ({'success': True}, True))
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_results_are_not_replayed(self):
+        cache = IdempotencyCache(should_cache=lambda result: result['success'])
+        calls = []
+        compute = lambda: calls.append(1) or {'success': False}
+        cache.get_or_compute('k', compute)
+        cache.get_or_compute('k', compute)
+        self.assertEqual(len(calls), 2)
+
+    def test_in_flight_duplicates_wait_for_original(self):
+        cache = IdempotencyCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'result'
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', slow_compute)))
+        first.start()
+        started.wait(5)
+        duplicates = [
+            threading.Thread(target=lambda: results.append(cache.get_or_compute('k', slow_compute)))
+            for _ in range(5)
+        ]
+        for thread in duplicates:
+            thread.start()
+        time.sleep(0.05)
+        self.assertEqual(cache.stats()['in_flight'], 1)
+        release.set()
+        for thread in [first] + duplicates:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('result', False)] + [('result', True)] * 5)
+
+    def test_duplicates_stop_waiting_after_timeout(self):
+        cache = IdempotencyCache(wait_timeout=0.05)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_compute():
+            started.set()
+            release.wait(5)
+            return 'result'
+
+        first = threading.Thread(target=lambda: cache.get_or_compute('k', slow_compute))
+        first.start()
+        started.wait(5)
+        with self.assertRaises(InFlightTimeout):
+            cache.get_or_compute('k', slow_compute)
+        release.set()
+        first.join(5)
+        self.assertEqual(cache.get_or_compute('k', slow_compute), ('result', True))
+
+    def test_errors_propagate_to_waiters(self):
+        cache = IdempotencyCache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def failing():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            raise RuntimeError("boom")
+
+        errors = []
+
+        def call():
+            try:
+                cache.get_or_compute('k', failing)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        first = threading.Thread(target=call)
+        first.start()
+        started.wait(5)
+        waiter = threading.Thread(target=call)
+        waiter.start()
+        time.sleep(0.05)
+        release.set()
+        first.join(5)
+        waiter.join(5)
+        self.assertEqual(errors, ["boom", "boom"])
+        self.assertEqual(len(calls), 1)
+
+    def test_failures_are_not_cached(self):
+        cache = IdempotencyCache()
+
+        def failing():
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            cache.get_or_compute('k', failing)
+        self.assertEqual(cache.get_or_compute('k', lambda: 'ok'), ('ok', False))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import os
+import sys
+from types import SimpleNamespace
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.llm_stream import stream_chat_completion, split_sentences
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+class FakeCompletions:
+    """Streams a canned reply in small pieces, recording how far the consumer has read"""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.sent = 0
+        self.kwargs = None
+
+    def create(self, **kwargs):
+        self.kwargs = kwargs
+        for piece in self.pieces:
+            self.sent += 1
+            yield chunk(piece)
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None))])
+
+def fake_client(pieces):
+    completions = FakeCompletions(pieces)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions)), completions
+
+class TestSplitSentences(unittest.TestCase):
+    def test_sentences_across_fragment_boundaries(self):
+        fragments = ["Hello Margaret, it's lovely ", "to hear from you. Shall we", " listen to some Frank ",
+                     "Sinatra? I think you'd enjoy \"My Way\"!  ", "Let me know"]
+        self.assertEqual(list(split_sentences(fragments)), [
+            "Hello Margaret, it's lovely to hear from you.",
+            "Shall we listen to some Frank Sinatra?",
+            "I think you'd enjoy \"My Way\"!",
+            "Let me know"
+        ])
+
+    def test_short_sentences_are_joined(self):
+        self.assertEqual(list(split_sentences(["Hi! Ok. ", "That sounds wonderful to me."])),
+                         ["Hi! Ok. That sounds wonderful to me."])
+
+    def test_decimal_points_do_not_split(self):
+        self.assertEqual(list(split_sentences(["It is 3.5 degrees outside today. Wrap up warm!"])),
+                         ["It is 3.5 degrees outside today.", "Wrap up warm!"])
+
+class TestStreamChatCompletion(unittest.TestCase):
+    def test_first_sentence_arrives_before_the_completion_ends(self):
+        client, completions = fake_client(["Good morning to ", "you, Tom. ", "The sun ", "is out today."])
+        sentences = split_sentences(stream_chat_completion(client, model='gpt-4o-mini', messages=[]))
+        self.assertEqual(next(sentences), "Good morning to you, Tom.")
+        self.assertLess(completions.sent, 4)
+        self.assertEqual(list(sentences), ["The sun is out today."])
+        self.assertTrue(completions.kwargs['stream'])
+
+if __name__ == '__main__':
+    unittest.main()
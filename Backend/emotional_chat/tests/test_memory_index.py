@@ -0,0 +1,108 @@
+import unittest
+import os
+import sys
+import time
+import threading
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.memory_index import MemoryIndex, ConversationMemory
+
+TOPICS = [
+    ("My daughter Anne is visiting on Sunday", "How lovely, what will you do with Anne?"),
+    ("I used to grow roses in my garden in Cork", "Roses are beautiful, which colours did you grow?"),
+    ("Can you play some Frank Sinatra", "Here is Frank Sinatra singing My Way."),
+    ("I miss dancing with Tom on Saturdays", "Dancing with Tom sounds like a wonderful memory."),
+]
+
+def turn(i, user_text, response):
+    return {'timestamp': f"2025-01-01T10:{i:02d}:00", 'user_text': user_text, 'response': response}
+
+def turns():
+    return [turn(i, *topic) for i, topic in enumerate(TOPICS)]
+
+class TestMemoryIndex(unittest.TestCase):
+    def test_finds_related_turn(self):
+        index = MemoryIndex()
+        for t in turns():
+            index.add(t)
+        score, best = index.search("tell me about the garden and roses", k=1)[0]
+        self.assertGreater(score, 0)
+        self.assertEqual(best['user_text'], TOPICS[1][0])
+        self.assertEqual(index.search("weather forecast"), [])
+
+    def test_before_excludes_newer_turns(self):
+        index = MemoryIndex()
+        for t in turns():
+            index.add(t)
+        self.assertEqual(index.search("Anne visiting", before="2025-01-01T10:00:00"), [])
+
+    def test_oldest_turns_are_removed_beyond_max_turns(self):
+        index = MemoryIndex(max_turns=2)
+        for t in turns():
+            index.add(t)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.search("Anne"), [])
+        self.assertEqual(index.search("Tom dancing", k=1)[0][1]['user_text'], TOPICS[3][0])
+
+    def test_search_is_fast_on_long_history(self):
+        index = MemoryIndex(max_turns=5000)
+        for i in range(5000):
+            index.add(turn(i % 60, f"message {i} about topic{i % 500}", "a reply"))
+        start = time.perf_counter()
+        results = index.search("topic42", k=3)
+        self.assertLess(time.perf_counter() - start, 0.05)
+        self.assertEqual(len(results), 3)
+
+def wait_loaded(memory, sessions=1):
+    deadline = time.time() + 2
+    while time.time() < deadline and (memory.stats()['loading'] or memory.stats()['sessions'] < sessions):
+        time.sleep(0.01)
+
+class TestConversationMemory(unittest.TestCase):
+    def test_index_is_rebuilt_in_the_background_then_updated_incrementally(self):
+        loaded = []
+
+        def loader(session_id, until):
+            loaded.append(session_id)
+            return turns()
+
+        memory = ConversationMemory(loader=loader)
+        memory.add_turn('alice', turn(9, "We talked about the piano", "Yes, you played the piano."))
+        # Nothing is recalled until the rebuild has finished
+        self.assertEqual(memory.search('alice', "Sinatra"), [])
+        wait_loaded(memory)
+        self.assertEqual(memory.search('alice', "Sinatra", k=1)[0][1]['user_text'], TOPICS[2][0])
+        memory.add_turn('alice', turn(10, "Shall I play the piano", "Please do."))
+        self.assertEqual(len(memory.search('alice', "piano")), 1)
+        self.assertEqual(loaded, ['alice'])
+
+    def test_turns_added_during_a_rebuild_are_indexed_once(self):
+        release = threading.Event()
+
+        def loader(session_id, until):
+            release.wait(2)
+            # The journal returns turns up to the cutoff, including the one journalled at 100
+            return [turn(0, "Tea with Anne", "Lovely."), turn(1, "Anne brought cake", "Delicious.")]
+
+        memory = ConversationMemory(loader=loader, clock=lambda: 100.0)
+        memory.search('alice', "Anne")
+        memory.add_turn('alice', turn(1, "Anne brought cake", "Delicious."), journalled=100.0)
+        memory.add_turn('alice', turn(2, "Anne is coming again", "Wonderful."), journalled=101.0)
+        release.set()
+        wait_loaded(memory)
+        self.assertEqual(sorted(t['user_text'] for _, t in memory.search('alice', "Anne", k=10)),
+                         ["Anne brought cake", "Anne is coming again", "Tea with Anne"])
+        self.assertEqual(memory.stats()['turns'], 3)
+
+    def test_least_recently_used_index_is_dropped(self):
+        memory = ConversationMemory(loader=lambda session_id, until: turns(), max_sessions=1)
+        memory.search('alice', "roses")
+        wait_loaded(memory)
+        memory.search('bob', "roses")
+        wait_loaded(memory)
+        self.assertEqual(memory.stats()['sessions'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import os
+import sys
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.response_cache import ResponseCache, normalize
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache(ttl=600, threshold=0.6, clock=self.clock)
+        self.cache.put('alice', 'neutral', "What day is it today?", "It's Tuesday, Alice.")
+
+    def test_normalised_repeat_is_an_exact_hit(self):
+        self.assertEqual(normalize("Um, Eva... what DAY is it today"), "what day is it today")
+        self.assertEqual(self.cache.get('alice', 'neutral', "Eva, what day is it today"), "It's Tuesday, Alice.")
+        self.assertEqual(self.cache.stats()['exact_hits'], 1)
+
+    def test_near_duplicate_transcription_is_a_hit(self):
+        self.assertEqual(self.cache.get('alice', 'neutral', "what day is it to day"), "It's Tuesday, Alice.")
+        self.assertEqual(self.cache.stats()['similar_hits'], 1)
+
+    def test_different_question_misses(self):
+        self.assertIsNone(self.cache.get('alice', 'neutral', "play my favourite song"))
+
+    def test_key_includes_patient_and_emotion(self):
+        self.assertIsNone(self.cache.get('bob', 'neutral', "What day is it today?"))
+        self.assertIsNone(self.cache.get('alice', 'sad', "What day is it today?"))
+
+    def test_key_includes_previous_reply(self):
+        self.cache.put('alice', 'neutral', "tell me about the garden", "The roses are out.", "Good morning!")
+        self.assertIsNone(self.cache.get('alice', 'neutral', "tell me about the garden", "Shall we go outside?"))
+        self.assertIsNone(self.cache.get('alice', 'neutral', "What day is it today?", "Good morning!"))
+        self.assertEqual(self.cache.get('alice', 'neutral', "tell me about the garden", "Good morning!"),
+                         "The roses are out.")
+
+    def test_short_utterances_are_not_cached(self):
+        for text in ["yes", "no", "tell me more", "I am not well"]:
+            self.cache.put('alice', 'neutral', text, "A reply")
+            self.assertIsNone(self.cache.get('alice', 'neutral', text))
+        self.assertEqual(self.cache.stats()['skipped'], 4)
+        self.assertEqual(normalize("I am not well"), "i am not well")
+
+    def test_other_numbers_never_match(self):
+        self.cache.put('alice', 'neutral', "take me to room 12", "Room 12 is down the hall.")
+        self.assertIsNone(self.cache.get('alice', 'neutral', "take me to room 13"))
+
+    def test_replies_expire(self):
+        self.clock.now = 601
+        self.assertIsNone(self.cache.get('alice', 'neutral', "What day is it today?"))
+
+    def test_entries_expire_individually(self):
+        self.clock.now = 500
+        self.cache.put('alice', 'neutral', "Tell me about my daughter", "Anne visits on Sundays.")
+        self.clock.now = 700
+        self.assertIsNone(self.cache.get('alice', 'neutral', "What day is it today?"))
+        self.assertEqual(self.cache.get('alice', 'neutral', "tell me about my daughter"), "Anne visits on Sundays.")
+
+    def test_oldest_utterance_is_dropped_when_full(self):
+        cache = ResponseCache(max_entries=2)
+        for i, text in enumerate(["good morning dear Eva", "play my favourite song", "read the morning news"]):
+            cache.put('alice', 'neutral', text, f"reply {i}")
+        self.assertIsNone(cache.get('alice', 'neutral', "good morning dear Eva"))
+        self.assertEqual(cache.get('alice', 'neutral', "read the morning news"), "reply 2")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import os
+import sys
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.scraper import Command, StreamingCommandParser, parse_commands
+
+RESPONSE = ("Of course, Margaret! [COMMAND:type=play_youtube,query=Frank Sinatra My Way] "
+            "That song always reminds me of your dancing days. [COMMAND:type=get_news]")
+
+class TestStreamingCommandParser(unittest.TestCase):
+    def test_commands_dispatch_when_their_marker_closes(self):
+        dispatched = []
+        parser = StreamingCommandParser(on_command=lambda command: dispatched.append((command, len(spoken))))
+        spoken = []
+        # Token-sized pieces, so markers are split at every possible point
+        for i in range(0, len(RESPONSE), 3):
+            spoken.append(parser.feed(RESPONSE[i:i + 3]))
+        spoken.append(parser.flush())
+
+        self.assertEqual(''.join(spoken), "Of course, Margaret!  That song always reminds me of your dancing days. ")
+        self.assertEqual(dispatched[0][0], Command('play_youtube', {'query': 'Frank Sinatra My Way'}))
+        # The first lookup starts before the rest of the reply has streamed in
+        self.assertNotIn("dancing", ''.join(spoken[:dispatched[0][1]]))
+        self.assertEqual(dispatched[1][0], Command('get_news', {}))
+
+    def test_brackets_that_are_not_commands_pass_through(self):
+        parser = StreamingCommandParser()
+        text = parser.feed("See [1] and [COMM") + parser.feed("ENTS] here [COMMAND:type=get_news") + parser.flush()
+        self.assertEqual(text, "See [1] and [COMMENTS] here [COMMAND:type=get_news")
+        self.assertEqual(parser.commands, [])
+
+    def test_malformed_command_is_dropped(self):
+        clean, commands = parse_commands("Hello [COMMAND:play] there")
+        self.assertEqual((clean, commands), ("Hello  there", []))
+
+    def test_parse_commands(self):
+        clean, commands = parse_commands(RESPONSE)
+        self.assertEqual([command.name for command in commands], ['play_youtube', 'get_news'])
+        self.assertNotIn('COMMAND', clean)
+
+if __name__ == '__main__':
+    unittest.main()
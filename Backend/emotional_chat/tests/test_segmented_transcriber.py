@@ -0,0 +1,100 @@
+import unittest
+import os
+import sys
+import time
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.asr import ASRBackend, ASRService
+from src.segmented_transcriber import SilenceSegmenter, SegmentedTranscriber
+
+SAMPLE_RATE = 16000
+
+def tone(seconds, amplitude=6000, frequency=180):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16)
+
+class DurationBackend(ASRBackend):
+    """Answers with the length of the audio it got, after a delay"""
+    name = 'duration'
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.active = 0
+        self.peak = 0
+
+    def transcribe(self, audio, language='en-US', timeout=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        self.active -= 1
+        return f"{len(audio.frame_data) / 2 / audio.sample_rate:.0f}s"
+
+class TestSilenceSegmenter(unittest.TestCase):
+    def test_cuts_in_pauses_within_bounds(self):
+        # Speech with a pause every 4 s, 0.6 s long
+        audio = np.concatenate([np.concatenate((tone(3.4), silence(0.6))) for _ in range(6)])
+        segmenter = SilenceSegmenter(SAMPLE_RATE, min_segment_seconds=2, max_segment_seconds=6)
+        segments = []
+        for start in range(0, len(audio), SAMPLE_RATE // 2):
+            segments += segmenter.feed(audio[start:start + SAMPLE_RATE // 2])
+        segments += segmenter.flush()
+
+        starts = [start for start, _ in segments]
+        self.assertEqual(sum(len(samples) for _, samples in segments), len(audio))
+        self.assertEqual(starts, sorted(starts))
+        for start, samples in segments[:-1]:
+            self.assertLessEqual(len(samples), 6 * SAMPLE_RATE)
+            # Every cut falls inside a pause
+            self.assertGreaterEqual((start + len(samples)) % (4 * SAMPLE_RATE), 3.4 * SAMPLE_RATE)
+
+class TestSegmentedTranscriber(unittest.TestCase):
+    def test_segments_run_concurrently_and_stitch_in_order(self):
+        backend = DurationBackend(latency=0.2)
+        transcriber = SegmentedTranscriber(ASRService([backend]), min_segment_seconds=2,
+                                           max_segment_seconds=6, max_workers=4)
+        audio = np.concatenate([np.concatenate((tone(4), silence(1))) for _ in range(8)])
+        blocks = (audio[i:i + SAMPLE_RATE] for i in range(0, len(audio), SAMPLE_RATE))
+
+        start = time.perf_counter()
+        result = transcriber.transcribe_stream(blocks, SAMPLE_RATE)
+        self.assertLess(time.perf_counter() - start, 8 * 0.2)
+        self.assertGreater(backend.peak, 1)
+
+        self.assertEqual(len(result['segments']), 8)
+        self.assertEqual(result['duration'], 40.0)
+        self.assertEqual([segment['start'] for segment in result['segments']], sorted(
+            segment['start'] for segment in result['segments']))
+        self.assertEqual(result['failed'], 0)
+        self.assertTrue(result['text'])
+
+    def test_input_error_does_not_wait_for_queued_segments(self):
+        backend = DurationBackend(latency=0.4)
+        transcriber = SegmentedTranscriber(ASRService([backend]), min_segment_seconds=2,
+                                           max_segment_seconds=6, max_workers=1)
+
+        def blocks():
+            for _ in range(3):
+                yield np.concatenate((tone(4), silence(1)))
+            raise IOError("upload cut off")
+
+        start = time.perf_counter()
+        with self.assertRaises(IOError):
+            transcriber.transcribe_stream(blocks(), SAMPLE_RATE)
+        self.assertLess(time.perf_counter() - start, 0.4)
+
+    def test_silent_segments_are_not_sent(self):
+        backend = DurationBackend()
+        transcriber = SegmentedTranscriber(ASRService([backend]), min_segment_seconds=2, max_segment_seconds=5)
+        result = transcriber.transcribe_stream([silence(12)], SAMPLE_RATE)
+        self.assertEqual(result['text'], '')
+        self.assertTrue(all(segment['speech_detected'] is False for segment in result['segments']))
+        self.assertEqual(backend.peak, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.conversation_store import ConversationStore
+from src.session_backends import create_session_backend
+
+def turn(text):
+    return {'user_text': text, 'response': 'ok'}
+
+class SharedBackendTests:
+    """Behaviour both shared backends must have; subclasses create two 'workers' on the same storage"""
+
+    def create(self, max_turns=50):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_session_keeps_most_recent_turns(self):
+        backend = self.create(max_turns=3)
+        for i in range(10):
+            backend.add_turn('patient', turn(f"message {i}"))
+        self.assertEqual([t['user_text'] for t in backend.history('patient')],
+                         ['message 7', 'message 8', 'message 9'])
+
+    def test_workers_share_sessions(self):
+        first, second = self.create(), self.create()
+        first.add_turn('alice', turn("hello"))
+        second.add_turn('alice', turn("how are you"))
+        self.assertEqual(first.history('alice'), [turn("hello"), turn("how are you")])
+        self.assertEqual(second.history('bob'), [])
+        self.assertEqual(first.stats()['sessions'], 1)
+
+    def test_concurrent_turns_are_not_lost(self):
+        workers = [self.create(), self.create()]
+
+        def talk(backend, name):
+            for i in range(20):
+                backend.add_turn('alice', turn(f"{name} {i}"))
+
+        threads = [threading.Thread(target=talk, args=(backend, f"worker{n}"))
+                   for n, backend in enumerate(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(workers[0].history('alice')), 40)
+
+class TestSQLiteSessionBackend(SharedBackendTests, unittest.TestCase):
+    def create(self, max_turns=50):
+        return create_session_backend('sqlite', max_turns=max_turns, db_path=self.root / 'sessions.db')
+
+class TestFileSessionBackend(SharedBackendTests, unittest.TestCase):
+    def create(self, max_turns=50):
+        return create_session_backend('file', max_turns=max_turns, folder=self.root / 'sessions')
+
+    def test_history_of_unknown_session_creates_no_files(self):
+        backend = self.create()
+        self.assertEqual(backend.history('mallory'), [])
+        self.assertEqual(list((self.root / 'sessions').iterdir()), [])
+
+class TestCreateSessionBackend(unittest.TestCase):
+    def test_memory_is_the_default(self):
+        self.assertIsInstance(create_session_backend(), ConversationStore)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_session_backend('redis')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from unittest import mock
+import cv2
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import video_processor
+from src.video_processor import read_gray_frames
+from src.emotion_monitor import EmotionMonitor
+
+FPS = 10.0
+SHADES = [40, 120, 200]
+
+def write_clip(path, frames=9, width=64, height=48):
+    """Write an MJPEG clip whose frames cycle through SHADES"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), FPS, (width, height))
+    for i in range(frames):
+        writer.write(np.full((height, width, 3), SHADES[i % len(SHADES)], dtype=np.uint8))
+    writer.release()
+
+class TestReadGrayFrames(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'clip.avi')
+        write_clip(self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def check_frames(self, frames):
+        self.assertEqual(len(frames), 3)
+        for (timestamp, frame), expected in zip(frames, [0.0, 0.3, 0.6]):
+            self.assertAlmostEqual(timestamp, expected, places=2)
+            self.assertEqual((frame.shape, frame.dtype), ((48, 64), np.uint8))
+            # Every third frame is the first shade
+            self.assertLess(abs(int(frame.mean()) - SHADES[0]), 5)
+
+    @unittest.skipIf(video_processor.av is None, "PyAV is not installed")
+    def test_pyav_decodes_every_nth_frame(self):
+        self.check_frames(list(read_gray_frames(self.path, frame_skip=3)))
+
+    @unittest.skipIf(shutil.which(video_processor.FFMPEG_PATH) is None, "FFmpeg is not installed")
+    def test_ffmpeg_decodes_every_nth_frame(self):
+        with mock.patch.object(video_processor, 'av', None):
+            self.check_frames(list(read_gray_frames(self.path, frame_skip=3)))
+
+    def test_ffmpeg_failing_after_the_first_frame_raises(self):
+        # Stands in for FFmpeg: writes one gray frame, then fails
+        script = os.path.join(self.temp_dir.name, 'failing-ffmpeg')
+        with open(script, 'w') as f:
+            f.write("#!/bin/sh\nhead -c 3072 /dev/zero\necho 'corrupt packet' >&2\nexit 1\n")
+        os.chmod(script, 0o755)
+        frames = []
+        with mock.patch.object(video_processor, 'av', None), \
+                mock.patch.object(video_processor, 'FFMPEG_PATH', script), \
+                self.assertLogs(level='ERROR') as logs:
+            with self.assertRaises(Exception):
+                for frame in read_gray_frames(self.path):
+                    frames.append(frame)
+        self.assertEqual(len(frames), 1)
+        self.assertIn('corrupt packet', logs.output[0])
+
+class TestAnalyzeVideo(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'clip.avi')
+        write_clip(self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_decode_error_after_some_frames_propagates(self):
+        def truncated(path, frame_skip):
+            for i in range(3):
+                yield i / FPS, np.full((48, 64), SHADES[0], dtype=np.uint8)
+            raise RuntimeError("corrupt packet")
+
+        monitor = EmotionMonitor()
+        with mock.patch('src.emotion_monitor.read_gray_frames', truncated):
+            with self.assertRaises(RuntimeError):
+                monitor.analyze_video(self.path)
+
+    def test_complete_clip_is_summarised(self):
+        aggregator = EmotionMonitor().analyze_video(self.path, frame_skip=3)
+        self.assertEqual(aggregator.total_frames, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import os
+import sys
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.voice_activity import VoiceActivityDetector
+
+SAMPLE_RATE = 16000
+
+def tone(duration, freq=220, amplitude=6000):
+    t = np.arange(int(SAMPLE_RATE * duration)) / SAMPLE_RATE
+    return amplitude * (np.sin(2 * np.pi * freq * t) + 0.5 * np.sin(4 * np.pi * freq * t))
+
+def noise(duration, level=150, seed=0):
+    return np.random.default_rng(seed).normal(0, level, int(SAMPLE_RATE * duration))
+
+def pcm(signal):
+    return np.clip(signal, -32768, 32767).astype(np.int16)
+
+class TestVoiceActivityDetector(unittest.TestCase):
+    def setUp(self):
+        self.vad = VoiceActivityDetector(padding_ms=100)
+
+    def test_silence_and_room_noise_have_no_speech(self):
+        self.assertIsNone(self.vad.speech_span(np.zeros(SAMPLE_RATE, dtype=np.int16), SAMPLE_RATE))
+        self.assertIsNone(self.vad.speech_span(pcm(noise(2.0)), SAMPLE_RATE))
+        # Loud hiss is energetic but not voiced
+        self.assertIsNone(self.vad.speech_span(pcm(noise(2.0, level=3000)), SAMPLE_RATE))
+
+    def test_short_clicks_are_not_speech(self):
+        signal = noise(1.0)
+        signal[8000:8800] += tone(0.05)
+        self.assertIsNone(self.vad.speech_span(pcm(signal), SAMPLE_RATE))
+
+    def test_speech_span_is_padded(self):
+        signal = np.concatenate([noise(1.0), tone(0.5) + noise(0.5, seed=1), noise(1.0, seed=2)])
+        start, end = self.vad.speech_span(pcm(signal), SAMPLE_RATE)
+        self.assertAlmostEqual(start / SAMPLE_RATE, 0.9, delta=0.03)
+        self.assertAlmostEqual(end / SAMPLE_RATE, 1.6, delta=0.03)
+
+    def test_clip_of_continuous_speech_is_kept_whole(self):
+        signal = pcm(tone(1.0))
+        self.assertEqual(self.vad.speech_span(signal, SAMPLE_RATE), (0, len(signal)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import os
+import io
+import sys
+import wave
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.wake_word_spotter import WakeWordSpotter, read_wav, subsequence_dtw, ACCEPT, ESCALATE, REJECT
+
+SAMPLE_RATE = 16000
+
+def synthetic_word(contour, duration=0.5):
+    """A voiced sound whose pitch follows the given contour, standing in for a spoken word"""
+    n = int(SAMPLE_RATE * duration)
+    freq = np.interp(np.linspace(0, 1, n), np.linspace(0, 1, len(contour)), contour)
+    phase = 2 * np.pi * np.cumsum(freq) / SAMPLE_RATE
+    signal = np.sin(phase) + 0.5 * np.sin(2 * phase) + 0.3 * np.sin(3.1 * phase)
+    return signal * np.hanning(n) * 8000
+
+def chunk_with(word, total=2.0, offset=0.6, noise=200, seed=0):
+    """Embed a word in a chunk of background noise"""
+    rng = np.random.default_rng(seed)
+    chunk = rng.normal(0, noise, int(SAMPLE_RATE * total))
+    start = int(offset * SAMPLE_RATE)
+    chunk[start:start + len(word)] += word
+    return np.clip(chunk, -32768, 32767).astype(np.int16)
+
+class TestWakeWordSpotter(unittest.TestCase):
+    def setUp(self):
+        self.spotter = WakeWordSpotter()
+        self.spotter.enroll(chunk_with(synthetic_word([300, 900, 400]), 0.7, 0.1, 50), SAMPLE_RATE, 'eva')
+
+    def test_without_templates_everything_escalates(self):
+        result = WakeWordSpotter().spot(chunk_with(np.zeros(1)), SAMPLE_RATE)
+        self.assertEqual(result['decision'], ESCALATE)
+
+    def test_accepts_keyword_spoken_at_another_rate_and_position(self):
+        word = synthetic_word([310, 920, 390], duration=0.45)
+        result = self.spotter.spot(chunk_with(word, offset=1.2, seed=1), SAMPLE_RATE)
+        self.assertEqual(result['decision'], ACCEPT)
+        self.assertEqual(result['keyword'], 'eva')
+
+    def test_rejects_other_sounds(self):
+        other = synthetic_word([800, 200, 700])
+        self.assertEqual(self.spotter.spot(chunk_with(other), SAMPLE_RATE)['decision'], REJECT)
+        silence = np.zeros(SAMPLE_RATE * 2, dtype=np.int16)
+        self.assertEqual(self.spotter.spot(silence, SAMPLE_RATE)['decision'], REJECT)
+
+    def test_rejects_keyword_squeezed_into_a_blip(self):
+        blip = synthetic_word([300, 900, 400], duration=0.12)
+        self.assertEqual(self.spotter.spot(chunk_with(blip), SAMPLE_RATE)['decision'], REJECT)
+
+    def test_alignment_is_limited_to_half_to_double_rate(self):
+        template = np.eye(8, dtype=np.float32)
+        self.assertAlmostEqual(subsequence_dtw(template, template[::2]), 0.5)
+        self.assertAlmostEqual(subsequence_dtw(template, np.repeat(template, 2, axis=0)), 0.0)
+        # A whole template can no longer collapse onto fewer than half its frames
+        self.assertEqual(subsequence_dtw(template, template[:3]), float('inf'))
+
+    def test_scores_quickly(self):
+        result = self.spotter.spot(chunk_with(synthetic_word([300, 900, 400])), SAMPLE_RATE)
+        self.assertLess(result['elapsed_ms'], 100)
+
+    def test_read_wav_mixes_down_stereo(self):
+        stereo = np.stack([np.full(100, 1000), np.full(100, 3000)], axis=1).astype('<i2')
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav_file:
+            wav_file.setnchannels(2)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(SAMPLE_RATE)
+            wav_file.writeframes(stereo.tobytes())
+        buffer.seek(0)
+        samples, sample_rate = read_wav(buffer)
+        self.assertEqual(sample_rate, SAMPLE_RATE)
+        self.assertEqual(samples.shape, (100,))
+        self.assertTrue(np.all(samples == 2000))
+
+if __name__ == '__main__':
+    unittest.main()
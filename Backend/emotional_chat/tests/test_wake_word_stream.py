@@ -0,0 +1,108 @@
+import unittest
+import os
+import sys
+import time
+import threading
+import numpy as np
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.wake_word_stream import PCMRingBuffer, WakeWordStream, WakeWordWorker, validate_sample_rate
+
+class FakeProcessor:
+    """Records analysed windows and detects the wake word when a window contains the marker value"""
+
+    def __init__(self, marker=7777):
+        self.marker = marker
+        self.windows = []
+
+    def detect_wake_word(self, samples, sample_rate):
+        self.windows.append(samples)
+        detected = bool(np.any(samples == self.marker))
+        return {'success': True, 'wake_word_detected': detected, 'detected_words': ['eva'] if detected else []}
+
+def pcm(values):
+    return np.asarray(values, dtype='<i2').tobytes()
+
+class TestPCMRingBuffer(unittest.TestCase):
+    def test_latest_wraps_around(self):
+        buffer = PCMRingBuffer(5)
+        buffer.write(np.arange(3, dtype=np.int16))
+        buffer.write(np.arange(3, 7, dtype=np.int16))
+        self.assertEqual(buffer.latest(5).tolist(), [2, 3, 4, 5, 6])
+        self.assertEqual(buffer.latest(2).tolist(), [5, 6])
+        buffer.write(np.arange(10, 22, dtype=np.int16))
+        self.assertEqual(buffer.latest(5).tolist(), [17, 18, 19, 20, 21])
+        self.assertEqual(buffer.total_written, 19)
+
+class TestWakeWordStream(unittest.TestCase):
+    def setUp(self):
+        self.processor = FakeProcessor()
+        # 10 Hz keeps windows tiny: 4 sample window, 2 sample hop
+        self.stream = WakeWordStream(self.processor, sample_rate=10, window_seconds=0.4, hop_seconds=0.2)
+
+    def test_overlapping_windows_every_hop(self):
+        data = pcm(range(1, 9))
+        # Three bytes at a time splits samples, which must be carried over to the next message
+        for i in range(0, len(data), 3):
+            self.stream.feed(data[i:i + 3])
+        self.assertEqual([w.tolist() for w in self.processor.windows], [[1, 2, 3, 4], [3, 4, 5, 6], [5, 6, 7, 8]])
+
+    def test_backlog_only_scores_latest_window(self):
+        self.stream.feed(pcm(range(1, 21)))
+        self.assertEqual([w.tolist() for w in self.processor.windows], [[17, 18, 19, 20]])
+
+    def test_wake_event_fires_once_per_utterance(self):
+        events = []
+        samples = [0] * 4 + [7777] + [0] * 15
+        for i in range(0, len(samples), 2):
+            events += self.stream.feed(pcm(samples[i:i + 2]))
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['detected_words'], ['eva'])
+        self.assertAlmostEqual(events[0]['stream_time'], 0.6)
+
+    def test_sample_rate_is_limited(self):
+        validate_sample_rate(16000)
+        for sample_rate in (10, 96000):
+            with self.assertRaises(ValueError):
+                validate_sample_rate(sample_rate)
+
+class SlowProcessor(FakeProcessor):
+    """Blocks every analysis until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def detect_wake_word(self, samples, sample_rate):
+        self.started.set()
+        self.release.wait(2)
+        return super().detect_wake_word(samples, sample_rate)
+
+class TestWakeWordWorker(unittest.TestCase):
+    def test_hops_arriving_during_slow_analysis_are_skipped(self):
+        processor = SlowProcessor()
+        stream = WakeWordStream(processor, sample_rate=10, window_seconds=0.4, hop_seconds=0.2)
+        events = []
+        worker = WakeWordWorker(stream, events.append)
+        worker.feed(pcm([1, 2, 3, 4]))
+        self.assertTrue(processor.started.wait(2))
+        start = time.perf_counter()
+        for i in range(5, 21, 2):
+            worker.feed(pcm([i, 7777 if i == 19 else i + 1]))
+        # Feeding never waits for the blocked analysis
+        self.assertLess(time.perf_counter() - start, 0.5)
+        processor.release.set()
+        deadline = time.time() + 2
+        while time.time() < deadline and not events:
+            time.sleep(0.01)
+        worker.close(timeout=2)
+        # The window being scored when the backlog built up, then only the newest one
+        self.assertEqual([w.tolist() for w in processor.windows], [[1, 2, 3, 4], [17, 18, 19, 7777]])
+        self.assertEqual(worker.dropped, 7)
+        self.assertEqual(len(events), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import re
+import math
+import hashlib
+from collections import Counter, defaultdict
+from typing import List
+
+# Words that say nothing about which note is relevant
+STOPWORDS = frozenset("""
+a an and are as at be but by do does did for from had has have he her him his how i if in into is it its
+me my no not of on or our she so that the their them then there they this to was we were what when where
+which who will with you your
+""".split())
+
+# Longer paragraphs are split into passages of about this many words at sentence boundaries
+MAX_PASSAGE_WORDS = 80
+
+TOKEN = re.compile(r"[a-z0-9]+")
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+def split_passages(notes: str) -> List[str]:
+    """Split notes into passages: paragraphs, with long ones cut at sentence boundaries"""
+    passages = []
+    for paragraph in re.split(r"\n\s*\n", notes or ''):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        current, words = [], 0
+        for sentence in SENTENCE_BOUNDARY.split(paragraph):
+            count = len(sentence.split())
+            if current and words + count > MAX_PASSAGE_WORDS:
+                passages.append(' '.join(current))
+                current, words = [], 0
+            current.append(sentence)
+            words += count
+        passages.append(' '.join(current))
+    return passages
+
+class NoteIndex:
+    """
+    BM25 index over the passages of a patient's notes
+
+    Only the passages relevant to what the patient just said are put in the
+    prompt, so long care notes do not make every request slower and dearer.
+    """
+
+    def __init__(self, notes: str = '', k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.digest = None
+        self.update(notes)
+
+    def update(self, notes: str) -> bool:
+        """Rebuild the index if the notes changed, returns whether they did"""
+        digest = hashlib.sha256((notes or '').encode('utf-8')).hexdigest()
+        if digest == self.digest:
+            return False
+        self.digest = digest
+        self.passages = split_passages(notes)
+        # term -> [(passage number, term frequency)]
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for number, passage in enumerate(self.passages):
+            tokens = tokenize(passage)
+            self.lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                self.postings[term].append((number, frequency))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        count = len(self.passages)
+        self.idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+        return True
+
+    def search(self, query: str, k: int = 3) -> List[str]:
+        """
+        Get the passages most relevant to a query, in their order in the notes
+
+        When nothing matches, the first k passages are returned, so the
+        prompt keeps the opening of the notes, which usually introduces the patient.
+        """
+        if len(self.passages) <= k:
+            return list(self.passages)
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            for number, frequency in self.postings.get(term, ()):
+                length_norm = 1 - self.b + self.b * self.lengths[number] / (self.average_length or 1)
+                scores[number] += self.idf[term] * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        best = sorted(scores, key=lambda number: scores[number], reverse=True)[:k]
+        if not best:
+            best = range(k)
+        return [self.passages[number] for number in sorted(best)]
@@ -0,0 +1,57 @@
+import unittest
+import os
+import sys
+
+# Add the repository root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from ai.note_index import NoteIndex, split_passages, MAX_PASSAGE_WORDS
+
+NOTES = """Margaret is 84 and moved in last spring. She likes to be called Peggy.
+
+Her daughter Anne visits every Sunday with the grandchildren.
+
+Peggy grew roses in her garden in Cork for forty years and loves talking about them.
+
+She worked as a dance teacher and still enjoys Frank Sinatra and Ella Fitzgerald.
+
+She takes her heart tablets at 8am and 8pm and sometimes forgets whether she has taken them."""
+
+class TestSplitPassages(unittest.TestCase):
+    def test_paragraphs_are_passages(self):
+        self.assertEqual(len(split_passages(NOTES)), 5)
+        self.assertEqual(split_passages("  \n\n  "), [])
+
+    def test_long_paragraph_is_cut_at_sentence_boundaries(self):
+        sentence = "She enjoys the garden every single afternoon when the weather is fine."
+        passages = split_passages(' '.join([sentence] * 20))
+        self.assertGreater(len(passages), 1)
+        for passage in passages:
+            self.assertLessEqual(len(passage.split()), MAX_PASSAGE_WORDS)
+            self.assertTrue(passage.endswith('.'))
+
+class TestNoteIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = NoteIndex(NOTES)
+
+    def test_relevant_passages_are_ranked_first(self):
+        passages = self.index.search("Tell me about your roses", k=1)
+        self.assertEqual(passages, [split_passages(NOTES)[2]])
+
+    def test_results_keep_the_order_of_the_notes(self):
+        passages = self.index.search("Did Anne bring Sinatra records?", k=2)
+        self.assertEqual(passages, [split_passages(NOTES)[1], split_passages(NOTES)[3]])
+
+    def test_no_match_falls_back_to_the_opening(self):
+        self.assertEqual(self.index.search("What is the weather like?", k=2), split_passages(NOTES)[:2])
+
+    def test_short_notes_are_returned_whole(self):
+        self.assertEqual(NoteIndex("Only one passage.").search("anything", k=3), ["Only one passage."])
+
+    def test_index_is_only_rebuilt_when_notes_change(self):
+        self.assertFalse(self.index.update(NOTES))
+        self.assertTrue(self.index.update(NOTES + "\n\nShe has a cat called Tibbles."))
+        self.assertEqual(self.index.search("cat", k=1), ["She has a cat called Tibbles."])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,12 +6,17 @@ from dataclasses import dataclass
 import os
 import pyttsx3
 from typing import List, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+import time
 import webbrowser
 import requests
 import re
 from urllib.parse import quote
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
+from .note_index import NoteIndex
 from .database import get_patients, supabase as supabase_client, download_file, upload_file_to_bucket
 from supabase import Client as SupabaseClient
 from werkzeug.utils import secure_filename
@@ -23,6 +28,30 @@ load_dotenv()
 # Initialize OpenAI client
 client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
+# Seconds a transcription may take before the turn is given up
+TRANSCRIBE_TIMEOUT = float(os.getenv('TRANSCRIBE_TIMEOUT', '15'))
+
+# A sentence ends at . ! ? (optionally followed by closing quotes or brackets) before whitespace
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+# Tokens of conversation history sent with every request, on top of the system message
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1000'))
+# Tokens the summary of messages that no longer fit may use
+CONTEXT_SUMMARY_TOKENS = int(os.getenv('CONTEXT_SUMMARY_TOKENS', '150'))
+
+# Passages of the patient's notes put in the prompt for each utterance
+NOTES_TOP_K = int(os.getenv('NOTES_TOP_K', '3'))
+# Seconds between re-reading the patient, so edits to their notes are picked up
+PATIENT_REFRESH_SECONDS = float(os.getenv('PATIENT_REFRESH_SECONDS', '300'))
+
+# Words, numbers and single punctuation marks, roughly how BPE tokenizers split English text
+TOKEN_PIECE = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(message):
+    """Estimate the tokens of a chat message without a tokenizer, one per four characters of each word"""
+    # 4 tokens of chat formatting around every message
+    return sum((len(piece) + 3) // 4 for piece in TOKEN_PIECE.findall(message['content'] or '')) + 4
+
 # Initialize text-to-speech engine
 engine = pyttsx3.init()
 engine.setProperty('rate', 150)
@@ -76,7 +105,21 @@ good_news_network_scraper = GoodNewsNetworkScraper(scraper=scraper_bucket)
 
 class Conversation:
     def __init__(self, patient):
-        self.messages = []
+        self.history = deque()
+        self.history_tokens = 0
+        self.summary = ''
+        self._evicted = []
+        self._summarizing = False
+        self._summary_lock = threading.Lock()
+        self._summarizer = ThreadPoolExecutor(max_workers=1)
+        self.notes = NoteIndex()
+        self.relevant_notes = []
+        self.update_patient(patient)
+
+    def update_patient(self, patient):
+        """Use the patient's current name and notes, re-indexing the notes only if they changed"""
+        if self.notes.update(patient['notes']):
+            print(f"Indexed {len(self.notes.passages)} passages of notes for {patient['name']}")
         self.system_message = f"""You are a helpful and knowledgeable voice assistant that can answer questions, play YouTube videos, show images, and read news headlines. You're role is in a nursing home and you have been deployed to keep a particular patient engaged who may suffer from loneliness. Notes on the patient are attached below. It is **ESSENTIAL** that you use and refer to context in the notes to keep the patient grounded.
 
 ## Commands to Use for Different Features
@@ -114,21 +157,66 @@ You are able to invoke particular tools on request of the patient. Feel free to
 ## Patient Notes
 
 The patient's name is {patient['name']}.
-
-{patient['notes']}
 """
-        print(self.system_message)
 
-        # Initialize with system message
-        self.messages.append({"role": "system", "content": self.system_message})
+    @property
+    def messages(self):
+        """
+        System message with the notes relevant to the latest utterance, the summary
+        of older messages if any, then the history that fits the token budget
+        """
+        messages = [{"role": "system", "content": "\n\n".join([self.system_message] + self.relevant_notes)}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        return messages + [message for message, _ in self.history]
 
     def add_message(self, role, content):
         """Add a message to the conversation history"""
-        self.messages.append({"role": role, "content": content})
-
-        # Keep only the last 10 messages to avoid hitting token limits
-        if len(self.messages) > 11:  # 1 system message + 10 conversation messages
-            self.messages = [self.messages[0]] + self.messages[-10:]
+        message = {"role": role, "content": content}
+        if role == "user":
+            self.relevant_notes = self.notes.search(content, NOTES_TOP_K)
+        tokens = estimate_tokens(message)
+        self.history.append((message, tokens))
+        self.history_tokens += tokens
+
+        # Drop the oldest messages beyond the token budget, always keeping the newest one
+        budget = CONTEXT_TOKEN_BUDGET - CONTEXT_SUMMARY_TOKENS
+        evicted = []
+        while self.history_tokens > budget and len(self.history) > 1:
+            old_message, old_tokens = self.history.popleft()
+            self.history_tokens -= old_tokens
+            evicted.append(old_message)
+        if evicted:
+            with self._summary_lock:
+                self._evicted.extend(evicted)
+                if self._summarizing:
+                    return
+                self._summarizing = True
+            self._summarizer.submit(self._refresh_summary)
+
+    def _refresh_summary(self):
+        """Fold evicted messages into the summary, off the conversation's critical path"""
+        while True:
+            with self._summary_lock:
+                evicted, self._evicted = self._evicted, []
+                if not evicted:
+                    self._summarizing = False
+                    return
+            exchanges = "\n".join(f"{message['role']}: {message['content']}" for message in evicted)
+            try:
+                response = client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[{"role": "user", "content": (
+                        "Update this summary of a conversation with a nursing home patient with the new messages. "
+                        "Keep names, people, places, preferences and anything promised. "
+                        f"At most {int(CONTEXT_SUMMARY_TOKENS * 0.75)} words.\n\n"
+                        f"Summary:\n{self.summary or '(none yet)'}\n\nNew messages:\n{exchanges}"
+                    )}],
+                    max_tokens=CONTEXT_SUMMARY_TOKENS
+                )
+                self.summary = response.choices[0].message.content.strip()
+            except Exception as e:
+                print(f"Error summarising the conversation: {e}")
 
     def get_response(self):
         """Get a response from ChatGPT based on the conversation history"""
@@ -145,6 +233,46 @@ The patient's name is {patient['name']}.
             print(f"Error getting response from ChatGPT: {e}")
             return None
 
+    def stream_response(self, on_command=None, min_length=20):
+        """
+        Stream a response from ChatGPT sentence by sentence
+
+        The assistant's message is added to the conversation once the stream
+        has finished, so an interrupted stream leaves the history unchanged.
+        Command markers are removed from the yielded text and passed to
+        on_command as soon as each one is complete.
+
+        Args:
+            on_command (callable): Called with each Command in the response
+            min_length (int): Shorter sentences are joined with the next one
+
+        Yields:
+            str: Sentences of the response, without command markers, as they are generated
+        """
+        try:
+            stream = client.chat.completions.create(model="gpt-3.5-turbo", messages=self.messages, stream=True)
+            parser = StreamingCommandParser(on_command)
+            full_response = ''
+            pending = ''
+            for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                full_response += chunk.choices[0].delta.content
+                pending += parser.feed(chunk.choices[0].delta.content)
+                start = 0
+                for match in SENTENCE_END.finditer(pending):
+                    if match.end() - start >= min_length:
+                        yield pending[start:match.end()].strip()
+                        start = match.end()
+                pending = pending[start:]
+            pending += parser.flush()
+            if pending.strip():
+                yield pending.strip()
+            self.add_message("assistant", full_response)
+
+        except Exception as e:
+            print(f"Error streaming response from ChatGPT: {e}")
+
 def speak_text(text):
     """Convert text to speech"""
     # engine.say(text)
@@ -203,25 +331,87 @@ class Command:
     def end_output_sign(self) -> str:
         return f"[END COMMAND OUTPUT:{self.name} {self.format_parameters()}]"
 
+def parse_command(command_str: str) -> Command:
+    """Parse the inside of a [COMMAND:...] marker"""
+    command = {}
+    for param in command_str.split(','):
+        key, value = param.split('=')
+        command[key.strip()] = value.strip()
+    return Command(name=command.pop("type"), parameters=command)
+
+class StreamingCommandParser:
+    """
+    Separates [COMMAND:...] markers from a streamed response as it arrives
+
+    Text is passed through as soon as it cannot be part of a marker, and each
+    marker is handed to on_command the moment its closing bracket arrives, so
+    the lookup runs while the rest of the reply is still being spoken.
+
+    A deliberate copy of the parser in Backend/emotional_chat/src/scraper.py, which is
+    deployed separately; keep the two in sync.
+    """
+    MARKER = '[COMMAND:'
+
+    def __init__(self, on_command=None, max_marker_length=300):
+        self.on_command = on_command
+        self.max_marker_length = max_marker_length
+        self.commands: List[Command] = []
+        self._pending = ''
+
+    def feed(self, fragment: str) -> str:
+        """Add a fragment of the response and return the clean text that is now final"""
+        text = self._pending + fragment
+        clean = []
+        position = 0
+        while True:
+            start = text.find('[', position)
+            if start == -1:
+                clean.append(text[position:])
+                self._pending = ''
+                break
+            clean.append(text[position:start])
+            rest = text[start:]
+            if not rest.startswith(self.MARKER):
+                if self.MARKER.startswith(rest):
+                    # Could still become a marker once more text arrives
+                    self._pending = rest
+                    break
+                clean.append('[')
+                position = start + 1
+                continue
+            end = text.find(']', start)
+            if end == -1:
+                if len(rest) > self.max_marker_length:
+                    clean.append('[')
+                    position = start + 1
+                    continue
+                self._pending = rest
+                break
+            self._dispatch(text[start + len(self.MARKER):end])
+            position = end + 1
+        return ''.join(clean)
+
+    def flush(self) -> str:
+        """Return text held back at the end of the stream, such as an unclosed marker"""
+        text, self._pending = self._pending, ''
+        return text
+
+    def _dispatch(self, command_str: str):
+        try:
+            command = parse_command(command_str)
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring malformed command '{command_str}': {e}")
+            return
+        self.commands.append(command)
+        if self.on_command:
+            self.on_command(command)
+
 def parse_commands(response: str) -> Tuple[str, List[Command]]:
     """Parse the response for any commands"""
-    commands = []
-    
     # Look for commands in the format: [COMMAND:type=play_youtube,query=Frank Sinatra]
-    command_pattern = r'\[COMMAND:([^\]]+)\]'
-    matches = re.finditer(command_pattern, response)
-
-    for match in matches:
-        command_str = match.group(1)
-        command = {}
-        for param in command_str.split(','):
-            key, value = param.split('=')
-            command[key.strip()] = value.strip()
-        commands.append(Command(name=command.pop("type"), parameters=command))
-
-    # Remove the command text from the response
-    clean_response = re.sub(command_pattern, '', response)
-    return clean_response, commands
+    parser = StreamingCommandParser()
+    clean_response = parser.feed(response) + parser.flush()
+    return clean_response, parser.commands
 
 def execute_command(command: Command) -> str:
     """Execute a command from the AI response and returns context for the LLM to use"""
@@ -266,7 +456,11 @@ def transcribe_audio(filename):
     """Transcribe audio file using OpenAI's Whisper model"""
     try:
         with open(filename, "rb") as audio_file:
-            transcript = client.audio.transcribe("whisper-1", audio_file)
+            transcript = client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                timeout=TRANSCRIBE_TIMEOUT
+            )
             return transcript.text
     except Exception as e:
         print(f"Error transcribing audio: {e}")
@@ -299,9 +493,18 @@ def main():
 
     # Initialize conversation
     conversation = Conversation(patient)
+    patient_loaded = time.monotonic()
     
     while True:
         try:
+            if time.monotonic() - patient_loaded > PATIENT_REFRESH_SECONDS:
+                try:
+                    conversation.update_patient(load_patient_info())
+                except Exception as e:
+                    # Keep the current notes and try again after the next interval, not every turn
+                    print(f"Error refreshing patient info: {e}")
+                patient_loaded = time.monotonic()
+
             if not dev_mode:
                 input("Press Enter to start recording...")
 
@@ -320,17 +523,17 @@ def main():
 
                 # Get ChatGPT response using conversation history
                 conversation.add_message("user", text)
-                response = conversation.get_response()
-                print("Raw response is:", response)
-                if response:
-                    # Parse any commands in the response
-                    clean_response, commands = parse_commands(response)
-
-                    command_outputs = []
-
-                    # Execute any commands
-                    for command in commands:
-                        command_output = execute_command(command)
+                command_outputs = []
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    # Commands start as soon as their marker is complete, while the reply is still spoken
+                    running = []
+                    on_command = lambda command: running.append((command, executor.submit(execute_command, command)))
+                    for sentence in conversation.stream_response(on_command):
+                        print(f"\nAssistant: {sentence}")
+                        speak_text(sentence)
+
+                    for command, future in running:
+                        command_output = future.result()
                         full_tool_context = f"""{command.start_output_sign()}
 {command_output}
 {command.end_output_sign()}"""
@@ -338,10 +541,8 @@ def main():
                         command_outputs.append(full_tool_context)
                         conversation.add_message("assistant", command_output)
 
-                    # Speak and print the clean response
-                    print(f"\nAssistant: {clean_response}\n")
-                    speak_text(clean_response)
-
+                # The reply completed, so follow up with the command outputs in context
+                if conversation.messages[-1]["role"] == "assistant":
                     next_response = conversation.get_response()
                     print(f"\nAssistant: {next_response}\n")
                     conversation.add_message("assistant", next_response)